@@ -1,3 +1,32 @@
 from .core import TradingBackend
+from .contract_cache import ContractCache
+from .subscription_manager import SubscriptionManager
+from .order_book import OrderBookCache
+from .spread_book import SpreadBook
+from .snapshot_service import SnapshotService
+from .position_book import PositionBook
+from .settlement_calendar import SettlementCalendar
+from .session_clock import SessionClock
+from .feed_watchdog import FeedWatchdog
+from .account_aggregator import AccountAggregator
+from .simulator import SimulatedBackend
+from .stream_server import StreamServer
+from .engine import EngineClient, run_headless
 
-__all__ = ['TradingBackend']
+__all__ = [
+    'TradingBackend',
+    'ContractCache',
+    'SubscriptionManager',
+    'OrderBookCache',
+    'SpreadBook',
+    'SnapshotService',
+    'PositionBook',
+    'SettlementCalendar',
+    'SessionClock',
+    'FeedWatchdog',
+    'AccountAggregator',
+    'SimulatedBackend',
+    'StreamServer',
+    'EngineClient',
+    'run_headless'
+]
@@ -0,0 +1,288 @@
+# backend/account_aggregator.py
+"""
+多帳戶彙總模組
+負責同時查詢多個期貨子帳戶的倉位與保證金 (每個帳戶各自逾時),
+合併成一份標上帳戶名稱的倉位,並提供各帳戶與全部的彙總;
+任一帳戶變慢或失敗時沿用該帳戶上一次的結果,不拖累其他帳戶
+
+倉位不跨帳戶合併: 各帳戶的保證金分開計算,多空在不同帳戶時不能互抵;
+GUI 以 start() 送出查詢、poll() 輪詢結果,不阻塞 Tk 執行緒
+
+設定檔 opds.ini:
+    [accounts]
+    主帳戶 = F002000-1234567
+    選擇權 = 7654321
+    timeout = 5
+沒有設定或設定的帳戶都找不到時維持單一帳戶 (backend.get_positions())
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 5.0  # 秒,每個帳戶的查詢上限
+
+
+def _account_keys(account):
+    """帳戶物件可比對的字串 (帳號、分公司-帳號)"""
+    if isinstance(account, str):
+        return {account}
+    account_id = str(getattr(account, 'account_id', ''))
+    broker_id = str(getattr(account, 'broker_id', ''))
+    return {account_id, f"{broker_id}-{account_id}"}
+
+
+def _is_futopt(account):
+    if isinstance(account, str):
+        return True
+    return 'F' in str(getattr(account, 'account_type', 'F'))
+
+
+class AccountAggregator:
+    def __init__(self, backend, accounts=None, timeout=DEFAULT_TIMEOUT):
+        """
+        Args:
+            backend: TradingBackend 或相同介面的物件 (get_positions(account=...)、api.margin)
+            accounts: [(名稱, 帳號)] 列表;None 或空列表為單一帳戶
+            timeout: 每個帳戶的查詢秒數上限
+        """
+        self.backend = backend
+        self.accounts = list(accounts or [])
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._resolved = None   # [(名稱, Shioaji 帳戶物件)]
+        self._pending = {}      # 名稱 -> 尚未完成的 future (逾時的查詢仍在跑)
+        self._round = None      # 進行中的查詢: ({名稱: future}, 截止時間)
+        self.results = {}       # 名稱 -> 最近一次的帳戶結果 (見 _fetch_account)
+
+    @property
+    def multi(self):
+        return len(self.accounts) > 1
+
+    def reset(self):
+        """登出後重新對應帳戶"""
+        with self._lock:
+            self._resolved = None
+            self._round = None
+            self.results = {}
+
+    # ===== 帳戶對應 =====
+    def _resolve(self):
+        if self._resolved is not None:
+            return self._resolved
+
+        api = getattr(self.backend, 'api', None)
+        available = []
+        if api is not None and hasattr(api, 'list_accounts'):
+            available = [a for a in api.list_accounts() if _is_futopt(a)]
+
+        resolved = []
+        for name, account_id in self.accounts:
+            account = next((a for a in available if account_id in _account_keys(a)), None)
+            if account is None:
+                logger.warning(f"找不到帳戶 {name} ({account_id}),略過")
+                continue
+            resolved.append((name, account))
+        if not resolved:
+            logger.error(f"設定的 {len(self.accounts)} 個帳戶都找不到,改用預設帳戶查詢倉位")
+        self._resolved = resolved
+        return resolved
+
+    def account_name(self, msg):
+        """委託/成交回報所屬的帳戶名稱 (沒有設定多帳戶或對應不到時為空字串)"""
+        if not self.accounts or not isinstance(msg, dict):
+            return ''
+        account = msg.get('account')
+        account_id = str(msg.get('account_id') or (account.get('account_id', '') if isinstance(account, dict) else ''))
+        for name, resolved in self._resolved or []:
+            if account_id and account_id in _account_keys(resolved):
+                return name
+        return ''
+
+    def default_name(self):
+        """下單預設帳戶 (api.futopt_account) 的名稱,沒有設定多帳戶時為空字串"""
+        if not self.accounts:
+            return ''
+        default = getattr(getattr(self.backend, 'api', None), 'futopt_account', None)
+        if default is None:
+            return ''
+        keys = _account_keys(default) - {'', '-'}
+        for name, account in self._resolved or []:
+            if _account_keys(account) & keys:
+                return name
+        return ''
+
+    # ===== 查詢 =====
+    def get_positions(self):
+        """
+        查詢所有帳戶的倉位並等待結果 (每個帳戶最多 timeout 秒),每筆加上 'account' (帳戶名稱)
+
+        Returns:
+            list: get_positions() 格式的 dict;單一帳戶時 account 為空字串
+        """
+        if not self.start():
+            positions = self.backend.get_positions()
+            for p in positions:
+                p.setdefault('account', '')
+            return positions
+
+        futures, _ = self._round
+        wait(list(futures.values()), timeout=self.timeout)
+        return self._collect()
+
+    def start(self):
+        """
+        在背景送出所有帳戶的查詢,不等待結果 (之後以 poll() 取得)
+
+        Returns:
+            bool: 沒有設定多帳戶或設定的帳戶都找不到時為 False (改用 get_positions() 直接查詢)
+        """
+        if not self.accounts:
+            return False
+        if self._round is not None:
+            return True
+
+        accounts = self._resolve()
+        if not accounts:
+            return False
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(len(accounts), 1),
+                                                thread_name_prefix='account-fetch')
+
+        # 上一次逾時的查詢還沒結束時不重複送出,沿用舊資料
+        futures = {}
+        for name, account in accounts:
+            pending = self._pending.get(name)
+            if pending is not None and not pending.done():
+                continue
+            if pending is not None:
+                # 上一次逾時後才完成的結果,作為這一次再逾時時的舊資料
+                with self._lock:
+                    self.results[name] = dict(pending.result(), stale=True)
+            futures[name] = self._pending[name] = self._executor.submit(self._fetch_account, name, account)
+
+        self._round = (futures, time.monotonic() + self.timeout)
+        return True
+
+    def poll(self):
+        """
+        取得 start() 的結果
+
+        Returns:
+            list: 所有帳戶都完成或已逾時時為合併的倉位;仍在查詢 (或沒有進行中的查詢) 時為 None
+        """
+        if self._round is None:
+            return None
+        futures, deadline = self._round
+        if time.monotonic() < deadline and not all(f.done() for f in futures.values()):
+            return None
+        return self._collect()
+
+    def _collect(self):
+        """結束這一輪查詢,未完成的帳戶沿用上一次資料"""
+        futures, _ = self._round
+        self._round = None
+
+        positions = []
+        for name, account in self._resolve():
+            future = futures.get(name)
+            if future is not None and future.done():
+                result = future.result()
+                self._pending.pop(name, None)
+            else:
+                previous = self.results.get(name) or {'positions': [], 'margin': {}}
+                result = dict(previous, ok=False, stale=True, error='逾時')
+                logger.warning(f"帳戶 {name} 查詢逾時 ({self.timeout:.0f} 秒),沿用上一次資料",
+                               extra={'rate_key': f'accounts.timeout.{name}'})
+            with self._lock:
+                self.results[name] = result
+            positions.extend(result['positions'])
+        return positions
+
+    def _fetch_account(self, name, account):
+        """查詢單一帳戶 (在執行緒池執行,例外轉成結果)"""
+        started = time.perf_counter()
+        result = {'positions': [], 'margin': {}, 'ok': True, 'stale': False, 'error': None}
+        try:
+            positions = self.backend.get_positions(account=account)
+            for p in positions:
+                p['account'] = name
+            result['positions'] = positions
+        except Exception as e:
+            logger.warning(f"帳戶 {name} 取得倉位失敗: {e}", extra={'rate_key': f'accounts.positions.{name}'})
+            with self._lock:
+                previous = self.results.get(name) or {}
+            result.update(positions=previous.get('positions', []), ok=False, stale=True, error=str(e))
+
+        try:
+            api = self.backend.api
+            margin = api.margin(account)
+            result['margin'] = {
+                'equity': float(getattr(margin, 'equity', 0) or 0),
+                'initial_margin': float(getattr(margin, 'initial_margin', 0) or 0),
+                'maintenance_margin': float(getattr(margin, 'maintenance_margin', 0) or 0),
+                'available_margin': float(getattr(margin, 'available_margin', 0) or 0),
+            }
+        except Exception as e:
+            logger.warning(f"帳戶 {name} 取得保證金失敗: {e}", extra={'rate_key': f'accounts.margin.{name}'})
+            with self._lock:
+                result['margin'] = (self.results.get(name) or {}).get('margin', {})
+
+        result['elapsed'] = time.perf_counter() - started
+        return result
+
+    # ===== 彙總 =====
+    def summary(self, positions=None):
+        """
+        各帳戶與全部的彙總
+
+        Args:
+            positions: 最新的倉位 (例如表格中已隨報價更新的 PositionRecord);省略時用查詢結果
+
+        Returns:
+            dict: 帳戶名稱 -> {'pnl', 'margin', 'delta', 'lots', 'equity', 'ok', 'stale', 'error'},
+                  另有 '全部' 為合計
+        """
+        with self._lock:
+            results = dict(self.results)
+        if positions is None:
+            positions = [p for r in results.values() for p in r['positions']]
+
+        totals = {name: {'pnl': 0, 'margin': 0, 'delta': 0.0, 'lots': 0.0,
+                         'equity': r['margin'].get('equity', 0.0),
+                         'ok': r['ok'], 'stale': r['stale'], 'error': r['error']}
+                  for name, r in results.items()}
+        all_total = {'pnl': 0, 'margin': 0, 'delta': 0.0, 'lots': 0.0,
+                     'equity': sum(t['equity'] for t in totals.values()),
+                     'ok': all(t['ok'] for t in totals.values()), 'stale': False, 'error': None}
+
+        for p in positions:
+            name = p.get('account', '')
+            qty = float(p.get('quantity', 0))
+            for entry in (totals.get(name), all_total):
+                if entry is None:
+                    continue
+                entry['pnl'] += int(p.get('calc_pnl', 0))
+                entry['margin'] += int(p.get('margin', 0) or 0)
+                entry['delta'] += float(p.get('est_delta', 0)) * qty
+                entry['lots'] += qty
+
+        totals['全部'] = all_total
+        return totals
+
+    def total_equity(self):
+        """所有帳戶的權益數合計 (沒有資料時為 None)"""
+        with self._lock:
+            margins = [r['margin'] for r in self.results.values() if r['margin']]
+        if not margins:
+            return None
+        return sum(m.get('equity', 0.0) for m in margins)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,246 @@
+# backend/contract_cache.py
+"""
+合約快取模組
+負責將 Shioaji 合約樹整理成每日索引並存檔,重啟後同日直接沿用
+"""
+import json
+import logging
+import os
+from datetime import datetime
+
+from .settlement_calendar import get_trading_date
+
+logger = logging.getLogger(__name__)
+
+# 要建立索引的商品 (期貨 / 選擇權)
+FUTURES_PRODUCTS = ('TXF', 'MXF', 'TMF')
+OPTIONS_PRODUCTS = ('TXO', 'TX1', 'TX2', 'TX4', 'TX5')
+
+# 合約物件沒有乘數時的預設值
+DEFAULT_MULTIPLIERS = {
+    'TXF': 200,
+    'MXF': 50,
+    'TMF': 10,
+    'TXO': 50,
+    'TX1': 50,
+    'TX2': 50,
+    'TX4': 50,
+    'TX5': 50,
+}
+
+
+class ContractCache:
+    def __init__(self, api=None, cache_dir='.'):
+        self.api = api
+        self.cache_dir = cache_dir
+        self.trading_date = None
+        self.index = {}            # code -> 合約資訊 dict
+        self._by_month = {}        # (product, delivery_month) -> code
+        self._contracts = {}       # code -> Shioaji 合約物件 (延遲取得)
+        self._missing = set()      # API 也查不到的代碼
+
+    def _cache_path(self, trading_date):
+        return os.path.join(self.cache_dir, f"contract_cache_{trading_date}.json")
+
+    def load_or_build(self, force=False):
+        """
+        載入當日快取,不存在時掃描合約樹並存檔
+
+        Returns:
+            bool: 是否有可用的合約索引
+        """
+        trading_date = get_trading_date()
+        if not force and self.trading_date == trading_date and self.index:
+            return True
+
+        if not force and self.load(trading_date):
+            return True
+
+        if self.api is None:
+            return False
+
+        self.build(trading_date)
+        self.save()
+        return bool(self.index)
+
+    def load(self, trading_date):
+        """從檔案載入指定交易日的合約索引"""
+        path = self._cache_path(trading_date)
+        if not os.path.exists(path):
+            return False
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"載入合約快取失敗: {e}")
+            return False
+
+        if data.get('trading_date') != trading_date:
+            return False
+
+        self.trading_date = trading_date
+        self.index = data.get('contracts', {})
+        self._contracts = {}
+        self._missing = set()
+        self._rebuild_month_index()
+        logger.info(f"已載入 {trading_date} 合約快取 共 {len(self.index)} 筆")
+        return True
+
+    def save(self):
+        """將合約索引存檔"""
+        if not self.trading_date:
+            return False
+
+        try:
+            with open(self._cache_path(self.trading_date), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'trading_date': self.trading_date,
+                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'contracts': self.index
+                }, f, ensure_ascii=False)
+            return True
+        except Exception as e:
+            logger.warning(f"儲存合約快取失敗: {e}")
+            return False
+
+    def build(self, trading_date=None):
+        """掃描 Shioaji 合約樹建立索引 (只在每日第一次登入時執行)"""
+        self.trading_date = trading_date or get_trading_date()
+        self.index = {}
+        self._contracts = {}
+        self._missing = set()
+
+        for product in FUTURES_PRODUCTS:
+            for contract in self._iter_category(self.api.Contracts.Futures, product):
+                self._add(product, contract)
+
+        for product in OPTIONS_PRODUCTS:
+            for contract in self._iter_category(self.api.Contracts.Options, product):
+                self._add(product, contract)
+
+        self._rebuild_month_index()
+        logger.info(f"已建立 {self.trading_date} 合約快取 共 {len(self.index)} 筆")
+
+    def _iter_category(self, root, product):
+        """列舉某商品類別下的所有合約"""
+        try:
+            category = getattr(root, product)
+        except Exception:
+            return []
+        if category is None:
+            return []
+        try:
+            return list(category)
+        except Exception as e:
+            logger.warning(f"無法列舉 {product}: {e}")
+            return []
+
+    def _add(self, product, contract):
+        code = getattr(contract, 'code', '')
+        if not code:
+            return
+
+        right = str(getattr(contract, 'option_right', '') or '')
+        if 'Call' in right:
+            cp = 'C'
+        elif 'Put' in right:
+            cp = 'P'
+        else:
+            cp = ''
+
+        # 股票期貨/選擇權沒有預設乘數,改用合約的每口單位
+        multiplier = (getattr(contract, 'multiplier', 0) or DEFAULT_MULTIPLIERS.get(product)
+                      or getattr(contract, 'unit', 0) or 1)
+
+        self.index[code] = {
+            'product': product,
+            'expiry': str(getattr(contract, 'delivery_date', '') or '').replace('/', ''),
+            'strike': float(getattr(contract, 'strike_price', 0) or 0),
+            'cp': cp,
+            'multiplier': multiplier,
+            'delivery_month': str(getattr(contract, 'delivery_month', '') or ''),
+        }
+        self._contracts[code] = contract
+
+    def _rebuild_month_index(self):
+        self._by_month = {}
+        for code, info in self.index.items():
+            if info['cp']:
+                continue
+            key = (info['product'], info['delivery_month'])
+            # 同月份有 R1/R2 連續月代碼時,保留實際月份代碼
+            if key not in self._by_month or code[-2:] not in ('R1', 'R2'):
+                self._by_month[key] = code
+
+    # ===== 查詢 =====
+    def get(self, code):
+        """
+        取得合約資訊 dict,找不到時回傳 None
+        不在每日索引中的合約 (股票期貨/選擇權等) 第一次查詢時向 API 取得並加入索引
+        """
+        info = self.index.get(code)
+        if info is None and self.api is not None and code not in self._missing:
+            info = self._fetch_info(code)
+        return info
+
+    def _fetch_info(self, code):
+        for root in (self.api.Contracts.Futures, self.api.Contracts.Options):
+            try:
+                contract = root[code]
+            except Exception:
+                contract = None
+            if contract is not None:
+                self._add(code[:3], contract)
+                return self.index.get(code)
+        self._missing.add(code)
+        return None
+
+    def get_multiplier(self, code, default=1):
+        info = self.get(code)
+        return info['multiplier'] if info else default
+
+    def get_contract(self, code):
+        """取得 Shioaji 合約物件 (從快取載入時第一次查詢才向 API 取得)"""
+        contract = self._contracts.get(code)
+        if contract is not None or self.api is None:
+            return contract
+
+        info = self.index.get(code)
+        if not info:
+            return None
+
+        try:
+            root = self.api.Contracts.Options if info['cp'] else self.api.Contracts.Futures
+            contract = root[code]
+        except Exception:
+            contract = None
+
+        if contract is not None:
+            self._contracts[code] = contract
+        return contract
+
+    def find_futures(self, product, delivery_month):
+        """依商品與交割月份找期貨代碼"""
+        return self._by_month.get((product, delivery_month))
+
+    def get_delivery_months(self, product):
+        """取得某期貨商品所有交割月份 (已排序)"""
+        return sorted(m for (p, m) in self._by_month if p == product)
+
+    def near_month(self, product):
+        """取得近月期貨代碼"""
+        months = self.get_delivery_months(product)
+        return self._by_month[(product, months[0])] if months else None
+
+    def next_month(self, code):
+        """取得同商品下一個交割月份的期貨代碼"""
+        info = self.index.get(code)
+        if not info or info['cp']:
+            return None
+
+        months = self.get_delivery_months(info['product'])
+        for month in months:
+            if month > info['delivery_month']:
+                return self._by_month[(info['product'], month)]
+        return None
@@ -0,0 +1,601 @@
+# backend/engine.py
+"""
+交易引擎行程模組
+負責在獨立行程中持有 Shioaji 連線、保證金計算與價差監測,
+將倉位與風險狀態寫入共享記憶體,GUI 只讀取並透過命令佇列下指令
+"""
+import itertools
+import logging
+import multiprocessing as mp
+import queue
+import threading
+import time
+
+from config import load_risk_limits
+from my_utils import MarginFetcher
+from my_utils.helpers import tick_price
+from my_utils.logger import setup_logging
+from my_utils.pretrade_check import PreTradeChecker, REJECT, WARN
+from my_utils.profiler import SamplingProfiler
+from .core import TradingBackend
+from .contract_cache import ContractCache
+from .subscription_manager import SubscriptionManager
+from .position_book import PositionBook
+from .spread_book import SpreadBook
+from .shared_positions import SharedPositionTable
+from .stream_server import StreamServer
+try:
+    from my_utils.exporter import ColumnarExporter
+except ImportError:  # 沒有安裝 pyarrow 時不匯出
+    ColumnarExporter = None
+
+logger = logging.getLogger(__name__)
+
+MONITOR_INTERVAL = 30  # 秒
+PUBLISH_INTERVAL = 0.05  # 秒,報價更新合併後寫入共享記憶體的最短間隔
+EXPORT_INTERVAL = 1    # 秒,風險走勢匯出間隔
+EXPORT_POSITIONS_INTERVAL = 60  # 秒,倉位快照匯出間隔
+
+# GUI 可直接轉送給引擎端 TradingBackend 的方法
+BACKEND_COMMANDS = (
+    'close_position',
+    'close_all_positions',
+    'open_position',
+    'roll_futures',
+    'get_futures_spread',
+    'check_and_roll_if_spread_met',
+    'change_option_by_code',
+    'change_option_by_code_with_price',
+    'get_five_quote',
+    'calculate_suggestion',
+)
+
+# 由引擎本身處理的命令
+ENGINE_COMMANDS = (
+    'login',
+    'logout',
+    'refresh_positions',
+    'start_subscribing',
+    'stop_subscribing',
+    'start_spread_monitoring',
+    'stop_spread_monitoring',
+    'start_profiling',
+    'stop_profiling',
+    'profile_report',
+    'shutdown',
+)
+
+
+class TradingEngine:
+    def __init__(self, table, backend=None, margin_fetcher=None, stream=None, events=None):
+        """
+        Args:
+            events: 監測觸發與轉倉結果的回報函式 (dict);None 時只記錄 (無 GUI 模式)
+        """
+        self.table = table
+        self.stream = stream
+        self.events = events
+        self.backend = backend or TradingBackend(simulation=False)
+        self.margin_fetcher = margin_fetcher or MarginFetcher()
+        self.contract_cache = ContractCache(cache_dir=getattr(self.backend, 'cache_dir', '.'))
+        self.margin_fetcher.contract_lookup = self.contract_cache.get
+        self.subscriptions = SubscriptionManager(contract_lookup=self.contract_cache.get_contract)
+        self.position_book = PositionBook(multiplier_lookup=self.contract_cache.get_multiplier)
+        self.spread_book = SpreadBook(next_month_lookup=self.contract_cache.next_month)
+        self.pretrade = PreTradeChecker(self.margin_fetcher, load_risk_limits())
+
+        self.positions = []
+        self.underlying_price = 0
+        self.is_subscribed = False
+        self.spread_monitors = []
+        self.running = True
+        self._publish_lock = threading.Lock()  # 保護 self.positions 的內容
+        self._dirty = False  # 報價/成交更新後尚未寫入共享記憶體
+        self._next_publish = 0.0
+        self._next_monitor_check = 0.0
+        self._spread_version = 0
+        self.profiler = SamplingProfiler()
+        self.exporter = ColumnarExporter() if ColumnarExporter else None
+        self._next_export = 0.0
+        self._next_position_export = 0.0
+        if self.exporter is not None:
+            self.exporter.start()
+
+    # ===== 登入/登出 =====
+    def login(self, api_key, secret_key):
+        success, msg = self.backend.login(api_key, secret_key)
+        if success:
+            self.contract_cache.api = self.backend.api
+            self.contract_cache.load_or_build()
+            self.subscriptions.api = self.backend.api
+            self.refresh_positions()
+        return success, msg
+
+    def logout(self):
+        self.subscriptions.release_all()
+        self.spread_book.clear()
+        self.is_subscribed = False
+        self.backend.logout()
+        with self._publish_lock:
+            self.positions = []
+        self.publish()
+        return True
+
+    # ===== 倉位 =====
+    def refresh_positions(self):
+        if not self.backend.connected:
+            return []
+
+        raw_data = self.backend.get_positions()
+        self.underlying_price = self.backend.get_underlying_price()
+        for p in raw_data:
+            p['margin'] = self.margin_fetcher.calculate_margin(
+                p.get('code', ''),
+                int(float(p.get('quantity', 0))),
+                last_price=p.get('last_price', 0),
+                underlying_price=self.underlying_price
+            )
+
+        with self._publish_lock:
+            self.positions = raw_data
+        self.position_book.load(raw_data)
+        self.pretrade.load(raw_data, self.underlying_price, equity=self._equity())
+        if self.is_subscribed:
+            self.subscriptions.set_consumer('positions', [p['code'] for p in raw_data])
+        self.publish()
+        return raw_data
+
+    def _equity(self):
+        """帳戶權益數 (自動轉倉的下單前風控用),查不到時為 None"""
+        api = getattr(self.backend, 'api', None)
+        if api is None:
+            return None
+        try:
+            return float(api.margin(api.futopt_account).equity)
+        except Exception as e:
+            logger.warning(f"取得帳戶權益數失敗: {e}", extra={'rate_key': 'engine.equity'})
+            return None
+
+    def publish(self):
+        """計算總計並寫入共享記憶體"""
+        with self._publish_lock:
+            self._dirty = False
+            deltas = [float(p.get('est_delta', 0)) * float(p.get('quantity', 0)) for p in self.positions]
+            summary = {
+                'connected': self.backend.connected,
+                'underlying_price': self.underlying_price,
+                'total_pnl': sum(int(p.get('calc_pnl', 0)) for p in self.positions),
+                'total_margin': sum(p.get('margin', 0) for p in self.positions),
+                'net_delta': sum(deltas),
+                'long_delta': sum(d for d in deltas if d > 0),
+                'short_delta': sum(d for d in deltas if d < 0),
+            }
+            self.table.publish(self.positions, summary)
+            if self.stream is not None:
+                self.stream.publish(summary, self.positions)
+
+    # ===== 訂閱與回調 (Shioaji 回調執行緒) =====
+    def start_subscribing(self, codes=None):
+        codes = codes or [p['code'] for p in self.positions]
+        self.subscriptions.set_callbacks(self.on_quote, self.on_order)
+        self.subscriptions.set_consumer('positions', codes)
+        self.is_subscribed = all(self.subscriptions.is_subscribed(code) for code in codes)
+        return self.is_subscribed
+
+    def stop_subscribing(self):
+        self.subscriptions.release_consumer('positions', flush=False)
+        self.subscriptions.purge()
+        self.is_subscribed = False
+        return True
+
+    def on_quote(self, exchange, tick):
+        try:
+            self.spread_book.on_bidask(exchange, tick)
+            code = getattr(tick, 'code', '')
+            if self.exporter is not None and not isinstance(getattr(tick, 'bid_price', None), (list, tuple)):
+                self.exporter.record_tick(code, tick)
+            close = tick_price(tick)
+            if close <= 0:
+                return
+
+            # 只更新倉位並標記,由主迴圈合併後寫入共享記憶體
+            multiplier = self.contract_cache.get_multiplier(code)
+            with self._publish_lock:
+                for p in self.positions:
+                    if p.get('code') != code:
+                        continue
+                    qty = float(p.get('quantity', 0))
+                    cost = float(p.get('price', 0))
+                    diff = (close - cost) if 'Buy' in str(p.get('direction', '')) else (cost - close)
+                    p['last_price'] = close
+                    p['calc_pnl'] = int(diff * qty * multiplier)
+                    p['margin'] = self.margin_fetcher.calculate_margin(
+                        code, int(qty), last_price=close, underlying_price=self.underlying_price
+                    )
+                    self._dirty = True
+                    break
+        except Exception as e:
+            logger.exception(f"報價處理錯誤: {e}", extra={'rate_key': 'engine.on_quote'})
+
+    def on_order(self, stat, msg):
+        code = self.position_book.on_order_update(stat, msg)
+        if not code:
+            return
+
+        book = self.position_book.get(code)
+        self.pretrade.set_position(code, book['qty'] if book else 0)
+        with self._publish_lock:
+            row = next((p for p in self.positions if p.get('code') == code), None)
+            if row is None or book is None or book['qty'] == 0:
+                # 新增或平光的代碼,下一輪主迴圈重新查詢倉位
+                self.position_book.dirty = True
+                return
+
+            row['quantity'] = abs(book['qty'])
+            row['price'] = round(book['avg_cost'], 2)
+            self._dirty = True
+
+    # ===== 價差監測 =====
+    def start_spread_monitoring(self, code, qty, direction, target_spread, is_逆價差, auto_execute,
+                                monitor_id=None):
+        self.spread_monitors.append({
+            'id': monitor_id,
+            'code': code,
+            'qty': qty,
+            'direction': direction,
+            'target_spread': target_spread,
+            'is_逆價差': is_逆價差,
+            'auto_execute': auto_execute,
+            'active': True,
+            'retry_at': 0.0
+        })
+        self._next_monitor_check = 0.0
+        self.watch_spreads()
+        return True
+
+    def stop_spread_monitoring(self):
+        self.spread_monitors = []
+        self.watch_spreads()
+        return True
+
+    def watch_spreads(self):
+        """依監測中的代碼維護價差簿,並訂閱兩腳的五檔"""
+        nears = sorted({m['code'] for m in self.spread_monitors if m['active']})
+        legs = self.spread_book.set_pairs(nears)
+        self.subscriptions.set_callbacks(self.on_quote, self.on_order)
+        self.subscriptions.set_consumer('spreads', legs, quote_type='bidask')
+
+    def report(self, event, monitor, **fields):
+        """回報監測事件給 GUI (triggered/confirm/rejected/failed)"""
+        if self.events is None:
+            return
+        try:
+            self.events(dict(fields, event=event, id=monitor.get('id'), code=monitor['code']))
+        except Exception as e:
+            logger.warning(f"回報監測事件失敗: {e}", extra={'rate_key': 'engine.report'})
+
+    def check_spread_monitors(self, fallback=True):
+        """
+        自動下單的監測直接轉倉,需確認的監測交給 GUI 詢問 (無 GUI 時僅記錄觸發)
+        轉倉失敗時保留監測,MONITOR_INTERVAL 秒後價差仍符合時重試
+
+        Args:
+            fallback: 價差簿沒有新鮮五檔時是否改向 backend 查詢 (定期檢查時)
+        """
+        triggered = False
+        now = time.time()
+        for monitor in self.spread_monitors[:]:
+            if not monitor['active'] or now < monitor['retry_at']:
+                continue
+
+            is_sell = 'Sell' in str(monitor['direction'])
+            result = self.spread_book.check(
+                monitor['code'], monitor['target_spread'], monitor['is_逆價差'], is_sell
+            )
+            if result is None:
+                if not fallback:
+                    continue
+                result = self.backend.check_and_roll_if_spread_met(
+                    monitor['code'],
+                    monitor['qty'],
+                    monitor['direction'],
+                    monitor['target_spread'],
+                    monitor['is_逆價差'],
+                    is_sell_position=is_sell
+                )
+            should_roll, msg, spread = result
+            if not should_roll:
+                continue
+
+            logger.info(f"價差監測觸發: {msg}")
+            if not monitor.get('auto_execute', False):
+                # 由 GUI 詢問並轉倉,引擎不再檢查
+                self.report('confirm', monitor, message=msg, spread=spread)
+                self.spread_monitors.remove(monitor)
+                triggered = True
+                continue
+
+            check = self.pretrade.check(self._roll_orders(monitor['code'], monitor['qty'], is_sell))
+            text = "; ".join(check['messages'])
+            if check['level'] == REJECT:
+                # 與 GUI 相同: 不移除監測,風險降低後價差仍符合時再轉倉
+                logger.warning(f"{monitor['code']} 自動轉倉未通過下單前風控,監測保留: {text}",
+                               extra={'rate_key': f"monitor.pretrade.{monitor['code']}"})
+                self.report('rejected', monitor, message=text, spread=spread)
+                continue
+            if check['level'] == WARN:
+                logger.warning(f"下單前檢查警告: {text}", extra={'rate_key': 'pretrade.warn'})
+
+            success, roll_msg = self.backend.roll_futures(
+                monitor['code'],
+                monitor['qty'],
+                monitor['direction'],
+                is_sell_position=is_sell
+            )
+            self.position_book.dirty = True
+            if not success:
+                logger.warning(f"{monitor['code']} 自動轉倉失敗,監測保留: {roll_msg}",
+                               extra={'rate_key': f"engine.roll.{monitor['code']}"})
+                monitor['retry_at'] = now + MONITOR_INTERVAL
+                self.report('failed', monitor, message=roll_msg, spread=spread)
+                continue
+
+            logger.info(f"自動轉倉成功: {roll_msg}")
+            self.report('triggered', monitor, message=roll_msg, spread=spread)
+            self.spread_monitors.remove(monitor)
+            triggered = True
+
+        if triggered:
+            self.watch_spreads()
+
+    def _roll_orders(self, code, qty, is_sell):
+        """轉倉的兩筆委託: 平近月、建下一個月"""
+        orders = [{'code': code, 'action': 'Buy' if is_sell else 'Sell', 'quantity': qty}]
+        next_code = self.contract_cache.next_month(code)
+        if next_code:
+            orders.append({'code': next_code, 'action': 'Sell' if is_sell else 'Buy', 'quantity': qty})
+        return orders
+
+    # ===== 主迴圈 =====
+    def handle(self, name, args, kwargs):
+        if name in ENGINE_COMMANDS:
+            return getattr(self, name)(*args, **kwargs)
+        if name in BACKEND_COMMANDS:
+            result = getattr(self.backend, name)(*args, **kwargs)
+            if name in ('close_position', 'close_all_positions', 'open_position', 'roll_futures'):
+                self.position_book.dirty = True
+            return result
+        raise ValueError(f"未知的命令: {name}")
+
+    def shutdown(self):
+        self.running = False
+        return True
+
+    # ===== 診斷 =====
+    def start_profiling(self, duration):
+        return self.profiler.start(duration)
+
+    def stop_profiling(self):
+        self.profiler.stop()
+        return True
+
+    def profile_report(self):
+        """最近一次的分析報告 (分析中或未曾分析時為 None)"""
+        if self.profiler.running or not self.profiler.samples:
+            return None
+        return self.profiler.report()
+
+    def run(self, commands, replies=None):
+        """
+        引擎主迴圈
+
+        Args:
+            commands: multiprocessing.Queue,元素為 (cmd_id, name, args, kwargs)
+            replies: multiprocessing.Queue,回傳 (cmd_id, ok, result);None 時不回覆
+        """
+        while self.running:
+            try:
+                cmd_id, name, args, kwargs = commands.get(timeout=PUBLISH_INTERVAL)
+            except queue.Empty:
+                cmd_id = None
+            except (EOFError, OSError):
+                break
+
+            if cmd_id is not None:
+                try:
+                    result, ok = self.handle(name, args, kwargs), True
+                except Exception as e:
+                    result, ok = str(e), False
+                if replies is not None:
+                    replies.put((cmd_id, ok, result))
+
+            now = time.time()
+            if self._dirty and now >= self._next_publish:
+                self._next_publish = now + PUBLISH_INTERVAL
+                self.publish()
+
+            if not self.backend.connected:
+                continue
+
+            if self.position_book.needs_reconcile(now):
+                self.refresh_positions()
+            if self.exporter is not None and self.positions and now >= self._next_export:
+                self._next_export = now + EXPORT_INTERVAL
+                self.export_snapshot(now)
+
+            # 價差簿有變動時立即以可成交價差檢查,其餘每 MONITOR_INTERVAL 秒定期檢查
+            polling = now >= self._next_monitor_check
+            if self.spread_monitors and (polling or self.spread_book.version != self._spread_version):
+                if polling:
+                    self._next_monitor_check = now + MONITOR_INTERVAL
+                self._spread_version = self.spread_book.version
+                self.check_spread_monitors(fallback=polling)
+
+        if self.backend.connected:
+            self.logout()
+        if self.exporter is not None:
+            self.exporter.stop()
+
+    def export_snapshot(self, now):
+        """匯出一筆風險走勢,每 EXPORT_POSITIONS_INTERVAL 秒附帶倉位快照 (寫檔在背景執行緒)"""
+        with self._publish_lock:
+            positions = [dict(p) for p in self.positions]
+        deltas = [float(p.get('est_delta', 0)) * float(p.get('quantity', 0)) for p in positions]
+        self.exporter.record_risk(
+            sum(int(p.get('calc_pnl', 0)) for p in positions),
+            sum(deltas),
+            sum(p.get('margin', 0) for p in positions),
+            ts=now
+        )
+        if now >= self._next_position_export:
+            self._next_position_export = now + EXPORT_POSITIONS_INTERVAL
+            self.exporter.record_positions(positions, ts=now)
+
+
+def run_engine(shm_name, commands, replies, credentials=None, backend_factory=None, stream_port=None):
+    """
+    引擎行程進入點
+
+    Args:
+        shm_name: 共享記憶體名稱 (由 EngineClient 建立)
+        commands / replies: 命令與回覆佇列
+        credentials: 有提供時啟動後立即登入 (無 GUI 模式)
+        backend_factory: 建立 backend 的函式,預設為 TradingBackend(simulation=False)
+        stream_port: 有提供時在 localhost 啟動串流服務
+    """
+    setup_logging(log_file='logs/engine.log')
+    table = SharedPositionTable(shm_name)
+    stream = None
+    try:
+        if stream_port is not None:
+            stream = StreamServer(port=stream_port)
+            stream.start()
+        backend = backend_factory() if backend_factory else None
+        # 監測事件以 cmd_id 為 None 的回覆送回 GUI
+        events = (lambda event: replies.put((None, True, event))) if replies is not None else None
+        engine = TradingEngine(table, backend=backend, stream=stream, events=events)
+        if credentials:
+            success, msg = engine.login(credentials.get('api_key', ''), credentials.get('secret_key', ''))
+            logger.info(f"登入{'成功' if success else '失敗'}: {msg}")
+            if success:
+                engine.start_subscribing()
+        engine.run(commands, replies)
+    finally:
+        if stream is not None:
+            stream.stop()
+        table.close()
+
+
+class EngineClient:
+    """
+    GUI 端的引擎代理,介面與 TradingBackend 相同,
+    讀取來自共享記憶體,操作轉成命令送往引擎行程
+    """
+    remote = True
+    api = None
+
+    def __init__(self, backend_factory=None, credentials=None, timeout=30, stream_port=None):
+        self.timeout = timeout
+        self.table = SharedPositionTable(create=True)
+        self.commands = mp.Queue()
+        self.replies = mp.Queue()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._events = []  # 引擎主動送回的監測事件 (等待 poll_events 取走)
+        self.process = mp.Process(
+            target=run_engine,
+            args=(self.table.name, self.commands, self.replies, credentials, backend_factory, stream_port),
+            daemon=True
+        )
+        self.process.start()
+
+    def _call(self, name, *args, timeout=None, **kwargs):
+        with self._lock:
+            cmd_id = next(self._ids)
+            self.commands.put((cmd_id, name, args, kwargs))
+            deadline = time.time() + (timeout or self.timeout)
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"引擎未回應: {name}")
+                try:
+                    reply_id, ok, result = self.replies.get(timeout=remaining)
+                except queue.Empty:
+                    raise TimeoutError(f"引擎未回應: {name}") from None
+                if reply_id is None:
+                    self._events.append(result)
+                    continue
+                if reply_id != cmd_id:
+                    continue
+                if not ok:
+                    raise RuntimeError(result)
+                return result
+
+    def __getattr__(self, name):
+        if name in BACKEND_COMMANDS or name in ENGINE_COMMANDS:
+            return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+        raise AttributeError(name)
+
+    def poll_events(self):
+        """取出引擎送回的監測事件 (不等待;命令執行中時下一輪再取)"""
+        if not self._lock.acquire(blocking=False):
+            return []
+        try:
+            while True:
+                try:
+                    reply_id, ok, result = self.replies.get_nowait()
+                except queue.Empty:
+                    break
+                if reply_id is None:
+                    self._events.append(result)
+            events, self._events = self._events, []
+            return events
+        finally:
+            self._lock.release()
+
+    # ===== 與 TradingBackend 相同的介面 =====
+    @property
+    def connected(self):
+        return self.read()[1].get('connected', False)
+
+    def read(self):
+        """讀取共享記憶體: (seq, summary, positions)"""
+        return self.table.read()
+
+    def login(self, api_key, secret_key):
+        return self._call('login', api_key, secret_key, timeout=120)
+
+    def get_positions(self):
+        return self.read()[2]
+
+    def get_underlying_price(self):
+        return self.read()[1].get('underlying_price', 0)
+
+    def start_subscribing(self, codes, quote_callback=None, order_callback=None):
+        # 回調由引擎端處理,GUI 以輪詢共享記憶體取得更新
+        return self._call('start_subscribing', codes)
+
+    def close(self):
+        """結束引擎行程並釋放共享記憶體"""
+        try:
+            if self.process.is_alive():
+                self._call('shutdown', timeout=10)
+        except Exception as e:
+            logger.warning(f"關閉引擎時發生錯誤: {e}")
+        self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.table.close()
+
+
+def run_headless(credentials, backend_factory=None, stream_port=None):
+    """無 GUI 模式: 在目前行程直接執行引擎,按 Ctrl+C 結束"""
+    table = SharedPositionTable(create=True)
+    commands = mp.Queue()
+    logger.info(f"無 GUI 模式啟動,共享記憶體: {table.name}")
+    try:
+        run_engine(table.name, commands, None, credentials, backend_factory, stream_port)
+    except KeyboardInterrupt:
+        logger.info("引擎已停止")
+    finally:
+        table.close()
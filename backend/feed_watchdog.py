@@ -0,0 +1,199 @@
+# backend/feed_watchdog.py
+"""
+報價看門狗模組
+負責在背景執行緒追蹤每個訂閱代碼與每種報價 (Tick/BidAsk) 的最後更新時間,
+交易時段內依各代碼平常的報價頻率判斷是否停滯,
+停滯時重新訂閱並以快照補上最新價格,並回報目前停滯的代碼
+"""
+import logging
+import threading
+import time
+
+from .subscription_manager import QUOTE_TICK, QUOTE_BIDASK
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECK_INTERVAL = 5.0
+DEFAULT_MIN_STALL = 60.0       # 單一代碼最短停滯判定秒數
+DEFAULT_IDLE_STALL = 300.0     # 訂閱後從未收到報價的代碼
+DEFAULT_FEED_STALL = 20.0      # 整個報價來源都沒有更新
+DEFAULT_STALL_FACTOR = 8.0     # 超過平均報價間隔的倍數
+DEFAULT_COOLDOWN = 120.0       # 同一代碼重新訂閱的最短間隔 (之後每次加倍,收到報價後重置)
+DEFAULT_GRACE = 60.0           # 開盤後的寬限期
+_EWMA_ALPHA = 0.1
+
+
+class FeedWatchdog:
+    def __init__(self, subscriptions, snapshots=None, session_clock=None,
+                 on_stale=None, on_backfill=None, check_interval=DEFAULT_CHECK_INTERVAL,
+                 min_stall=DEFAULT_MIN_STALL, idle_stall=DEFAULT_IDLE_STALL,
+                 feed_stall=DEFAULT_FEED_STALL, stall_factor=DEFAULT_STALL_FACTOR,
+                 cooldown=DEFAULT_COOLDOWN, grace=DEFAULT_GRACE, clock=time.monotonic):
+        """
+        Args:
+            subscriptions: SubscriptionManager
+            snapshots: SnapshotService (補價用)
+            session_clock: SessionClock,None 表示一律視為交易時段
+            on_stale: 停滯代碼集合改變時呼叫 on_stale(codes)
+            on_backfill: 補價時呼叫 on_backfill(snapshot)
+            clock: 回傳秒數的時鐘 (預設 time.monotonic,測試可替換)
+        """
+        self.subscriptions = subscriptions
+        self.snapshots = snapshots
+        self.session_clock = session_clock
+        self.on_stale = on_stale
+        self.on_backfill = on_backfill
+        self.check_interval = check_interval
+        self.min_stall = min_stall
+        self.idle_stall = idle_stall
+        self.feed_stall = feed_stall
+        self.stall_factor = stall_factor
+        self.cooldown = cooldown
+        self.grace = grace
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._last = {}        # (code, quote_type) -> 最後報價時間
+        self._interval = {}    # (code, quote_type) -> 平均報價間隔 (EWMA)
+        self._feed_last = {}   # quote_type -> 最後報價時間
+        self._feed_interval = {}  # quote_type -> 平均報價間隔 (EWMA)
+        self._watch_since = {}  # (code, quote_type) -> 開始監看時間
+        self._resubscribed = {}  # (code, quote_type) -> (上次重新訂閱時間, 次數)
+        self.stale = set()
+        self._open_since = None
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ===== 報價回調執行緒 =====
+    def on_tick(self, code, quote_type=QUOTE_TICK):
+        now = self.clock()
+        key = (code, quote_type)
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None:
+                gap = now - last
+                avg = self._interval.get(key)
+                self._interval[key] = gap if avg is None else avg + _EWMA_ALPHA * (gap - avg)
+            self._last[key] = now
+            self._resubscribed.pop(key, None)
+
+            feed_last = self._feed_last.get(quote_type)
+            if feed_last is not None:
+                gap = now - feed_last
+                avg = self._feed_interval.get(quote_type)
+                self._feed_interval[quote_type] = gap if avg is None else avg + _EWMA_ALPHA * (gap - avg)
+            self._feed_last[quote_type] = now
+
+    # ===== 啟動/停止 =====
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='feed-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.check_interval + 1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.exception(f"報價看門狗錯誤: {e}", extra={'rate_key': 'watchdog.check'})
+
+    # ===== 檢查 =====
+    def check(self, now=None):
+        """
+        檢查所有訂閱代碼,處理停滯的代碼
+
+        Returns:
+            set: 目前停滯的代碼
+        """
+        now = self.clock() if now is None else now
+        if self.session_clock is not None and not self.session_clock.is_open():
+            self._open_since = None
+            self._set_stale(set())
+            return self.stale
+        if self._open_since is None:
+            self._open_since = now
+        if now - self._open_since < self.grace:
+            return self.stale
+
+        keys = {(code, qt) for qt in (QUOTE_TICK, QUOTE_BIDASK)
+                for code in self.subscriptions.get_codes(qt)}
+
+        stalled = []
+        with self._lock:
+            for key in keys:
+                self._watch_since.setdefault(key, now)
+            for key in list(self._watch_since):
+                if key not in keys:
+                    self._watch_since.pop(key, None)
+                    self._resubscribed.pop(key, None)
+
+            # 整個報價來源停滯 (平常有持續報價才判斷): 全部重新訂閱
+            dead_feeds = set()
+            for qt in {qt for _, qt in keys}:
+                if qt not in self._feed_last:
+                    continue
+                limit = max(self.feed_stall, self.stall_factor * self._feed_interval.get(qt, 0.0))
+                if now - max(self._feed_last[qt], self._open_since) > limit:
+                    dead_feeds.add(qt)
+
+            for key in keys:
+                last = self._last.get(key)
+                if key[1] in dead_feeds:
+                    stalled.append(key)
+                elif last is None:
+                    if now - max(self._watch_since[key], self._open_since) > self.idle_stall:
+                        stalled.append(key)
+                else:
+                    limit = max(self.min_stall, self.stall_factor * self._interval.get(key, 0.0))
+                    if now - max(last, self._open_since) > limit:
+                        stalled.append(key)
+
+        if dead_feeds:
+            logger.warning(f"報價來源停滯: {', '.join(sorted(dead_feeds))}",
+                           extra={'rate_key': 'watchdog.feed'})
+
+        self._recover(stalled, now)
+        self._set_stale({code for code, _ in stalled})
+        return self.stale
+
+    def _recover(self, stalled, now):
+        """重新訂閱 (有冷卻時間) 並以快照補價"""
+        due = []
+        with self._lock:
+            for key in stalled:
+                last, attempts = self._resubscribed.get(key, (None, 0))
+                if last is None or now - last > self.cooldown * 2 ** (attempts - 1):
+                    self._resubscribed[key] = (now, attempts + 1)
+                    due.append(key)
+        if not due:
+            return
+
+        for quote_type in (QUOTE_TICK, QUOTE_BIDASK):
+            codes = [code for code, qt in due if qt == quote_type]
+            if codes:
+                count = self.subscriptions.resubscribe(codes, quote_type)
+                logger.warning(f"報價停滯,重新訂閱 {count} 檔 {quote_type}: {', '.join(codes[:5])}")
+
+        if self.snapshots is None:
+            return
+        codes = sorted({code for code, _ in due})
+        snapshots = self.snapshots.get_snapshots(codes, max_age=0)
+        if self.on_backfill:
+            for snap in snapshots.values():
+                self.on_backfill(snap)
+
+    def _set_stale(self, stale):
+        if stale == self.stale:
+            return
+        self.stale = stale
+        if self.on_stale:
+            self.on_stale(set(stale))
@@ -0,0 +1,172 @@
+# backend/order_book.py
+"""
+五檔報價快取模組
+負責以 BidAsk 訂閱持續更新每個代碼的最新五檔,讓 GUI 不需逐檔查詢
+"""
+import time
+from array import array
+
+DEPTH = 5
+
+# 每個代碼一段固定長度的陣列: 買價x5, 買量x5, 賣價x5, 賣量x5
+_BID_PRICE = 0
+_BID_VOLUME = DEPTH
+_ASK_PRICE = DEPTH * 2
+_ASK_VOLUME = DEPTH * 3
+_SLOT_SIZE = DEPTH * 4
+
+
+class _BookSlot:
+    """單一代碼的五檔 (seqlock: 寫入中 seq 為奇數)"""
+    __slots__ = ('seq', 'values', 'ts')
+
+    def __init__(self):
+        self.seq = 0
+        self.values = array('d', bytes(8 * _SLOT_SIZE))
+        self.ts = 0.0
+
+
+class OrderBookCache:
+    def __init__(self):
+        # 只有回調執行緒會新增 slot,dict 的讀取在 GIL 下不需要鎖
+        self._slots = {}
+
+    # ===== 寫入 (報價回調執行緒) =====
+    def on_bidask(self, exchange, bidask):
+        """處理 BidAsk 回調,回傳是否有更新"""
+        code = getattr(bidask, 'code', '')
+        bid_price = getattr(bidask, 'bid_price', None)
+        ask_price = getattr(bidask, 'ask_price', None)
+        if not code or bid_price is None or ask_price is None:
+            return False
+
+        self.update(
+            code,
+            bid_price,
+            getattr(bidask, 'bid_volume', None) or (),
+            ask_price,
+            getattr(bidask, 'ask_volume', None) or (),
+        )
+        return True
+
+    def update(self, code, bid_price, bid_volume, ask_price, ask_volume, ts=None):
+        slot = self._slots.get(code)
+        if slot is None:
+            slot = _BookSlot()
+            self._slots[code] = slot
+
+        values = slot.values
+        slot.seq += 1
+        for i in range(DEPTH):
+            values[_BID_PRICE + i] = float(bid_price[i]) if i < len(bid_price) else 0.0
+            values[_BID_VOLUME + i] = float(bid_volume[i]) if i < len(bid_volume) else 0.0
+            values[_ASK_PRICE + i] = float(ask_price[i]) if i < len(ask_price) else 0.0
+            values[_ASK_VOLUME + i] = float(ask_volume[i]) if i < len(ask_volume) else 0.0
+        slot.ts = ts if ts is not None else time.time()
+        slot.seq += 1
+
+    def clear(self, code=None):
+        if code is None:
+            self._slots = {}
+        else:
+            self._slots.pop(code, None)
+
+    # ===== 讀取 (GUI 執行緒,不加鎖) =====
+    def _read(self, code):
+        slot = self._slots.get(code)
+        if slot is None:
+            return None, 0.0
+
+        for _ in range(10):
+            seq = slot.seq
+            if seq % 2:
+                continue
+            values = slot.values.tolist()
+            ts = slot.ts
+            if slot.seq == seq:
+                return values, ts
+        # 寫入非常頻繁時退而求其次,回傳目前內容
+        return slot.values.tolist(), slot.ts
+
+    def get_depth(self, code):
+        """
+        取得五檔報價
+
+        Returns:
+            dict: bid_price/bid_volume/ask_price/ask_volume (各 5 筆) 與 ts,
+                  沒有資料時回傳 None
+        """
+        values, ts = self._read(code)
+        if values is None:
+            return None
+        return {
+            'code': code,
+            'bid_price': values[_BID_PRICE:_BID_PRICE + DEPTH],
+            'bid_volume': [int(v) for v in values[_BID_VOLUME:_BID_VOLUME + DEPTH]],
+            'ask_price': values[_ASK_PRICE:_ASK_PRICE + DEPTH],
+            'ask_volume': [int(v) for v in values[_ASK_VOLUME:_ASK_VOLUME + DEPTH]],
+            'ts': ts,
+        }
+
+    def best_bid_ask(self, code):
+        """
+        取得最佳一檔
+
+        Returns:
+            tuple: (bid, bid_volume, ask, ask_volume),沒有資料時為 None
+        """
+        values, _ = self._read(code)
+        if values is None:
+            return None
+        return (values[_BID_PRICE], int(values[_BID_VOLUME]),
+                values[_ASK_PRICE], int(values[_ASK_VOLUME]))
+
+    def get_mid(self, code):
+        best = self.best_bid_ask(code)
+        if not best:
+            return 0.0
+        bid, _, ask, _ = best
+        if bid > 0 and ask > 0:
+            return (bid + ask) / 2
+        return bid or ask
+
+    def get_age(self, code, now=None):
+        """距離最後更新的秒數,沒有資料時回傳 None"""
+        slot = self._slots.get(code)
+        if slot is None or not slot.ts:
+            return None
+        return (now or time.time()) - slot.ts
+
+    def is_stale(self, code, max_age=5.0, now=None):
+        age = self.get_age(code, now)
+        return age is None or age > max_age
+
+    def rank(self, codes, side='bid', max_age=None):
+        """
+        依最佳一檔價格排序候選代碼 (更換選擇權標的時使用)
+
+        Args:
+            codes: 候選代碼
+            side: 'bid' 依買價由高到低, 'ask' 依賣價由低到高
+            max_age: 超過秒數的報價視為過期並排在最後
+
+        Returns:
+            list: [(code, price, volume, is_stale)]
+        """
+        now = time.time()
+        result = []
+        for code in codes:
+            best = self.best_bid_ask(code)
+            if best is None:
+                result.append((code, 0.0, 0, True))
+                continue
+            bid, bid_vol, ask, ask_vol = best
+            price, vol = (bid, bid_vol) if side == 'bid' else (ask, ask_vol)
+            stale = max_age is not None and self.is_stale(code, max_age, now)
+            result.append((code, price, vol, stale or price <= 0))
+
+        if side == 'bid':
+            result.sort(key=lambda r: (r[3], -r[1]))
+        else:
+            result.sort(key=lambda r: (r[3], r[1]))
+        return result
@@ -0,0 +1,174 @@
+# backend/position_book.py
+"""
+倉位簿模組
+負責依委託/成交回報即時更新口數、平均成本與已實現損益,定期才與 get_positions 對帳
+多帳戶時以 (帳戶, 代碼) 為鍵,不同帳戶的同一代碼各自計算成本與損益
+"""
+import logging
+import threading
+import time
+
+from my_utils.helpers import format_code
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RECONCILE_INTERVAL = 300  # 秒
+
+
+def deal_code(deal):
+    """
+    成交回報 -> 完整合約代碼
+    Shioaji 的 FuturesDeal 只有商品代碼 (例如 'TXO'),月份、履約價與買賣權在
+    delivery_month / strike_price / option_right 欄位
+    """
+    code = deal.get('code', '')
+    if not deal.get('delivery_month'):
+        return code
+    right = str(deal.get('option_right', '') or '')
+    cp = 'C' if 'Call' in right else 'P' if 'Put' in right else ''
+    return format_code(code, deal['delivery_month'], deal.get('strike_price', 0) or 0, cp) or code
+
+
+class PositionBook:
+    def __init__(self, multiplier_lookup=None, reconcile_interval=DEFAULT_RECONCILE_INTERVAL):
+        """
+        Args:
+            multiplier_lookup: code -> 乘數 的函式
+            reconcile_interval: 定期對帳秒數
+        """
+        self.multiplier_lookup = multiplier_lookup
+        self.reconcile_interval = reconcile_interval
+
+        self._lock = threading.Lock()
+        self._positions = {}   # (帳戶, code) -> {'qty': 帶正負號口數, 'avg_cost', 'realized_pnl'}
+        self._seen = set()     # 已處理的成交編號
+        self.last_reconcile = 0.0
+        self.dirty = False     # 有新增或平光的代碼,需要對帳
+
+    # ===== 對帳 =====
+    def load(self, positions):
+        """
+        以 backend.get_positions() 的結果覆蓋倉位簿
+
+        Returns:
+            list: 與倉位簿不一致的代碼
+        """
+        fresh = {}
+        for p in positions:
+            code = p.get('code', '')
+            if not code:
+                continue
+            qty = float(p.get('quantity', 0))
+            sign = 1 if 'Buy' in str(p.get('direction', '')) else -1
+            entry = fresh.setdefault((p.get('account', ''), code),
+                                     {'qty': 0.0, 'avg_cost': 0.0, 'realized_pnl': 0.0})
+            entry['qty'] += sign * qty
+            entry['avg_cost'] = float(p.get('price', 0))
+
+        with self._lock:
+            mismatched = set()
+            for key in set(fresh) | set(self._positions):
+                old = self._positions.get(key)
+                new = fresh.get(key)
+                old_qty = old['qty'] if old else 0.0
+                new_qty = new['qty'] if new else 0.0
+                if self.last_reconcile and abs(old_qty - new_qty) > 1e-9:
+                    mismatched.add(key[1])
+                if old and new:
+                    new['realized_pnl'] = old['realized_pnl']
+                elif old and old['realized_pnl']:
+                    # 已平光的代碼保留已實現損益
+                    fresh[key] = {'qty': 0.0, 'avg_cost': 0.0, 'realized_pnl': old['realized_pnl']}
+
+            self._positions = fresh
+            self.last_reconcile = time.time()
+            self.dirty = False
+
+        mismatched = sorted(mismatched)
+        if mismatched:
+            logger.warning(f"對帳差異: {', '.join(mismatched)}")
+        return mismatched
+
+    def needs_reconcile(self, now=None):
+        if self.dirty:
+            return True
+        return (now or time.time()) - self.last_reconcile >= self.reconcile_interval
+
+    # ===== 成交回報 =====
+    def on_order_update(self, stat, msg):
+        """
+        處理 api.set_order_callback 的回報,只有成交會更新倉位
+        多帳戶時回報需先標上 'account' (帳戶名稱)
+
+        Returns:
+            str: 有變動的代碼,沒有則為 None
+        """
+        if 'DEAL' not in str(stat).upper() or not isinstance(msg, dict):
+            return None
+        return self.apply_deal(msg)
+
+    def apply_deal(self, deal):
+        code = deal_code(deal)
+        key = (deal.get('account', ''), code)
+        qty = float(deal.get('quantity', 0) or 0)
+        price = float(deal.get('price', 0) or 0)
+        if not code or qty <= 0:
+            return None
+
+        deal_id = (deal.get('trade_id'), deal.get('seqno'), deal.get('exchange_seq'))
+        sign = 1 if 'Buy' in str(deal.get('action', '')) else -1
+        multiplier = self.multiplier_lookup(code) if self.multiplier_lookup else 1
+
+        with self._lock:
+            if any(deal_id):
+                if deal_id in self._seen:
+                    return None
+                self._seen.add(deal_id)
+
+            entry = self._positions.get(key)
+            if entry is None:
+                entry = {'qty': 0.0, 'avg_cost': 0.0, 'realized_pnl': 0.0}
+                self._positions[key] = entry
+                self.dirty = True
+
+            old_qty = entry['qty']
+            fill = sign * qty
+
+            if old_qty == 0 or (old_qty > 0) == (fill > 0):
+                # 加碼: 更新加權平均成本
+                new_qty = old_qty + fill
+                entry['avg_cost'] = (entry['avg_cost'] * abs(old_qty) + price * qty) / abs(new_qty)
+            else:
+                # 減碼 / 反手: 平倉部分實現損益
+                closed = min(abs(old_qty), qty)
+                direction = 1 if old_qty > 0 else -1
+                entry['realized_pnl'] += (price - entry['avg_cost']) * closed * direction * multiplier
+                new_qty = old_qty + fill
+                if abs(new_qty) < 1e-9:
+                    new_qty = 0.0
+                    self.dirty = True
+                elif (new_qty > 0) != (old_qty > 0):
+                    entry['avg_cost'] = price
+                    self.dirty = True
+
+            entry['qty'] = new_qty
+
+        return code
+
+    # ===== 查詢 =====
+    def get(self, code, account=''):
+        """
+        Returns:
+            dict: qty (帶正負號), avg_cost, realized_pnl;沒有時為 None
+        """
+        with self._lock:
+            entry = self._positions.get((account, code))
+            return dict(entry) if entry else None
+
+    def get_codes(self):
+        with self._lock:
+            return list(dict.fromkeys(code for (_, code), e in self._positions.items() if e['qty'] != 0))
+
+    def get_realized_pnl(self):
+        with self._lock:
+            return sum(e['realized_pnl'] for e in self._positions.values())
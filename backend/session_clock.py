@@ -0,0 +1,91 @@
+# backend/session_clock.py
+"""
+交易時段模組
+負責判斷目前是否在日盤 (08:45-13:45) 或夜盤 (15:00-翌日 05:00) 交易時段,
+並計算下一次開盤/收盤時間;假日依結算日曆排除
+"""
+from datetime import datetime, time as dtime, timedelta
+
+DAY = '日盤'
+NIGHT = '夜盤'
+
+DAY_OPEN = dtime(8, 45)
+DAY_CLOSE = dtime(13, 45)
+NIGHT_OPEN = dtime(15, 0)
+NIGHT_CLOSE = dtime(5, 0)
+
+# 連假前最後一個交易日不開夜盤: 下一個交易日超過此天數即視為連假
+_MAX_NIGHT_GAP_DAYS = 3
+
+
+class SessionClock:
+    def __init__(self, calendar=None):
+        """
+        Args:
+            calendar: SettlementCalendar (提供 is_trading_day),None 表示只排除週末
+        """
+        self.calendar = calendar
+
+    def is_trading_day(self, day):
+        if self.calendar is not None:
+            return self.calendar.is_trading_day(day)
+        return day.weekday() < 5
+
+    def _has_night(self, day):
+        """day 當天 15:00 是否開夜盤"""
+        if not self.is_trading_day(day):
+            return False
+        for offset in range(1, _MAX_NIGHT_GAP_DAYS + 1):
+            if self.is_trading_day(day + timedelta(days=offset)):
+                return True
+        return False
+
+    def _sessions(self, day):
+        """day 當天開始的交易時段: [(名稱, 開盤, 收盤)]"""
+        result = []
+        if self.is_trading_day(day):
+            result.append((DAY, datetime.combine(day, DAY_OPEN), datetime.combine(day, DAY_CLOSE)))
+        if self._has_night(day):
+            result.append((NIGHT, datetime.combine(day, NIGHT_OPEN),
+                           datetime.combine(day + timedelta(days=1), NIGHT_CLOSE)))
+        return result
+
+    def current_session(self, now=None):
+        """
+        Returns:
+            tuple: (時段名稱, 收盤時間),休市時為 (None, None)
+        """
+        now = now or datetime.now()
+        # 凌晨的夜盤屬於前一天開始的時段
+        for day in (now.date() - timedelta(days=1), now.date()):
+            for name, start, end in self._sessions(day):
+                if start <= now < end:
+                    return name, end
+        return None, None
+
+    def is_open(self, now=None):
+        return self.current_session(now)[0] is not None
+
+    def next_open(self, now=None):
+        """
+        Returns:
+            tuple: (時段名稱, 開盤時間),目前在時段內時回傳下一個時段
+        """
+        now = now or datetime.now()
+        day = now.date()
+        for offset in range(0, 30):
+            for name, start, _ in self._sessions(day + timedelta(days=offset)):
+                if start > now:
+                    return name, start
+        return None, None
+
+    def describe(self, now=None):
+        """給訂閱狀態等顯示用的文字"""
+        now = now or datetime.now()
+        name, end = self.current_session(now)
+        if name:
+            return f"{name}交易時段 (至 {end.strftime('%H:%M')})"
+        next_name, start = self.next_open(now)
+        if next_name:
+            return f"休市時段 (下次開盤: {start.strftime('%m/%d %H:%M')} {next_name})"
+        return "休市時段"
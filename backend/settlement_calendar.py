@@ -0,0 +1,192 @@
+# backend/settlement_calendar.py
+"""
+結算日曆模組
+負責預先建立台指期 (TXF/MXF/TMF) 月結算與台指選 (TXO 月選、TX1/TX2/TX4/TX5 週選)
+的結算日表,結算日遇假日順延至下一個交易日;
+代碼 -> 結算日、剩餘交易日的查詢皆有快取
+
+假日檔為純文字,每行一個日期 (YYYY-MM-DD 或 YYYYMMDD),# 之後為註解;
+預設讀取執行目錄的 holidays.txt (專案根目錄附有當年度的範例,每年依期交所公告更新)
+"""
+import bisect
+import logging
+import os
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+from my_utils.helpers import parse_code, FUTURES_PRODUCTS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOLIDAY_FILE = 'holidays.txt'
+TRADING_DAYS_PER_YEAR = 252
+
+# 選擇權商品 -> 當月第幾個星期三結算
+_WEEK_OF_MONTH = {'TX1': 1, 'TX2': 2, 'TXO': 3, 'TX4': 4, 'TX5': 5}
+
+
+def load_holidays(holiday_file=DEFAULT_HOLIDAY_FILE):
+    """
+    載入假日檔
+
+    Returns:
+        set: datetime.date 集合,檔案不存在時為空集合
+    """
+    holidays = set()
+    if not os.path.exists(holiday_file):
+        logger.warning(f"找不到假日檔 {holiday_file},結算日只排除週末")
+        return holidays
+
+    with open(holiday_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            text = line.split('#', 1)[0].strip().replace('-', '').replace('/', '')
+            if not text:
+                continue
+            try:
+                holidays.add(datetime.strptime(text, '%Y%m%d').date())
+            except ValueError:
+                logger.warning(f"假日檔格式錯誤: {line.strip()}")
+    return holidays
+
+
+@lru_cache(maxsize=None)
+def _default_holidays():
+    return frozenset(load_holidays())
+
+
+def next_trading_day(day, holidays=None):
+    """day 本身或其後第一個交易日 (排除週末與假日)"""
+    holidays = _default_holidays() if holidays is None else holidays
+    while day.weekday() >= 5 or day in holidays:
+        day += timedelta(days=1)
+    return day
+
+
+def get_trading_date(now=None, holidays=None):
+    """
+    取得交易日 (15:00 之後的夜盤歸屬下一個交易日,週五夜盤與假日順延至下一個營業日)
+
+    Args:
+        holidays: 假日集合,None 時載入預設假日檔
+
+    Returns:
+        str: YYYYMMDD
+    """
+    now = now or datetime.now()
+    day = now.date()
+    if now.hour >= 15:
+        day += timedelta(days=1)
+    return next_trading_day(day, holidays).strftime('%Y%m%d')
+
+
+def nth_wednesday(year, month, n):
+    """當月第 n 個星期三,不存在時 (例如第五週) 回傳 None"""
+    first = date(year, month, 1)
+    day = first + timedelta(days=(2 - first.weekday()) % 7 + (n - 1) * 7)
+    return day if day.month == month else None
+
+
+class SettlementCalendar:
+    def __init__(self, holiday_file=DEFAULT_HOLIDAY_FILE, years_back=1, years_ahead=3, today=None):
+        """
+        Args:
+            holiday_file: 假日檔路徑
+            years_back / years_ahead: 結算日表涵蓋今年前後幾年
+        """
+        self.holidays = load_holidays(holiday_file)
+        today = today or date.today()
+        self.first_year = today.year - years_back
+        self.last_year = today.year + years_ahead
+
+        # 交易日列表 (已排序),用來二分搜尋計算剩餘交易日
+        start = date(self.first_year, 1, 1)
+        end = date(self.last_year + 1, 1, 31)
+        self.trading_days = []
+        day = start
+        while day <= end:
+            if self.is_trading_day(day):
+                self.trading_days.append(day)
+            day += timedelta(days=1)
+
+        # (商品, 年, 月) -> 結算日
+        self.table = {}
+        for year in range(self.first_year, self.last_year + 1):
+            for month in range(1, 13):
+                monthly = self._roll_forward(nth_wednesday(year, month, 3))
+                for product in FUTURES_PRODUCTS:
+                    self.table[(product, year, month)] = monthly
+                for product, n in _WEEK_OF_MONTH.items():
+                    wednesday = nth_wednesday(year, month, n)
+                    if wednesday is not None:
+                        self.table[(product, year, month)] = self._roll_forward(wednesday)
+
+        # 查詢快取 (綁在實例上,重建日曆即失效)
+        self.expiry = lru_cache(maxsize=4096)(self._expiry)
+        self._trading_days_left = lru_cache(maxsize=4096)(self._count_trading_days)
+
+        logger.info(f"結算日曆 {self.first_year}-{self.last_year}: "
+                    f"{len(self.table)} 個結算日, 假日 {len(self.holidays)} 天")
+
+    def is_trading_day(self, day):
+        return day.weekday() < 5 and day not in self.holidays
+
+    def _roll_forward(self, day):
+        """遇假日順延至下一個交易日"""
+        return next_trading_day(day, self.holidays)
+
+    def _resolve_year(self, year_digit):
+        """年份尾數 -> 西元年 (取日曆範圍內最接近今年者)"""
+        year = self.first_year - self.first_year % 10 + year_digit
+        if year < self.first_year:
+            year += 10
+        return year
+
+    # ===== 查詢 =====
+    def _expiry(self, code):
+        """
+        代碼 -> 結算日
+
+        Returns:
+            datetime.date,無法解析或超出日曆範圍時為 None
+        """
+        info = parse_code(code)
+        if not info:
+            return None
+        return self.table.get((info['product'], self._resolve_year(info['year_digit']), info['month']))
+
+    def _today(self, today):
+        if today is None:
+            return datetime.strptime(get_trading_date(holidays=self.holidays), '%Y%m%d').date()
+        return today
+
+    def trading_days_left(self, code, today=None):
+        """
+        剩餘交易日 (含結算日,不含今天;結算日當天為 0)
+
+        Args:
+            today: 交易日,預設依目前時間 (夜盤歸屬下一個交易日)
+        """
+        return self._trading_days_left(code, self._today(today))
+
+    def _count_trading_days(self, code, today):
+        expiry = self.expiry(code)
+        if expiry is None or expiry <= today:
+            return 0
+        return (bisect.bisect_right(self.trading_days, expiry)
+                - bisect.bisect_right(self.trading_days, today))
+
+    def is_expired(self, code, today=None):
+        """結算日已過 (結算日當天仍可交易,不算到期);無法解析的代碼為 False"""
+        expiry = self.expiry(code)
+        return expiry is not None and expiry < self._today(today)
+
+    def days_left(self, code, today=None):
+        """剩餘日曆天數"""
+        expiry = self.expiry(code)
+        if expiry is None:
+            return 0
+        return max((expiry - self._today(today)).days, 0)
+
+    def time_to_expiry(self, code, today=None):
+        """以交易日計的到期年數 T (給 Black-Scholes 使用)"""
+        return self.trading_days_left(code, today) / TRADING_DAYS_PER_YEAR
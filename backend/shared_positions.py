@@ -0,0 +1,138 @@
+# backend/shared_positions.py
+"""
+共享記憶體倉位表模組
+負責引擎行程寫入倉位與風險狀態,GUI 行程只讀取 (以序號判斷是否讀到完整資料)
+"""
+import time
+from multiprocessing import shared_memory
+
+MAX_ROWS = 256
+CODE_BYTES = 16
+
+# 表頭欄位
+HEADER_FIELDS = (
+    'seq', 'count', 'connected', 'updated', 'underlying_price',
+    'total_pnl', 'total_margin', 'net_delta', 'long_delta', 'short_delta',
+)
+# 每列欄位
+ROW_FIELDS = (
+    'quantity', 'direction', 'price', 'last_price', 'calc_pnl',
+    'margin', 'est_delta', 'days_left',
+)
+
+_H = {name: i for i, name in enumerate(HEADER_FIELDS)}
+_R = {name: i for i, name in enumerate(ROW_FIELDS)}
+_FLOATS = len(HEADER_FIELDS) + MAX_ROWS * len(ROW_FIELDS)
+_CODES_OFFSET = _FLOATS * 8
+SHM_SIZE = _CODES_OFFSET + MAX_ROWS * CODE_BYTES
+
+
+class SharedPositionTable:
+    def __init__(self, name=None, create=False):
+        """
+        Args:
+            name: 共享記憶體名稱 (create=False 時必填)
+            create: 是否建立新的共享記憶體 (由引擎端建立)
+        """
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=SHM_SIZE)
+            self.shm.buf[:SHM_SIZE] = bytes(SHM_SIZE)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.owner = create
+        self._floats = self.shm.buf[:_CODES_OFFSET].cast('d')
+
+    def close(self):
+        self._floats.release()
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    @property
+    def seq(self):
+        return int(self._floats[_H['seq']])
+
+    # ===== 寫入 (引擎端,呼叫端需確保單一寫入者) =====
+    def publish(self, positions, summary):
+        """
+        寫入整份倉位表
+
+        Args:
+            positions: backend.get_positions() 格式的 dict 列表 (可含 margin)
+            summary: HEADER_FIELDS 中 seq/count/updated 以外欄位的 dict
+        """
+        f = self._floats
+        width = len(ROW_FIELDS)
+        base = len(HEADER_FIELDS)
+
+        f[_H['seq']] += 1
+        rows = positions[:MAX_ROWS]
+        for i, p in enumerate(rows):
+            offset = base + i * width
+            f[offset + _R['quantity']] = float(p.get('quantity', 0) or 0)
+            f[offset + _R['direction']] = 1.0 if 'Buy' in str(p.get('direction', '')) else -1.0
+            f[offset + _R['price']] = float(p.get('price', 0) or 0)
+            f[offset + _R['last_price']] = float(p.get('last_price', 0) or 0)
+            f[offset + _R['calc_pnl']] = float(p.get('calc_pnl', 0) or 0)
+            f[offset + _R['margin']] = float(p.get('margin', 0) or 0)
+            f[offset + _R['est_delta']] = float(p.get('est_delta', 0) or 0)
+            f[offset + _R['days_left']] = float(p.get('days_left', 0) or 0)
+
+            code = str(p.get('code', '')).encode('utf-8')[:CODE_BYTES]
+            start = _CODES_OFFSET + i * CODE_BYTES
+            self.shm.buf[start:start + CODE_BYTES] = code.ljust(CODE_BYTES, b'\0')
+
+        for name in HEADER_FIELDS[4:]:
+            f[_H[name]] = float(summary.get(name, 0) or 0)
+        f[_H['connected']] = 1.0 if summary.get('connected') else 0.0
+        f[_H['count']] = len(rows)
+        f[_H['updated']] = time.time()
+        f[_H['seq']] += 1
+
+    # ===== 讀取 (GUI 端) =====
+    def read(self, retries=20):
+        """
+        讀取一份一致的倉位表
+
+        Returns:
+            tuple: (seq, summary dict, positions list);讀取失敗時 seq 為 -1
+        """
+        f = self._floats
+        width = len(ROW_FIELDS)
+        base = len(HEADER_FIELDS)
+
+        for _ in range(retries):
+            seq = int(f[_H['seq']])
+            if seq % 2:
+                time.sleep(0.0005)
+                continue
+
+            count = int(f[_H['count']])
+            header = f[:base].tolist()
+            values = f[base:base + count * width].tolist()
+            codes = bytes(self.shm.buf[_CODES_OFFSET:_CODES_OFFSET + count * CODE_BYTES])
+
+            if int(f[_H['seq']]) != seq:
+                continue
+
+            summary = dict(zip(HEADER_FIELDS, header))
+            summary['connected'] = bool(summary['connected'])
+            positions = []
+            for i in range(count):
+                row = dict(zip(ROW_FIELDS, values[i * width:(i + 1) * width]))
+                code = codes[i * CODE_BYTES:(i + 1) * CODE_BYTES].rstrip(b'\0').decode('utf-8')
+                is_buy = row['direction'] > 0
+                row['code'] = code
+                row['direction'] = 'Buy' if is_buy else 'Sell'
+                row['dir_str'] = '買' if is_buy else '賣'
+                row['days_left'] = int(row['days_left'])
+                row['calc_pnl'] = int(row['calc_pnl'])
+                positions.append(row)
+            return seq, summary, positions
+
+        return -1, {}, []
+
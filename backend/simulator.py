@@ -0,0 +1,822 @@
+# backend/simulator.py
+"""
+模擬交易所模組
+負責在本機模擬 Shioaji 的合約樹、報價推送與委託撮合,
+提供與 TradingBackend 相同介面的 SimulatedBackend,不需要網路與帳號即可操作整個中控台;
+報價頻率可調 (例如 speed=10 為 10 倍實盤頻率),用來壓力測試 GUI、事件匯流排與監測
+
+價格過程:
+    加權指數為幾何布朗運動,各月期貨 = 指數 + 基差 (均值回歸),選擇權以 Black-Scholes 定價
+撮合:
+    市價單以當時買賣價立即成交,限價單穿價即成交、否則掛單等待之後的報價
+"""
+import itertools
+import logging
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, time as dtime, timedelta
+
+from .contract_cache import ContractCache, DEFAULT_MULTIPLIERS, FUTURES_PRODUCTS
+from .position_book import PositionBook
+from .session_clock import SessionClock
+from .settlement_calendar import nth_wednesday
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPOT = 22000.0
+DEFAULT_VOL = 0.18
+DEFAULT_TICK_RATE = 2.0        # 每檔每種報價每秒筆數 (約略實盤)
+DEFAULT_EQUITY = 5_000_000
+FUTURES_MONTHS = 3
+OPTION_MONTHS = 2
+STRIKE_STEP = 100
+STRIKES_EACH_SIDE = 15
+BOOK_DEPTH = 5
+EXCHANGE = 'TAIFEX'
+SIM_SESSION = '模擬盤'
+
+BASIS_PER_MONTH = -25.0        # 每遠一個月的平均基差 (點)
+BASIS_REVERSION = 0.01         # 基差每秒回歸均值的比例
+BASIS_NOISE = 0.8              # 基差每秒的波動 (點)
+TRADING_SECONDS_PER_YEAR = 252 * 5 * 3600
+
+_CALL_LETTERS = 'ABCDEFGHIJKL'
+_PUT_LETTERS = 'MNOPQRSTUVWX'
+_OPTION_PRODUCT = 'TXO'
+_DELTA_UNIT = DEFAULT_MULTIPLIERS['TXF']  # Delta 以大台口數計
+
+
+def _norm_cdf(x):
+    return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+
+def black_scholes(spot, strike, t, vol, cp):
+    """
+    歐式選擇權理論價 (無利率)
+
+    Returns:
+        tuple: (價格, Delta),cp 為 'C' / 'P'
+    """
+    if t <= 0 or vol <= 0:
+        if cp == 'C':
+            return max(spot - strike, 0.0), 1.0 if spot > strike else 0.0
+        return max(strike - spot, 0.0), -1.0 if spot < strike else 0.0
+
+    sd = vol * math.sqrt(t)
+    d1 = (math.log(spot / strike) + 0.5 * sd * sd) / sd
+    d2 = d1 - sd
+    if cp == 'C':
+        return spot * _norm_cdf(d1) - strike * _norm_cdf(d2), _norm_cdf(d1)
+    return strike * _norm_cdf(-d2) - spot * _norm_cdf(-d1), _norm_cdf(d1) - 1.0
+
+
+def tick_size(product, price):
+    """期交所升降單位"""
+    if product in FUTURES_PRODUCTS:
+        return 1.0
+    if price < 10:
+        return 0.1
+    if price < 50:
+        return 0.5
+    if price < 500:
+        return 1.0
+    if price < 1000:
+        return 5.0
+    return 10.0
+
+
+# ===== 合約樹 =====
+class SimContract:
+    """模擬合約,欄位與 Shioaji 合約物件同名"""
+
+    def __init__(self, code, product, expiry, month_index, multiplier, strike_price=0.0, cp=''):
+        self.code = code
+        self.symbol = code
+        self.category = product
+        self.delivery_month = expiry.strftime('%Y%m')
+        self.delivery_date = expiry.strftime('%Y/%m/%d')
+        self.multiplier = multiplier
+        self.strike_price = strike_price
+        self.option_right = {'C': 'OptionRight.Call', 'P': 'OptionRight.Put'}.get(cp, '')
+        self.expiry = expiry
+        self.month_index = month_index
+        self.cp = cp
+
+    def __repr__(self):
+        return f"SimContract({self.code})"
+
+
+class SimContractRoot:
+    """api.Contracts.Futures / Options: 以屬性取得商品類別、以代碼取得合約"""
+
+    def __init__(self):
+        self._products = {}
+        self._codes = {}
+
+    def add(self, product, contract):
+        self._products.setdefault(product, []).append(contract)
+        self._codes[contract.code] = contract
+
+    def __getattr__(self, product):
+        products = self.__dict__.get('_products', {})
+        if product in products:
+            return products[product]
+        raise AttributeError(product)
+
+    def __getitem__(self, code):
+        return self._codes[code]
+
+    def __iter__(self):
+        return iter(self._products.values())
+
+    def get(self, code):
+        return self._codes.get(code)
+
+
+class SimContracts:
+    def __init__(self):
+        self.Futures = SimContractRoot()
+        self.Options = SimContractRoot()
+
+    def get(self, code):
+        return self.Futures.get(code) or self.Options.get(code)
+
+
+def build_contracts(spot, today=None, futures_months=FUTURES_MONTHS, option_months=OPTION_MONTHS,
+                    strikes_each_side=STRIKES_EACH_SIDE):
+    """建立近幾個月的期貨 (TXF/MXF/TMF) 與台指月選 (TXO) 合約"""
+    today = today or date.today()
+    contracts = SimContracts()
+
+    months = []
+    year, month = today.year, today.month
+    while len(months) < max(futures_months, option_months):
+        expiry = nth_wednesday(year, month, 3)
+        if expiry >= today:
+            months.append((year, month, expiry))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    atm = int(round(spot / STRIKE_STEP)) * STRIKE_STEP
+    for k, (year, month, expiry) in enumerate(months):
+        suffix = f"{_CALL_LETTERS[month - 1]}{year % 10}"
+        if k < futures_months:
+            for product in FUTURES_PRODUCTS:
+                contracts.Futures.add(product, SimContract(
+                    f"{product}{suffix}", product, expiry, k, DEFAULT_MULTIPLIERS[product]))
+        if k < option_months:
+            for i in range(-strikes_each_side, strikes_each_side + 1):
+                strike = atm + i * STRIKE_STEP
+                for cp, letters in (('C', _CALL_LETTERS), ('P', _PUT_LETTERS)):
+                    code = f"{_OPTION_PRODUCT}{strike}{letters[month - 1]}{year % 10}"
+                    contracts.Options.add(_OPTION_PRODUCT, SimContract(
+                        code, _OPTION_PRODUCT, expiry, k, DEFAULT_MULTIPLIERS[_OPTION_PRODUCT],
+                        strike_price=float(strike), cp=cp))
+    return contracts
+
+
+# ===== 報價物件 (欄位與 Shioaji v1 回調同名) =====
+class SimTick:
+    def __init__(self, code, close, volume, total_volume):
+        self.code = code
+        self.datetime = datetime.now()
+        self.close = close
+        self.volume = volume
+        self.total_volume = total_volume
+
+
+class SimBidAsk:
+    def __init__(self, code, bid_price, bid_volume, ask_price, ask_volume):
+        self.code = code
+        self.datetime = datetime.now()
+        self.bid_price = bid_price
+        self.bid_volume = bid_volume
+        self.ask_price = ask_price
+        self.ask_volume = ask_volume
+
+
+class SimSnapshot:
+    def __init__(self, code, close, buy_price, sell_price, total_volume):
+        self.code = code
+        self.ts = int(time.time() * 1e9)
+        self.close = close
+        self.buy_price = buy_price
+        self.sell_price = sell_price
+        self.total_volume = total_volume
+
+
+class SimMargin:
+    def __init__(self, equity):
+        self.equity = equity
+
+
+class SimSessionClock(SessionClock):
+    """模擬盤全天開盤"""
+
+    def current_session(self, now=None):
+        now = now or datetime.now()
+        return SIM_SESSION, datetime.combine(now.date() + timedelta(days=1), dtime(0, 0))
+
+    def next_open(self, now=None):
+        return None, None
+
+
+# ===== 價格過程 =====
+class SimMarket:
+    def __init__(self, contracts, spot=DEFAULT_SPOT, vol=DEFAULT_VOL, seed=None):
+        self.contracts = contracts
+        self.spot = spot
+        self.vol = vol
+        self.rng = random.Random(seed)
+        self.basis_mean = [BASIS_PER_MONTH * (k + 0.5) for k in range(max(FUTURES_MONTHS, OPTION_MONTHS))]
+        self.basis = list(self.basis_mean)
+        self.last = {}    # code -> 最後成交價
+        self.volume = {}  # code -> 總量
+
+    def step(self, dt):
+        """前進 dt 秒"""
+        if dt <= 0:
+            return
+        t = dt / TRADING_SECONDS_PER_YEAR
+        z = self.rng.gauss(0.0, 1.0)
+        self.spot *= math.exp(-0.5 * self.vol ** 2 * t + self.vol * math.sqrt(t) * z)
+        for k, mean in enumerate(self.basis_mean):
+            self.basis[k] += (BASIS_REVERSION * (mean - self.basis[k]) * dt
+                              + BASIS_NOISE * math.sqrt(dt) * self.rng.gauss(0.0, 1.0))
+
+    def fair(self, contract):
+        """
+        Returns:
+            tuple: (理論價, 每口多方 Delta)
+        """
+        if not contract.cp:
+            return self.spot + self.basis[contract.month_index], 1.0
+        close = datetime.combine(contract.expiry, dtime(13, 30))
+        t = max((close - datetime.now()).total_seconds(), 3600) / (365 * 86400)
+        return black_scholes(self.spot, contract.strike_price, t, self.vol, contract.cp)
+
+    def book(self, contract):
+        """
+        Returns:
+            tuple: (買價列表, 買量列表, 賣價列表, 賣量列表)
+        """
+        price, _ = self.fair(contract)
+        step = tick_size(contract.category, price)
+        bid = max(math.floor(price / step) * step, step)
+        bid_price = [round(max(bid - i * step, step), 1) for i in range(BOOK_DEPTH)]
+        ask_price = [round(bid + (i + 1) * step, 1) for i in range(BOOK_DEPTH)]
+        bid_volume = [self.rng.randint(1, 30) for _ in range(BOOK_DEPTH)]
+        ask_volume = [self.rng.randint(1, 30) for _ in range(BOOK_DEPTH)]
+        return bid_price, bid_volume, ask_price, ask_volume
+
+    def trade(self, contract, price=None, quantity=None):
+        """記錄一筆成交 (price 為 None 時隨機成交在買價或賣價)"""
+        if price is None:
+            bid_price, _, ask_price, _ = self.book(contract)
+            price = self.rng.choice((bid_price[0], ask_price[0]))
+        quantity = quantity or self.rng.randint(1, 5)
+        self.last[contract.code] = price
+        self.volume[contract.code] = self.volume.get(contract.code, 0) + quantity
+        return price, quantity
+
+    def last_price(self, contract):
+        price = self.last.get(contract.code)
+        if price is None:
+            price, _ = self.trade(contract, quantity=1)
+        return price
+
+
+# ===== 模擬 API =====
+class SimQuote:
+    """api.quote: 訂閱與報價回調"""
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+
+    def subscribe(self, contract, quote_type='tick', version=None):
+        self.exchange.set_subscribed(contract.code, _quote_type(quote_type), True)
+
+    def unsubscribe(self, contract, quote_type='tick', version=None):
+        self.exchange.set_subscribed(contract.code, _quote_type(quote_type), False)
+
+    def set_on_tick_fop_v1_callback(self, callback):
+        self.exchange.on_tick = callback
+
+    def set_on_bidask_fop_v1_callback(self, callback):
+        self.exchange.on_bidask = callback
+
+
+def _quote_type(quote_type):
+    """sj.constant.QuoteType 或字串 -> 'tick' / 'bidask'"""
+    return str(getattr(quote_type, 'value', quote_type)).lower()
+
+
+class SimAPI:
+    """與 Shioaji API 同名的最小介面"""
+    futopt_account = 'SIM-FUTOPT'
+
+    def __init__(self, exchange, contracts):
+        self.exchange = exchange
+        self.Contracts = contracts
+        self.quote = SimQuote(exchange)
+
+    def set_order_callback(self, callback):
+        self.exchange.on_order = callback
+
+    def snapshots(self, contracts):
+        return [self.exchange.snapshot(c.code) for c in contracts if c is not None]
+
+    def margin(self, account=None):
+        return SimMargin(self.exchange.equity())
+
+    def list_accounts(self):
+        return [self.futopt_account]
+
+
+# ===== 撮合與報價推送 =====
+class SimExchange:
+    def __init__(self, contracts, market, multiplier_lookup, tick_rate=DEFAULT_TICK_RATE, speed=1.0,
+                 equity=DEFAULT_EQUITY):
+        self.contracts = contracts
+        self.market = market
+        self.tick_rate = tick_rate
+        self.speed = speed
+        self.initial_equity = equity
+        self.account = PositionBook(multiplier_lookup=multiplier_lookup)
+        self.multiplier_lookup = multiplier_lookup
+
+        self.on_tick = None
+        self.on_bidask = None
+        self.on_order = None
+
+        self._lock = threading.RLock()
+        self._subscribed = set()    # (code, quote_type)
+        self._resting = []          # 未成交限價單
+        self._outbox = deque()      # 待送出的委託/成交回報 (在推送執行緒送出)
+        self._order_ids = itertools.count(1)
+        self._exchange_seq = itertools.count(1)
+        self.ticks_sent = 0
+        self.deals = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ===== 訂閱 =====
+    def set_subscribed(self, code, quote_type, subscribed):
+        if self.contracts.get(code) is None:
+            raise ValueError(f"模擬交易所沒有合約 {code}")
+        with self._lock:
+            if subscribed:
+                self._subscribed.add((code, quote_type))
+            else:
+                self._subscribed.discard((code, quote_type))
+
+    # ===== 啟動/停止 =====
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sim-exchange', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self):
+        # 每輪每檔以 1/2 機率推送,平均頻率為 tick_rate * speed
+        interval = 1.0 / (2.0 * self.tick_rate * self.speed)
+        last = next_time = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            try:
+                self.pump(now - last)
+            except Exception as e:
+                logger.exception(f"模擬交易所錯誤: {e}", extra={'rate_key': 'simulator.pump'})
+            last = now
+
+            next_time += interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                # 跟不上時不累積欠下的輪次
+                next_time = time.monotonic()
+
+    def pump(self, dt):
+        """推進價格、撮合掛單並送出報價與回報 (一輪)"""
+        events = []
+        with self._lock:
+            self.market.step(dt)
+            self._match_resting()
+            rng = self.market.rng
+            for code, quote_type in self._subscribed:
+                if rng.random() >= 0.5:
+                    continue
+                contract = self.contracts.get(code)
+                if quote_type == 'bidask':
+                    events.append((self.on_bidask, SimBidAsk(code, *self.market.book(contract))))
+                else:
+                    price, qty = self.market.trade(contract)
+                    events.append((self.on_tick, SimTick(code, price, qty, self.market.volume[code])))
+            orders = list(self._outbox)
+            self._outbox.clear()
+
+        # 回調在鎖外執行,避免與下單的執行緒互鎖
+        for stat, msg in orders:
+            self._callback(self.on_order, stat, msg)
+        for callback, quote in events:
+            self.ticks_sent += 1
+            self._callback(callback, EXCHANGE, quote)
+
+    def _callback(self, callback, *args):
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.exception(f"模擬回調錯誤: {e}", extra={'rate_key': 'simulator.callback'})
+
+    # ===== 下單與撮合 =====
+    def place_order(self, code, action, quantity, price=None):
+        """
+        下單,price 為 None 時為市價單
+
+        Returns:
+            dict: id, code, action, quantity, price, filled (已成交口數), fill_price
+        """
+        contract = self.contracts.get(code)
+        if contract is None:
+            raise ValueError(f"模擬交易所沒有合約 {code}")
+        if quantity <= 0:
+            raise ValueError(f"口數錯誤: {quantity}")
+
+        order = {
+            'id': f"S{next(self._order_ids):07d}",
+            'code': code,
+            'action': 'Buy' if 'Buy' in str(action) else 'Sell',
+            'quantity': int(quantity),
+            'price': price,
+            'filled': 0,
+            'fill_price': 0.0,
+        }
+        with self._lock:
+            self._outbox.append(('FuturesOrder', {
+                'id': order['id'], 'seqno': order['id'], 'code': code, 'action': order['action'],
+                'price': price or 0.0, 'quantity': order['quantity'], 'status': 'Submitted',
+            }))
+            if not self._try_fill(order, contract):
+                if price is None:
+                    raise ValueError(f"{code} 無法以市價成交")
+                self._resting.append(order)
+        return order
+
+    def cancel_all(self):
+        with self._lock:
+            cancelled, self._resting = self._resting, []
+        return len(cancelled)
+
+    def _try_fill(self, order, contract):
+        bid_price, _, ask_price, _ = self.market.book(contract)
+        is_buy = order['action'] == 'Buy'
+        book_price = ask_price[0] if is_buy else bid_price[0]
+        limit = order['price']
+        if limit is not None and ((is_buy and limit < book_price) or (not is_buy and limit > book_price)):
+            return False
+
+        qty = order['quantity'] - order['filled']
+        self.market.trade(contract, book_price, qty)
+        order['filled'] = order['quantity']
+        order['fill_price'] = book_price
+        deal = {
+            'trade_id': order['id'],
+            'seqno': order['id'],
+            'exchange_seq': f"E{next(self._exchange_seq):08d}",
+            # 與 Shioaji FuturesDeal 相同: code 只有商品代碼,月份與履約價分開
+            'code': contract.category,
+            'delivery_month': contract.delivery_month,
+            'strike_price': contract.strike_price,
+            'option_right': contract.option_right,
+            'action': order['action'],
+            'price': book_price,
+            'quantity': qty,
+            'ts': time.time(),
+        }
+        self.account.apply_deal(deal)
+        self._outbox.append(('FuturesDeal', deal))
+        self.deals += 1
+        return True
+
+    def _match_resting(self):
+        if not self._resting:
+            return
+        self._resting = [order for order in self._resting
+                         if not self._try_fill(order, self.contracts.get(order['code']))]
+
+    # ===== 查詢 =====
+    def snapshot(self, code):
+        contract = self.contracts.get(code)
+        with self._lock:
+            bid_price, _, ask_price, _ = self.market.book(contract)
+            close = self.market.last_price(contract)
+            return SimSnapshot(code, close, bid_price[0], ask_price[0], self.market.volume.get(code, 0))
+
+    def positions(self):
+        """
+        Returns:
+            list: (合約, 帶正負號口數, 平均成本, 最後價, 每口多方 Delta)
+        """
+        result = []
+        with self._lock:
+            for code in self.account.get_codes():
+                entry = self.account.get(code)
+                contract = self.contracts.get(code)
+                _, delta = self.market.fair(contract)
+                result.append((contract, entry['qty'], entry['avg_cost'],
+                               self.market.last_price(contract), delta))
+        return result
+
+    def equity(self):
+        with self._lock:
+            total = self.initial_equity + self.account.get_realized_pnl()
+            for code in self.account.get_codes():
+                entry = self.account.get(code)
+                last = self.market.last_price(self.contracts.get(code))
+                total += (last - entry['avg_cost']) * entry['qty'] * self.multiplier_lookup(code)
+            return total
+
+
+class SimulatedBackend:
+    """
+    與 TradingBackend 相同介面的本機模擬 backend
+
+    用法:
+        TradingApp(root, backend=SimulatedBackend(speed=10))
+    """
+    remote = False
+    simulated = True
+
+    def __init__(self, spot=DEFAULT_SPOT, vol=DEFAULT_VOL, tick_rate=DEFAULT_TICK_RATE, speed=1.0,
+                 equity=DEFAULT_EQUITY, positions=None, seed=None):
+        """
+        Args:
+            spot: 起始加權指數
+            vol: 年化波動率
+            tick_rate: 每檔每種報價每秒筆數
+            speed: 報價頻率倍數 (10 = 10 倍實盤)
+            equity: 起始權益數
+            positions: 起始庫存 [{'code', 'action', 'quantity'}],None 時建立示範部位
+            seed: 亂數種子
+        """
+        self.spot = spot
+        self.vol = vol
+        self.tick_rate = tick_rate
+        self.speed = speed
+        self.initial_equity = equity
+        self.initial_positions = positions
+        self.seed = seed
+
+        self.connected = False
+        self.api = None
+        self.exchange = None
+        self.market = None
+        # 模擬合約與實盤合約分開快取 (登出時刪除)
+        self.cache_dir = tempfile.mkdtemp(prefix='opds_sim_')
+        self.contracts = ContractCache(cache_dir=self.cache_dir)
+        self.session_clock = SimSessionClock()
+
+    # ===== 登入/登出 =====
+    def login(self, api_key=None, secret_key=None):
+        if self.connected:
+            return True, "模擬交易所已連線"
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        sim_contracts = build_contracts(self.spot)
+        self.market = SimMarket(sim_contracts, self.spot, self.vol, self.seed)
+        self.exchange = SimExchange(sim_contracts, self.market, self.contracts.get_multiplier,
+                                    self.tick_rate, self.speed, self.initial_equity)
+        self.api = SimAPI(self.exchange, sim_contracts)
+        self.contracts.api = self.api
+        self.contracts.build()
+
+        self._seed_positions()
+        self.exchange.start()
+        self.connected = True
+        rate = self.tick_rate * self.speed
+        logger.info(f"模擬交易所啟動: {len(self.contracts.index)} 檔合約, 每檔每秒約 {rate:g} 筆報價")
+        return True, f"模擬登入成功 (報價 {self.speed:g} 倍速)"
+
+    def logout(self):
+        if self.exchange is not None:
+            self.exchange.stop()
+        self.connected = False
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        return True
+
+    def _seed_positions(self):
+        positions = self.initial_positions
+        if positions is None:
+            positions = self._demo_positions()
+        for p in positions:
+            contract = self.exchange.contracts.get(p['code'])
+            if contract is None:
+                logger.warning(f"模擬起始庫存找不到合約: {p['code']}")
+                continue
+            price, _ = self.market.fair(contract)
+            step = tick_size(contract.category, price)
+            self.exchange.account.apply_deal({
+                'code': p['code'],
+                'action': p['action'],
+                'quantity': p['quantity'],
+                'price': p.get('price') or max(round(price / step) * step, step),
+            })
+
+    def _demo_positions(self):
+        near = self.contracts.near_month('TXF')
+        mxf = self.contracts.near_month('MXF')
+        atm = int(round(self.spot / STRIKE_STEP)) * STRIKE_STEP
+        month = self.contracts.get(near)['delivery_month']
+        year_digit, month_index = int(month[3]), int(month[4:]) - 1
+        call = f"{_OPTION_PRODUCT}{atm + 300}{_CALL_LETTERS[month_index]}{year_digit}"
+        put = f"{_OPTION_PRODUCT}{atm - 300}{_PUT_LETTERS[month_index]}{year_digit}"
+        return [
+            {'code': near, 'action': 'Sell', 'quantity': 2},
+            {'code': mxf, 'action': 'Buy', 'quantity': 4},
+            {'code': call, 'action': 'Sell', 'quantity': 5},
+            {'code': put, 'action': 'Sell', 'quantity': 5},
+        ]
+
+    # ===== 倉位與報價 =====
+    def get_positions(self, account=None):
+        if not self.connected or account not in (None, SimAPI.futopt_account):
+            return []
+
+        positions = []
+        for contract, qty, cost, last, delta in self.exchange.positions():
+            is_buy = qty > 0
+            sign = 1 if is_buy else -1
+            multiplier = contract.multiplier
+            positions.append({
+                'code': contract.code,
+                'direction': 'Buy' if is_buy else 'Sell',
+                'dir_str': '買' if is_buy else '賣',
+                'quantity': abs(qty),
+                'price': cost,
+                'last_price': last,
+                'calc_pnl': int((last - cost) * qty * multiplier),
+                'est_delta': round(delta * sign * multiplier / _DELTA_UNIT, 4),
+                'days_left': max((contract.expiry - date.today()).days, 0),
+            })
+        return positions
+
+    def get_underlying_price(self):
+        if self.market is None:
+            return 0
+        return round(self.market.spot, 2)
+
+    def start_subscribing(self, codes, quote_callback=None, order_callback=None):
+        if not self.connected:
+            return False
+        if quote_callback:
+            self.api.quote.set_on_tick_fop_v1_callback(quote_callback)
+            self.api.quote.set_on_bidask_fop_v1_callback(quote_callback)
+        if order_callback:
+            self.api.set_order_callback(order_callback)
+        missing = [code for code in codes if self.exchange.contracts.get(code) is None]
+        if missing:
+            logger.warning(f"模擬交易所沒有合約: {', '.join(missing)}")
+            return False
+        for code in codes:
+            self.api.quote.subscribe(self.exchange.contracts.get(code))
+        return True
+
+    def stop_subscribing(self):
+        if self.exchange is not None:
+            with self.exchange._lock:
+                self.exchange._subscribed.clear()
+        return True
+
+    def get_five_quote(self, code):
+        contract = self.exchange.contracts.get(code) if self.exchange else None
+        if contract is None:
+            return None
+        with self.exchange._lock:
+            bid_price, bid_volume, ask_price, ask_volume = self.market.book(contract)
+        return {'bid_price': bid_price, 'bid_volume': bid_volume,
+                'ask_price': ask_price, 'ask_volume': ask_volume}
+
+    # ===== 下單 =====
+    def _order(self, code, action, quantity, price=None):
+        if not self.connected:
+            return False, "模擬交易所未連線"
+        try:
+            order = self.exchange.place_order(code, action, quantity, price)
+        except ValueError as e:
+            return False, str(e)
+        if order['filled']:
+            return True, f"{code} {order['action']} {order['quantity']} 口 成交 {order['fill_price']:g}"
+        return True, f"{code} {order['action']} {order['quantity']} 口 掛單 {price:g}"
+
+    def open_position(self, code, action, quantity, price=None):
+        return self._order(code, action, quantity, price)
+
+    def close_position(self, code, quantity=None, direction=None):
+        """平倉,direction 為目前部位方向,省略時依庫存判斷"""
+        entry = self.exchange.account.get(code) if self.exchange else None
+        if not entry or not entry['qty']:
+            return False, f"{code} 沒有庫存"
+        is_buy = 'Buy' in str(direction) if direction is not None else entry['qty'] > 0
+        quantity = quantity or abs(entry['qty'])
+        return self._order(code, 'Sell' if is_buy else 'Buy', quantity)
+
+    def close_all_positions(self):
+        if not self.connected:
+            return False, "模擬交易所未連線"
+        results = [self.close_position(code) for code in self.exchange.account.get_codes()]
+        failed = [msg for ok, msg in results if not ok]
+        if failed:
+            return False, "\n".join(failed)
+        return True, f"已平倉 {len(results)} 檔"
+
+    # ===== 轉倉 =====
+    def get_futures_spread(self, code):
+        """次月中價 - 近月中價 (點),找不到次月時為 None"""
+        far = self.contracts.next_month(code)
+        if not self.connected or far is None:
+            return None
+        near_contract = self.exchange.contracts.get(code)
+        far_contract = self.exchange.contracts.get(far)
+        with self.exchange._lock:
+            near_bid, _, near_ask, _ = self.market.book(near_contract)
+            far_bid, _, far_ask, _ = self.market.book(far_contract)
+        return (far_bid[0] + far_ask[0]) / 2 - (near_bid[0] + near_ask[0]) / 2
+
+    def check_and_roll_if_spread_met(self, code, qty, direction, target_spread, is_逆價差,
+                                     is_sell_position=False):
+        spread = self.get_futures_spread(code)
+        if spread is None:
+            return False, f"{code} 找不到次月合約", None
+
+        threshold = -target_spread if is_逆價差 else target_spread
+        met = spread >= threshold if is_sell_position else spread <= threshold
+        kind = "逆價差" if is_逆價差 else "正價差"
+        if met:
+            return True, f"{code} 價差 {spread:+.1f} 已達{kind}目標 {target_spread}", spread
+        return False, f"{code} 價差 {spread:+.1f},{kind}目標 {target_spread}", spread
+
+    def roll_futures(self, code, qty, direction, is_sell_position=False):
+        """平近月、建次月 (市價)"""
+        far = self.contracts.next_month(code)
+        if far is None:
+            return False, f"{code} 找不到次月合約"
+
+        close_action, open_action = ('Buy', 'Sell') if is_sell_position else ('Sell', 'Buy')
+        ok, msg = self._order(code, close_action, qty)
+        if not ok:
+            return False, f"平倉失敗: {msg}"
+        ok, open_msg = self._order(far, open_action, qty)
+        if not ok:
+            return False, f"已平 {code} 但建立 {far} 失敗: {open_msg}"
+        return True, f"轉倉完成 {code} -> {far} {qty} 口\n{msg}\n{open_msg}"
+
+    def calculate_suggestion(self, curr, target):
+        diff = target - curr
+        if abs(diff) < 0.05:
+            return f"目前 Delta {curr:.2f} 已接近目標 {target:.2f},不需調整"
+        action = "買進" if diff > 0 else "賣出"
+        lines = [f"目前 Delta {curr:.2f},目標 {target:.2f},差 {diff:+.2f}"]
+        for product in FUTURES_PRODUCTS:
+            lots = abs(diff) * _DELTA_UNIT / DEFAULT_MULTIPLIERS[product]
+            lines.append(f"{action} {product} 約 {lots:.0f} 口")
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # 壓力測試: 訂閱全部合約,量測實際推送頻率
+    import argparse
+
+    parser = argparse.ArgumentParser(description="模擬交易所壓力測試")
+    parser.add_argument('--speed', type=float, default=10.0, help="報價頻率倍數")
+    parser.add_argument('--seconds', type=float, default=5.0, help="測試秒數")
+    args = parser.parse_args()
+
+    backend = SimulatedBackend(speed=args.speed, seed=1)
+    print(backend.login()[1])
+    received = []
+    codes = list(backend.contracts.index)
+    backend.start_subscribing(codes, quote_callback=lambda exchange, quote: received.append(quote.code))
+    started = time.perf_counter()
+    time.sleep(args.seconds)
+    elapsed = time.perf_counter() - started
+    print(f"{len(codes)} 檔, {len(received):,} 筆報價, 每秒 {len(received) / elapsed:,.0f} 筆")
+    print(backend.roll_futures(backend.contracts.near_month('TXF'), 2, 'Sell', is_sell_position=True))
+    for p in backend.get_positions():
+        print(p)
+    backend.logout()
@@ -0,0 +1,169 @@
+# backend/snapshot_service.py
+"""
+快照查詢模組
+負責將大量合約切成批次並行查詢 api.snapshots,結果依代碼快取數秒
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Shioaji 單次 snapshots 最多 500 檔
+DEFAULT_CHUNK_SIZE = 200
+DEFAULT_TTL = 5.0
+
+
+class RateLimiter:
+    """簡單的 token bucket: 每 period 秒最多 calls 次"""
+
+    def __init__(self, calls=50, period=5.0):
+        self.capacity = float(calls)
+        self.rate = calls / period
+        self.tokens = float(calls)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class SnapshotService:
+    def __init__(self, api=None, contract_lookup=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 ttl=DEFAULT_TTL, max_workers=4, rate_limiter=None):
+        """
+        Args:
+            api: Shioaji API 物件 (或任何提供 snapshots(contracts) 的物件)
+            contract_lookup: code -> 合約物件 的函式
+            chunk_size: 每次查詢的合約數
+            ttl: 快取秒數
+            max_workers: 同時查詢的批次數
+            rate_limiter: RateLimiter,預設每 5 秒 50 次
+        """
+        self.api = api
+        self.contract_lookup = contract_lookup
+        self.chunk_size = chunk_size
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter or RateLimiter()
+
+        self._cache = {}  # code -> (查詢時間, snapshot)
+        self._lock = threading.Lock()
+
+    def get_snapshots(self, codes, max_age=None):
+        """
+        取得多檔快照,未過期的直接從快取回傳
+
+        Args:
+            codes: 代碼列表
+            max_age: 可接受的快取秒數,預設為 ttl;0 表示強制重新查詢
+
+        Returns:
+            dict: code -> snapshot
+        """
+        max_age = self.ttl if max_age is None else max_age
+        now = time.monotonic()
+        result = {}
+        missing = []
+
+        with self._lock:
+            for code in dict.fromkeys(codes):
+                cached = self._cache.get(code)
+                if cached and now - cached[0] <= max_age:
+                    result[code] = cached[1]
+                else:
+                    missing.append(code)
+
+        if missing and self.api is not None:
+            result.update(self._fetch(missing))
+        return result
+
+    def get_prices(self, codes, max_age=None):
+        """
+        取得多檔參考價 (成交價,沒有時用買賣價中間值)
+
+        Returns:
+            dict: code -> float
+        """
+        prices = {}
+        for code, snap in self.get_snapshots(codes, max_age).items():
+            price = snapshot_price(snap)
+            if price > 0:
+                prices[code] = price
+        return prices
+
+    def get_price(self, code, max_age=None):
+        """取得單檔參考價,查不到時回傳 0 (給 get_underlying_price 等備援使用)"""
+        return self.get_prices([code], max_age).get(code, 0.0)
+
+    def invalidate(self, codes=None):
+        with self._lock:
+            if codes is None:
+                self._cache = {}
+            else:
+                for code in codes:
+                    self._cache.pop(code, None)
+
+    def _fetch(self, codes):
+        contracts = []
+        for code in codes:
+            contract = self.contract_lookup(code) if self.contract_lookup else code
+            if contract is None:
+                logger.warning(f"找不到合約: {code}", extra={'rate_key': f'snapshot.missing.{code}'})
+                continue
+            contracts.append(contract)
+
+        chunks = [contracts[i:i + self.chunk_size]
+                  for i in range(0, len(contracts), self.chunk_size)]
+        if not chunks:
+            return {}
+
+        if len(chunks) == 1:
+            results = [self._fetch_chunk(chunks[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as pool:
+                results = list(pool.map(self._fetch_chunk, chunks))
+
+        fetched = {}
+        now = time.monotonic()
+        for snapshots in results:
+            for snap in snapshots:
+                code = getattr(snap, 'code', None)
+                if code:
+                    fetched[code] = snap
+
+        with self._lock:
+            for code, snap in fetched.items():
+                self._cache[code] = (now, snap)
+        return fetched
+
+    def _fetch_chunk(self, contracts):
+        self.rate_limiter.acquire()
+        try:
+            return self.api.snapshots(contracts) or []
+        except Exception as e:
+            logger.warning(f"快照查詢 {len(contracts)} 檔失敗: {e}")
+            return []
+
+
+def snapshot_price(snap):
+    """從快照取出參考價"""
+    close = float(getattr(snap, 'close', 0) or 0)
+    if close > 0:
+        return close
+
+    buy = float(getattr(snap, 'buy_price', 0) or 0)
+    sell = float(getattr(snap, 'sell_price', 0) or 0)
+    if buy > 0 and sell > 0:
+        return (buy + sell) / 2
+    return buy or sell
@@ -0,0 +1,205 @@
+# backend/spread_book.py
+"""
+跨月價差簿模組
+負責以 BidAsk 報價逐筆增量維護近月/次月期貨組合的可成交價差,
+讓轉倉對話框與價差監測直接讀取兩腳實際可成交的價格,不必再逐次查詢報價
+
+價差定義 (點): 次月 - 近月
+    買價差 (bid)  = 次月買價 - 近月賣價,空單轉倉 (買近賣遠) 可收到的價差
+    賣價差 (ask)  = 次月賣價 - 近月買價,多單轉倉 (賣近買遠) 需付出的價差
+    口數為兩腳對應一檔量的較小值
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_AGE = 10.0  # 秒,兩腳任一超過即視為過期
+
+
+class _Leg:
+    __slots__ = ('bid', 'bid_size', 'ask', 'ask_size', 'ts')
+
+    def __init__(self):
+        self.bid = self.ask = 0.0
+        self.bid_size = self.ask_size = 0
+        self.ts = 0.0
+
+
+class SpreadBook:
+    def __init__(self, next_month_lookup=None, on_update=None):
+        """
+        Args:
+            next_month_lookup: 近月代碼 -> 次月代碼 的函式 (ContractCache.next_month)
+            on_update: 價差有變動時呼叫 on_update(near, quote),在報價回調執行緒
+        """
+        self.next_month_lookup = next_month_lookup
+        self.on_update = on_update
+
+        self._lock = threading.Lock()
+        self._pairs = {}   # near -> far
+        self._by_leg = {}  # 腳 -> [near]
+        self._legs = {}    # 腳 -> _Leg
+        self._quotes = {}  # near -> 最新價差 dict
+        self.version = 0   # 任一價差變動即遞增 (給輪詢端判斷是否需要重新檢查)
+
+    # ===== 組合管理 =====
+    def set_pairs(self, nears):
+        """
+        設定要維護的近月代碼 (次月自動對應),不在列表中的組合移除
+
+        Returns:
+            list: 需要訂閱 BidAsk 的所有腳
+        """
+        pairs = {}
+        for near in nears:
+            far = self.next_month_lookup(near) if self.next_month_lookup else None
+            if far is None:
+                logger.warning(f"{near} 找不到次月合約,無法建立價差簿")
+                continue
+            pairs[near] = far
+
+        with self._lock:
+            self._pairs = pairs
+            self._by_leg = {}
+            for near, far in pairs.items():
+                self._by_leg.setdefault(near, []).append(near)
+                self._by_leg.setdefault(far, []).append(near)
+            self._legs = {leg: self._legs.get(leg) or _Leg() for leg in self._by_leg}
+            self._quotes = {near: q for near, q in self._quotes.items() if near in pairs}
+            return sorted(self._by_leg)
+
+    def get_pairs(self):
+        with self._lock:
+            return dict(self._pairs)
+
+    def clear(self):
+        self.set_pairs([])
+
+    # ===== 寫入 (報價回調執行緒) =====
+    def on_bidask(self, exchange, bidask):
+        """
+        處理 BidAsk 回調,只重算用到這一腳的組合
+
+        Returns:
+            list: 有變動的近月代碼
+        """
+        code = getattr(bidask, 'code', '')
+        leg = self._legs.get(code)
+        if leg is None:
+            return []
+
+        bid_price = getattr(bidask, 'bid_price', None) or (0,)
+        ask_price = getattr(bidask, 'ask_price', None) or (0,)
+        bid_volume = getattr(bidask, 'bid_volume', None) or (0,)
+        ask_volume = getattr(bidask, 'ask_volume', None) or (0,)
+        return self.update(code, float(bid_price[0]), int(bid_volume[0]),
+                           float(ask_price[0]), int(ask_volume[0]))
+
+    def update(self, code, bid, bid_size, ask, ask_size, ts=None):
+        ts = ts if ts is not None else time.time()
+        changed = []
+        with self._lock:
+            leg = self._legs.get(code)
+            if leg is None:
+                return []
+            if (leg.bid, leg.bid_size, leg.ask, leg.ask_size) == (bid, bid_size, ask, ask_size):
+                leg.ts = ts
+                return []
+            leg.bid, leg.bid_size, leg.ask, leg.ask_size, leg.ts = bid, bid_size, ask, ask_size, ts
+
+            for near in self._by_leg.get(code, ()):
+                far = self._pairs[near]
+                quote = self._compute(near, far)
+                if quote is not None:
+                    self._quotes[near] = quote
+                    changed.append((near, quote))
+            if changed:
+                self.version += 1
+
+        if self.on_update:
+            for near, quote in changed:
+                self.on_update(near, quote)
+        return [near for near, _ in changed]
+
+    def _compute(self, near, far):
+        n, f = self._legs[near], self._legs[far]
+        if n.bid <= 0 or n.ask <= 0 or f.bid <= 0 or f.ask <= 0:
+            return None
+        bid = f.bid - n.ask
+        ask = f.ask - n.bid
+        return {
+            'near': near,
+            'far': far,
+            'bid': bid,
+            'bid_size': min(f.bid_size, n.ask_size),
+            'ask': ask,
+            'ask_size': min(f.ask_size, n.bid_size),
+            'mid': (bid + ask) / 2,
+            'ts': min(n.ts, f.ts),
+        }
+
+    # ===== 讀取 =====
+    def get(self, near, max_age=None, now=None):
+        """
+        取得價差報價
+
+        Args:
+            max_age: 兩腳任一超過秒數即視為沒有資料
+
+        Returns:
+            dict: near, far, bid, bid_size, ask, ask_size, mid, ts;沒有或過期時為 None
+        """
+        with self._lock:
+            quote = self._quotes.get(near)
+            if quote is None:
+                return None
+            far = self._pairs[near]
+            ts = min(self._legs[near].ts, self._legs[far].ts)
+        if max_age is not None and (now or time.time()) - ts > max_age:
+            return None
+        return dict(quote, ts=ts)
+
+    def check(self, near, target_spread, is_逆價差, is_sell_position, max_age=DEFAULT_MAX_AGE):
+        """
+        以可成交價差判斷是否達到轉倉目標 (與 check_and_roll_if_spread_met 同樣的回傳格式)
+
+        正價差目標 T: 多單 賣價差 <= T 觸發; 空單 買價差 >= T 觸發
+        逆價差目標 T (近月 - 次月 = T): 門檻改為 -T
+
+        Returns:
+            tuple: (是否觸發, 訊息, 可成交價差);沒有新鮮報價時為 None (由呼叫端改用其他方式)
+        """
+        quote = self.get(near, max_age=max_age)
+        if quote is None:
+            return None
+
+        threshold = -target_spread if is_逆價差 else target_spread
+        if is_sell_position:
+            spread, size, met = quote['bid'], quote['bid_size'], quote['bid'] >= threshold
+        else:
+            spread, size, met = quote['ask'], quote['ask_size'], quote['ask'] <= threshold
+
+        kind = "逆價差" if is_逆價差 else "正價差"
+        text = (f"{near} -> {quote['far']} 可成交價差 {spread:+.0f} ({size} 組), "
+                f"{kind}目標 {target_spread:.0f}")
+        return met, ("已達標: " if met else "") + text, spread
+
+
+if __name__ == "__main__":
+    # 效能測試: 每筆 BidAsk 的增量更新成本
+    import random
+
+    book = SpreadBook(next_month_lookup=lambda near: near + 'F')
+    legs = book.set_pairs([f'N{i}' for i in range(6)])
+    rng = random.Random(0)
+    n = 200_000
+    started = time.perf_counter()
+    for _ in range(n):
+        code = rng.choice(legs)
+        mid = 22000 + rng.randint(-50, 50)
+        book.update(code, mid - 1, rng.randint(1, 20), mid + 1, rng.randint(1, 20))
+    elapsed = time.perf_counter() - started
+    print(book.get('N0'))
+    print(f"{n:,} 筆 BidAsk, 每筆 {elapsed / n * 1e6:.2f} us")
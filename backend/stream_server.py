@@ -0,0 +1,311 @@
+# backend/stream_server.py
+"""
+本機串流服務模組
+負責以 asyncio 在 localhost 提供倉位與風險狀態:
+    GET /snapshot   一次性 JSON 快照
+    GET /stream     Server-Sent Events (快照 + 增量)
+    GET /ws         WebSocket (快照 + 增量)
+每個連線各自節流,只送出與上次送出內容的差異
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+DEFAULT_MIN_INTERVAL = 0.5  # 每個連線最短推送間隔 (秒)
+_WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+def diff_state(old, new):
+    """
+    計算兩份狀態的差異
+
+    Args:
+        old / new: {'summary': dict, 'positions': {code: dict}}
+
+    Returns:
+        dict: summary/upsert/remove,沒有差異時為 None
+    """
+    summary = {k: v for k, v in new['summary'].items() if old['summary'].get(k) != v}
+
+    upsert = {}
+    for code, row in new['positions'].items():
+        before = old['positions'].get(code)
+        if before is None:
+            upsert[code] = row
+            continue
+        changed = {k: v for k, v in row.items() if before.get(k) != v}
+        if changed:
+            upsert[code] = changed
+
+    remove = [code for code in old['positions'] if code not in new['positions']]
+
+    if not (summary or upsert or remove):
+        return None
+    return {'summary': summary, 'upsert': upsert, 'remove': remove}
+
+
+class _Client:
+    def __init__(self, writer, kind, min_interval):
+        self.writer = writer
+        self.kind = kind
+        self.min_interval = min_interval
+        self.changed = asyncio.Event()
+        self.sent = None  # 上次送出的狀態
+
+    async def send(self, payload):
+        data = json.dumps(payload, ensure_ascii=False)
+        if self.kind == 'sse':
+            self.writer.write(f"event: {payload['type']}\ndata: {data}\n\n".encode('utf-8'))
+        else:
+            self.writer.write(_ws_frame(data.encode('utf-8')))
+        await self.writer.drain()
+
+
+class StreamServer:
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, min_interval=DEFAULT_MIN_INTERVAL):
+        self.host = host
+        self.port = port
+        self.min_interval = min_interval
+
+        self._lock = threading.Lock()
+        self._state = {'seq': 0, 'summary': {}, 'positions': {}}
+        self._clients = set()
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    # ===== 狀態更新 (任何執行緒) =====
+    def publish(self, summary, positions):
+        """
+        更新狀態並通知所有連線
+
+        Args:
+            summary: 總計 dict
+            positions: 倉位 dict 列表 (需含 code)
+        """
+        rows = {}
+        for p in positions:
+            rows[p['code']] = {k: _jsonable(v) for k, v in p.items()}
+
+        with self._lock:
+            self._state = {
+                'seq': self._state['seq'] + 1,
+                'summary': {k: _jsonable(v) for k, v in summary.items()},
+                'positions': rows,
+            }
+
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._notify)
+
+    def get_state(self):
+        with self._lock:
+            return self._state
+
+    def _notify(self):
+        for client in self._clients:
+            client.changed.set()
+
+    # ===== 啟動/停止 =====
+    def start(self):
+        """在背景執行緒啟動事件迴圈"""
+        if self._thread is not None:
+            return
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), daemon=True)
+        self._thread.start()
+        ready.wait(timeout=5)
+
+    def _run(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port)
+            )
+            self.port = self._server.sockets[0].getsockname()[1]
+            logger.info(f"串流服務已啟動 http://{self.host}:{self.port}/stream")
+        except OSError as e:
+            logger.error(f"串流服務啟動失敗: {e}")
+            self._loop = None
+            ready.set()
+            return
+        ready.set()
+        self._loop.run_forever()
+
+    def stop(self):
+        loop = self._loop
+        if loop is None:
+            return
+
+        async def _shutdown():
+            self._server.close()
+            for client in list(self._clients):
+                client.writer.close()
+            # 結束仍在處理中的連線,避免事件迴圈停止時留下未完成的工作
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            loop.stop()
+
+        asyncio.run_coroutine_threadsafe(_shutdown(), loop)
+        self._thread.join(timeout=5)
+        self._loop = None
+        self._thread = None
+
+    # ===== 連線處理 =====
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+
+        lines = request.decode('latin-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            writer.close()
+            return
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        try:
+            interval = max(float(query.get('interval', [self.min_interval])[0]), 0.05)
+        except ValueError:
+            interval = self.min_interval
+
+        try:
+            if method != 'GET':
+                await self._respond(writer, 405, {'error': 'method not allowed'})
+            elif url.path == '/snapshot':
+                await self._respond(writer, 200, self._snapshot_payload(self.get_state()))
+            elif url.path == '/stream':
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: text/event-stream; charset=utf-8\r\n"
+                    b"Cache-Control: no-cache\r\n"
+                    b"Connection: keep-alive\r\n\r\n"
+                )
+                await self._serve(_Client(writer, 'sse', interval), reader)
+            elif url.path == '/ws' and 'sec-websocket-key' in headers:
+                accept = base64.b64encode(
+                    hashlib.sha1((headers['sec-websocket-key'] + _WS_GUID).encode()).digest()
+                ).decode()
+                writer.write(
+                    "HTTP/1.1 101 Switching Protocols\r\n"
+                    "Upgrade: websocket\r\n"
+                    "Connection: Upgrade\r\n"
+                    f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+                )
+                await self._serve(_Client(writer, 'ws', interval), reader)
+            else:
+                await self._respond(writer, 404, {'error': 'not found'})
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        reason = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed'}.get(status, '')
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    def _snapshot_payload(self, state):
+        return {
+            'type': 'snapshot',
+            'seq': state['seq'],
+            'summary': state['summary'],
+            'positions': state['positions'],
+        }
+
+    async def _serve(self, client, reader):
+        """先送快照,之後依節流間隔送出與上次內容的差異"""
+        self._clients.add(client)
+        closed = asyncio.ensure_future(self._wait_closed(client, reader))
+        try:
+            state = self.get_state()
+            await client.send(self._snapshot_payload(state))
+            client.sent = state
+
+            while not closed.done():
+                waiter = asyncio.ensure_future(client.changed.wait())
+                await asyncio.wait({waiter, closed}, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if closed.done():
+                    break
+                client.changed.clear()
+
+                state = self.get_state()
+                delta = diff_state(client.sent, state)
+                if delta is not None:
+                    delta.update({'type': 'delta', 'seq': state['seq']})
+                    await client.send(delta)
+                    client.sent = state
+
+                # 節流: 間隔內的更新合併到下一次
+                await asyncio.sleep(client.min_interval)
+        finally:
+            closed.cancel()
+            self._clients.discard(client)
+
+    async def _wait_closed(self, client, reader):
+        """偵測連線中斷 (WebSocket 另外處理 ping/close)"""
+        while True:
+            if client.kind == 'sse':
+                if not await reader.read(1024):
+                    return
+                continue
+
+            try:
+                header = await reader.readexactly(2)
+                length = header[1] & 0x7F
+                if length == 126:
+                    length = int.from_bytes(await reader.readexactly(2), 'big')
+                elif length == 127:
+                    length = int.from_bytes(await reader.readexactly(8), 'big')
+                mask = await reader.readexactly(4) if header[1] & 0x80 else b'\0\0\0\0'
+                data = bytes(b ^ mask[i % 4] for i, b in enumerate(await reader.readexactly(length)))
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+
+            opcode = header[0] & 0x0F
+            if opcode == 0x8:
+                return
+            if opcode == 0x9:
+                client.writer.write(_ws_frame(data, opcode=0xA))
+
+
+def _ws_frame(payload, opcode=0x1):
+    length = len(payload)
+    if length < 126:
+        head = bytes([0x80 | opcode, length])
+    elif length < 65536:
+        head = bytes([0x80 | opcode, 126]) + length.to_bytes(2, 'big')
+    else:
+        head = bytes([0x80 | opcode, 127]) + length.to_bytes(8, 'big')
+    return head + payload
+
+
+def _jsonable(value):
+    if isinstance(value, (int, float, str, bool)) or value is None:
+        return value
+    return str(value)
@@ -0,0 +1,227 @@
+# backend/subscription_manager.py
+"""
+訂閱管理模組
+負責以 (代碼, 報價類型) 為單位對各使用者做參考計數,只送出差異的訂閱/取消訂閱
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+QUOTE_TICK = 'tick'
+QUOTE_BIDASK = 'bidask'
+
+# Shioaji 單一連線訂閱上限約 200 檔,保留一些空間
+DEFAULT_MAX_SUBSCRIPTIONS = 190
+
+
+class SubscriptionManager:
+    def __init__(self, api=None, contract_lookup=None, max_subscriptions=DEFAULT_MAX_SUBSCRIPTIONS):
+        """
+        Args:
+            api: Shioaji API 物件
+            contract_lookup: code -> 合約物件 的函式 (通常是 ContractCache.get_contract)
+            max_subscriptions: 同時訂閱上限
+        """
+        self.api = api
+        self.contract_lookup = contract_lookup
+        self.max_subscriptions = max_subscriptions
+
+        self._lock = threading.RLock()
+        self._consumers = {}          # consumer -> set((code, quote_type))
+        self._refs = {}               # (code, quote_type) -> 參考數
+        self._active = OrderedDict()  # 已向券商訂閱的 key (依最後使用排序)
+        self._pending_sub = set()
+        self._pending_unsub = set()
+
+    # ===== 使用者介面 =====
+    def set_consumer(self, consumer, codes, quote_type=QUOTE_TICK, flush=True):
+        """
+        設定某使用者需要的代碼集合,只計算差異
+
+        Returns:
+            tuple: (新增數, 移除數)
+        """
+        with self._lock:
+            old = {k for k in self._consumers.get(consumer, set()) if k[1] == quote_type}
+            new = {(code, quote_type) for code in codes if code}
+            keep = self._consumers.get(consumer, set()) - old
+
+            for key in new - old:
+                self._acquire(key)
+            for key in old - new:
+                self._release(key)
+
+            self._consumers[consumer] = keep | new
+            if not self._consumers[consumer]:
+                del self._consumers[consumer]
+
+            changed = (len(new - old), len(old - new))
+
+        if flush:
+            self.flush()
+        return changed
+
+    def release_consumer(self, consumer, flush=True):
+        """釋放某使用者的所有訂閱"""
+        with self._lock:
+            for key in self._consumers.pop(consumer, set()):
+                self._release(key)
+        if flush:
+            self.flush()
+
+    def release_all(self):
+        """取消所有訂閱 (登出時使用)"""
+        with self._lock:
+            self._consumers = {}
+            self._refs = {}
+            self._pending_sub = set()
+            self._pending_unsub = set(self._active)
+        self.flush()
+        with self._lock:
+            self._active.clear()
+
+    def purge(self):
+        """立即取消所有沒有使用者的訂閱"""
+        with self._lock:
+            for key in self._active:
+                if self._refs.get(key, 0) == 0:
+                    self._pending_unsub.add(key)
+        return self.flush()
+
+    def set_callbacks(self, on_quote, on_order=None):
+        """設定報價與委託回報回調"""
+        if self.api is None:
+            return False
+        try:
+            self.api.quote.set_on_tick_fop_v1_callback(on_quote)
+            self.api.quote.set_on_bidask_fop_v1_callback(on_quote)
+            if on_order:
+                self.api.set_order_callback(on_order)
+            return True
+        except Exception as e:
+            logger.error(f"設定回調失敗: {e}")
+            return False
+
+    def get_codes(self, quote_type=None):
+        """取得目前有人使用的代碼"""
+        with self._lock:
+            return sorted({code for (code, qt), n in self._refs.items()
+                           if n > 0 and (quote_type is None or qt == quote_type)})
+
+    def get_consumer_codes(self, consumer, quote_type=None):
+        with self._lock:
+            return sorted({code for (code, qt) in self._consumers.get(consumer, set())
+                           if quote_type is None or qt == quote_type})
+
+    def is_subscribed(self, code, quote_type=QUOTE_TICK):
+        with self._lock:
+            return (code, quote_type) in self._active
+
+    def resubscribe(self, codes, quote_type=QUOTE_TICK):
+        """強制重新訂閱 (報價停滯時使用)"""
+        keys = [(code, quote_type) for code in codes]
+        with self._lock:
+            keys = [k for k in keys if k in self._active]
+        for key in keys:
+            self._send(key, subscribe=False)
+            self._send(key, subscribe=True)
+        return len(keys)
+
+    # ===== 參考計數 =====
+    def _acquire(self, key):
+        self._refs[key] = self._refs.get(key, 0) + 1
+        if key in self._active:
+            self._active.move_to_end(key)
+            self._pending_unsub.discard(key)
+        else:
+            self._pending_sub.add(key)
+
+    def _release(self, key):
+        count = self._refs.get(key, 0) - 1
+        if count > 0:
+            self._refs[key] = count
+            return
+        self._refs.pop(key, None)
+        # 沒有人使用的代碼先保留訂閱,超過上限時才淘汰
+        self._pending_sub.discard(key)
+
+    def _evict(self, needed):
+        """淘汰最久未使用且沒有參考的訂閱,直到空出 needed 個位置"""
+        room = self.max_subscriptions - (len(self._active) - len(self._pending_unsub))
+        if room >= needed:
+            return
+        for key in list(self._active):
+            if room >= needed:
+                break
+            if self._refs.get(key, 0) == 0 and key not in self._pending_unsub:
+                self._pending_unsub.add(key)
+                room += 1
+
+    # ===== 批次送出 =====
+    def flush(self):
+        """一次送出累積的訂閱/取消訂閱"""
+        with self._lock:
+            self._evict(len(self._pending_sub))
+            to_unsub = list(self._pending_unsub)
+            room = self.max_subscriptions - (len(self._active) - len(to_unsub))
+            to_sub = sorted(self._pending_sub)[:max(room, 0)]
+            self._pending_unsub = set()
+            self._pending_sub = set(self._pending_sub) - set(to_sub)
+
+        if self._pending_sub:
+            logger.warning(f"超過訂閱上限 {self.max_subscriptions},{len(self._pending_sub)} 檔暫緩")
+
+        for key in to_unsub:
+            if self._send(key, subscribe=False):
+                with self._lock:
+                    self._active.pop(key, None)
+
+        failed = []
+        for key in to_sub:
+            if self._send(key, subscribe=True):
+                with self._lock:
+                    self._active[key] = True
+            else:
+                failed.append(key)
+
+        if failed:
+            # 仍有人使用的代碼放回待訂閱,下次 flush 重送
+            with self._lock:
+                self._pending_sub.update(k for k in failed if self._refs.get(k, 0) > 0)
+
+        if to_sub or to_unsub:
+            logger.info(f"訂閱 +{len(to_sub)} / -{len(to_unsub)},目前 {len(self._active)} 檔")
+        return len(to_sub), len(to_unsub)
+
+    def _send(self, key, subscribe):
+        code, quote_type = key
+        if self.api is None:
+            return False
+
+        contract = self.contract_lookup(code) if self.contract_lookup else None
+        if contract is None:
+            logger.warning(f"找不到合約: {code}", extra={'rate_key': f'subscribe.contract.{code}'})
+            return False
+
+        try:
+            try:
+                import shioaji as sj
+                kwargs = {
+                    'quote_type': sj.constant.QuoteType(quote_type),
+                    'version': sj.constant.QuoteVersion.v1,
+                }
+            except ImportError:
+                # 未安裝 shioaji (模擬交易所) 時直接傳字串
+                kwargs = {'quote_type': quote_type}
+            if subscribe:
+                self.api.quote.subscribe(contract, **kwargs)
+            else:
+                self.api.quote.unsubscribe(contract, **kwargs)
+            return True
+        except Exception as e:
+            action = "訂閱" if subscribe else "取消訂閱"
+            logger.warning(f"{action} {code} ({quote_type}) 失敗: {e}",
+                           extra={'rate_key': f'subscribe.{subscribe}.{code}.{quote_type}'})
+            return False
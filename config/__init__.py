@@ -1,3 +1,3 @@
-from .config_loader import load_credentials
+from .config_loader import load_credentials, load_risk_limits, load_accounts
 
-__all__ = ['load_credentials']
+__all__ = ['load_credentials', 'load_risk_limits', 'load_accounts']
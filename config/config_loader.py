@@ -98,6 +98,104 @@ def save_credentials(api_key='', secret_key='', ca_path='',
         return False
 
 
+DEFAULT_RISK_LIMITS = {
+    'max_margin': 0.0,         # 總保證金上限 (0 表示不限制)
+    'max_margin_usage': 0.0,   # 保證金 / 權益數 上限 (0 表示不限制)
+    'max_delta': 0.0,          # 每個標的淨 Delta 絕對值上限 (0 表示不限制)
+    'max_lots': 0,             # 每個商品口數上限 (0 表示不限制)
+    'warn_ratio': 0.9,         # 達到上限的此比例即提出警告
+    'action': 'reject',        # 超過上限時 reject (拒絕) 或 warn (僅警告)
+    'product_lots': {},        # 個別商品口數上限,例如 max_lots_TXF = 10
+}
+
+
+def load_risk_limits(config_file='opds.ini'):
+    """
+    從設定檔 [risk_limits] 區段載入下單前風控限制
+
+    範例:
+        [risk_limits]
+        max_margin = 2000000
+        max_margin_usage = 0.8
+        max_delta = 30
+        max_lots = 20
+        max_lots_TXF = 10
+        action = reject
+
+    Returns:
+        dict: 見 DEFAULT_RISK_LIMITS,沒有設定時全部不限制
+    """
+    limits = dict(DEFAULT_RISK_LIMITS, product_lots={})
+    
+    if not os.path.exists(config_file):
+        return limits
+    
+    try:
+        opds = configparser.ConfigParser()
+        opds.optionxform = str  # 保留商品代碼大小寫
+        opds.read(config_file, encoding='utf-8')
+        
+        if 'risk_limits' not in opds:
+            return limits
+        
+        section = opds['risk_limits']
+        for key in ('max_margin', 'max_margin_usage', 'max_delta', 'warn_ratio'):
+            if key in section:
+                limits[key] = section.getfloat(key)
+        if 'max_lots' in section:
+            limits['max_lots'] = section.getint('max_lots')
+        if section.get('action', '').lower() in ('reject', 'warn'):
+            limits['action'] = section.get('action').lower()
+        
+        for key in section:
+            if key.startswith('max_lots_'):
+                limits['product_lots'][key[len('max_lots_'):].upper()] = section.getint(key)
+    
+    except Exception as e:
+        print(f"載入風控設定失敗: {e}")
+    
+    return limits
+
+
+def load_accounts(config_file='opds.ini'):
+    """
+    從設定檔 [accounts] 區段載入要彙總的期貨子帳戶
+
+    範例:
+        [accounts]
+        主帳戶 = F002000-1234567
+        選擇權 = 7654321
+        timeout = 5
+
+    Returns:
+        dict: accounts ([(名稱, 帳號)],沒有設定時為空列表), timeout (每個帳戶的查詢秒數)
+    """
+    result = {'accounts': [], 'timeout': 5.0}
+    
+    if not os.path.exists(config_file):
+        return result
+    
+    try:
+        opds = configparser.ConfigParser()
+        opds.optionxform = str  # 保留帳戶名稱大小寫
+        opds.read(config_file, encoding='utf-8')
+        
+        if 'accounts' not in opds:
+            return result
+        
+        section = opds['accounts']
+        for key in section:
+            if key == 'timeout':
+                result['timeout'] = section.getfloat(key)
+            elif section[key].strip():
+                result['accounts'].append((key, section[key].strip()))
+    
+    except Exception as e:
+        print(f"載入帳戶設定失敗: {e}")
+    
+    return result
+
+
 def get_ca_config(config_file='opds.ini'):
     """
     取得 CA 憑證設定
@@ -131,4 +229,4 @@ if __name__ == "__main__":
     if ca_path:
         print("\nCA 憑證設定已找到")
     else:
-        print("\n未找到 CA 憑證設定")
\ No newline at end of file
+        print("\n未找到 CA 憑證設定")
@@ -0,0 +1,128 @@
+# gui/chart_window.py
+"""
+走勢圖視窗模組
+負責繪製盤中總損益、淨 Delta、保證金走勢 (LTTB 降採樣,每秒重繪)
+"""
+import time
+import tkinter as tk
+from datetime import datetime
+from tkinter import ttk
+
+# 顯示範圍 -> 秒數 (None 表示全部)
+RANGES = {
+    '15 分鐘': 15 * 60,
+    '1 小時': 3600,
+    '4 小時': 4 * 3600,
+    '全部': None,
+}
+
+PANELS = (
+    ('pnl', '總損益', 'red'),
+    ('delta', '淨 Delta', 'blue'),
+    ('margin', '保證金', 'purple'),
+)
+
+REFRESH_MS = 1000
+PAD_LEFT = 80
+PAD_RIGHT = 10
+PAD_Y = 18
+
+
+class ChartWindow:
+    def __init__(self, root, app):
+        self.app = app
+        self.sampler = app.timeseries
+
+        self.top = tk.Toplevel(root)
+        self.top.title("盤中走勢")
+        self.top.geometry("900x600")
+
+        bar = tk.Frame(self.top)
+        bar.pack(fill='x', padx=10, pady=5)
+        tk.Label(bar, text="範圍:").pack(side='left')
+        self.range_var = tk.StringVar(value='全部')
+        combo = ttk.Combobox(bar, textvariable=self.range_var, values=list(RANGES),
+                             width=10, state='readonly')
+        combo.pack(side='left', padx=5)
+        combo.bind("<<ComboboxSelected>>", lambda e: self.redraw())
+        self.lbl_info = tk.Label(bar, text="", fg="gray")
+        self.lbl_info.pack(side='right')
+
+        self.canvas = tk.Canvas(self.top, bg="white")
+        self.canvas.pack(fill='both', expand=True, padx=10, pady=(0, 10))
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
+
+        self._job = None
+        self.top.protocol("WM_DELETE_WINDOW", self.close)
+        self.schedule()
+
+    def schedule(self):
+        self.redraw()
+        self._job = self.top.after(REFRESH_MS, self.schedule)
+
+    def close(self):
+        if self._job is not None:
+            self.top.after_cancel(self._job)
+            self._job = None
+        self.top.destroy()
+
+    def redraw(self):
+        canvas = self.canvas
+        canvas.delete('all')
+        width = canvas.winfo_width()
+        height = canvas.winfo_height()
+        if width < 50 or height < 50:
+            return
+
+        seconds = RANGES.get(self.range_var.get())
+        since = time.time() - seconds if seconds else None
+
+        # 每個像素最多一點
+        max_points = max(width - PAD_LEFT - PAD_RIGHT, 10)
+        panel_height = height / len(PANELS)
+        total = 0
+
+        for row, (field, title, color) in enumerate(PANELS):
+            times, values = self.sampler.get_series(field, since=since, max_points=max_points)
+            top = row * panel_height + PAD_Y
+            bottom = (row + 1) * panel_height - PAD_Y
+            total = max(total, len(times))
+
+            canvas.create_text(PAD_LEFT, top - 10, text=title, anchor='w', fill=color,
+                               font=("Arial", 9, "bold"))
+            canvas.create_rectangle(PAD_LEFT, top, width - PAD_RIGHT, bottom, outline="#d0d0d0")
+            if len(times) < 2:
+                canvas.create_text((PAD_LEFT + width) / 2, (top + bottom) / 2, text="尚無資料", fill="gray")
+                continue
+
+            t0, t1 = float(times[0]), float(times[-1])
+            lo, hi = float(values.min()), float(values.max())
+            if hi - lo < 1e-9:
+                lo, hi = lo - 1, hi + 1
+            span_t = max(t1 - t0, 1e-9)
+
+            def to_xy(t, v):
+                x = PAD_LEFT + (t - t0) / span_t * (width - PAD_LEFT - PAD_RIGHT)
+                y = bottom - (v - lo) / (hi - lo) * (bottom - top)
+                return x, y
+
+            # 零軸
+            if lo < 0 < hi:
+                _, y0 = to_xy(t0, 0.0)
+                canvas.create_line(PAD_LEFT, y0, width - PAD_RIGHT, y0, fill="#e0e0e0", dash=(2, 2))
+
+            coords = []
+            for t, v in zip(times.tolist(), values.tolist()):
+                coords.extend(to_xy(t, v))
+            canvas.create_line(*coords, fill=color)
+
+            canvas.create_text(PAD_LEFT - 5, top, text=f"{hi:,.2f}", anchor='ne', font=("Arial", 8))
+            canvas.create_text(PAD_LEFT - 5, bottom, text=f"{lo:,.2f}", anchor='se', font=("Arial", 8))
+            canvas.create_text(PAD_LEFT - 5, (top + bottom) / 2, text=f"{float(values[-1]):,.2f}",
+                               anchor='e', fill=color, font=("Arial", 8, "bold"))
+            canvas.create_text(PAD_LEFT, bottom + 2, anchor='nw', font=("Arial", 8), fill="gray",
+                               text=datetime.fromtimestamp(t0).strftime('%H:%M:%S'))
+            canvas.create_text(width - PAD_RIGHT, bottom + 2, anchor='ne', font=("Arial", 8), fill="gray",
+                               text=datetime.fromtimestamp(t1).strftime('%H:%M:%S'))
+
+        self.lbl_info.config(text=f"取樣 {len(self.sampler):,} 筆 / 繪製 {total} 點")
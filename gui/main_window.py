@@ -3,11 +3,42 @@
 主視窗模組
 負責 UI 框架、登入/登出、按鈕事件處理
 """
+import logging
+import threading
+import uuid
+from datetime import datetime
 import tkinter as tk
 from tkinter import messagebox
-from backend import TradingBackend
+from backend import (
+    TradingBackend,
+    ContractCache,
+    SubscriptionManager,
+    OrderBookCache,
+    SnapshotService,
+    PositionBook,
+    SettlementCalendar,
+    SessionClock,
+    FeedWatchdog,
+    SpreadBook,
+    AccountAggregator
+)
 from my_utils import MarginFetcher
-from config import load_credentials
+from my_utils.event_bus import EventBus, TICK, FILL, MONITOR, SPREAD
+from my_utils.portfolio_margin import PortfolioMargin
+from my_utils.profiler import SamplingProfiler
+from my_utils.pretrade_check import PreTradeChecker, REJECT, WARN
+from my_utils.risk_engine import RiskEngine
+from my_utils.state_journal import StateJournal
+from config import load_credentials, load_risk_limits, load_accounts
+try:
+    from my_utils.timeseries import TimeSeriesSampler
+except ImportError:  # 沒有安裝 numpy 時不記錄走勢
+    TimeSeriesSampler = None
+try:
+    from my_utils.exporter import ColumnarExporter
+except ImportError:  # 沒有安裝 pyarrow 時不匯出
+    ColumnarExporter = None
+from .chart_window import ChartWindow
 from .positions_view import PositionsView
 from .dialogs import (
     FuturesRollDialog, 
@@ -16,25 +47,111 @@ from .dialogs import (
     MonitorWindow
 )
 
+logger = logging.getLogger(__name__)
+
+SESSION_CHECK_MS = 30000
+PREWARM_SECONDS = 300     # 開盤前幾秒預載合約與快照
+OPEN_LEAD_SECONDS = 30    # 開盤前幾秒重新訂閱,確保收到第一筆報價
+SPREAD_CHECK_MS = 100     # 價差簿變動後檢查監測的合併間隔
+EXPORT_MS = 1000          # 風險走勢匯出間隔
+EXPORT_POSITIONS_EVERY = 60  # 每幾次風險匯出附帶一次倉位快照
+PROFILE_DURATIONS = (30, 120)  # 診斷選單的分析秒數
+
 class TradingApp:
-    def __init__(self, root):
+    def __init__(self, root, backend=None):
         self.root = root
         self.root.title("Python 程式交易中控台 (P&L Ver.)")
         self.root.geometry("1400x800")
         
-        self.backend = TradingBackend(simulation=False)
+        # backend 可替換為 EngineClient (引擎行程) 等相同介面的物件
+        self.backend = backend or TradingBackend(simulation=False)
+        self.remote = getattr(self.backend, 'remote', False)
+        if getattr(self.backend, 'simulated', False):
+            self.root.title("Python 程式交易中控台 (P&L Ver.) - 模擬交易所")
+        self._engine_seq = 0
+        # 多帳戶彙總 (引擎模式維持單一帳戶)
+        account_config = load_accounts()
+        if self.remote and account_config['accounts']:
+            logger.warning(f"引擎模式不支援多帳戶彙總,忽略 [accounts] 設定的 {len(account_config['accounts'])} 個帳戶")
+            account_config = {}
+        self.accounts = AccountAggregator(self.backend, **account_config)
+        self.bus = EventBus()
         self.margin_fetcher = MarginFetcher()
-        self.positions_data = []
+        self.portfolio_margin = PortfolioMargin(self.margin_fetcher)
+        self.contract_cache = ContractCache(cache_dir=getattr(self.backend, 'cache_dir', '.'))
+        self.margin_fetcher.contract_lookup = self.contract_cache.get
+        self.subscriptions = SubscriptionManager(contract_lookup=self.contract_cache.get_contract)
+        self.order_book = OrderBookCache()
+        self.spread_book = SpreadBook(
+            next_month_lookup=self.contract_cache.next_month,
+            on_update=lambda near, quote: self.bus.publish(SPREAD, near, quote)
+        )
+        self.snapshots = SnapshotService(contract_lookup=self.contract_cache.get_contract)
+        self.settlement = SettlementCalendar()
+        # 模擬交易所提供全天開盤的時段
+        self.session_clock = getattr(self.backend, 'session_clock', None) or SessionClock(self.settlement)
+        self.session = None
+        self._prewarmed_for = None
+        self._timers = {}  # 名稱 -> root.after job (休市時取消)
+        self.watchdog = FeedWatchdog(
+            self.subscriptions,
+            self.snapshots,
+            self.session_clock,
+            on_stale=lambda codes: self.root.after(0, self.positions_view.mark_stale, codes),
+            on_backfill=lambda snap: self.bus.publish(TICK, snap.code, snap)
+        )
+        self.position_book = PositionBook(multiplier_lookup=self.contract_cache.get_multiplier)
+        self._reconcile_job = None
+        self.risk_engine = RiskEngine(
+            self.margin_fetcher,
+            multiplier_lookup=self.contract_cache.get_multiplier,
+            on_alert=lambda tier, status: self.root.after(0, self.on_risk_alert, tier, status)
+        )
+        self.pretrade = PreTradeChecker(self.margin_fetcher, load_risk_limits())
+        self.timeseries = TimeSeriesSampler() if TimeSeriesSampler else None
+        # 引擎模式由引擎行程匯出
+        self.exporter = ColumnarExporter() if ColumnarExporter and not self.remote else None
+        self._export_count = 0
+        if self.exporter is not None:
+            self.exporter.start()
+        self.positions_data = []   # PositionRecord 列表 (表格順序)
+        self.positions_index = {}  # code -> [PositionRecord] (多帳戶時同一代碼每個帳戶一列)
         self.is_subscribed = False
         self.subscribed_contracts = []
         self.spread_monitors = []  # 價差監測列表
+        self._checking_monitors = False
+        self.profiler = SamplingProfiler()  # 只在診斷選單啟動時取樣
+        self._profile_job = None
+        self.journal = StateJournal()
+        self.restored_state = self.journal.restore()
+        self.journal.drop_expired(self.settlement.is_expired)
         
         self.setup_ui()
+        self.bus.subscribe(SPREAD, self.on_spread_update, widget=self.root,
+                           coalesce=True, interval_ms=SPREAD_CHECK_MS)
         self.load_credentials()
         self.update_margin_status()
+        self.restore_state()
+        
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        if self.remote:
+            self.root.after(200, self.poll_engine)
+        self.root.after(1000, self.check_session)
     
     def setup_ui(self):
         """建立 UI 框架"""
+        # ===== 0. 選單 =====
+        menubar = tk.Menu(self.root)
+        menu_diag = tk.Menu(menubar, tearoff=0)
+        for seconds in PROFILE_DURATIONS:
+            menu_diag.add_command(
+                label=f"效能分析 {seconds} 秒",
+                command=lambda s=seconds: self.start_profiling(s)
+            )
+        menu_diag.add_command(label="停止效能分析", command=self.stop_profiling)
+        menubar.add_cascade(label="診斷", menu=menu_diag)
+        self.root.config(menu=menubar)
+        
         # ===== 1. Top Frame - 登入區 =====
         frame_top = tk.Frame(self.root, pady=10)
         frame_top.pack(fill='x')
@@ -57,6 +174,9 @@ class TradingApp:
         self.lbl_status = tk.Label(frame_top, text="狀態: 未連線", fg="red")
         self.lbl_status.pack(side='left', padx=10)
         
+        self.lbl_session = tk.Label(frame_top, text="", fg="gray")
+        self.lbl_session.pack(side='left', padx=10)
+        
         self.lbl_margin_status = tk.Label(frame_top, text="保證金資料: 未載入", fg="orange")
         self.lbl_margin_status.pack(side='left', padx=10)
         
@@ -89,6 +209,10 @@ class TradingApp:
         self.lbl_total_margin = tk.Label(f1, text="0", font=("Arial", 12, "bold"))
         self.lbl_total_margin.pack(side='left')
         
+        tk.Label(f1, text="組合保證金:", font=("Arial", 10)).pack(side='left', padx=10)
+        self.lbl_portfolio_margin = tk.Label(f1, text="-", font=("Arial", 12, "bold"))
+        self.lbl_portfolio_margin.pack(side='left')
+        
         # 多空 Delta 分析
         f2 = tk.Frame(frame_btm)
         f2.pack(fill='x', pady=5)
@@ -105,6 +229,15 @@ class TradingApp:
         self.lbl_net_direction = tk.Label(f2, text="中立", font=("Arial", 10, "bold"))
         self.lbl_net_direction.pack(side='left', padx=5)
         
+        tk.Label(f2, text="風險指標:", font=("Arial", 9)).pack(side='left', padx=(20, 5))
+        self.lbl_risk = tk.Label(f2, text="-", font=("Arial", 10, "bold"))
+        self.lbl_risk.pack(side='left', padx=5)
+        
+        # 各帳戶彙總 (多帳戶時)
+        self.lbl_accounts = tk.Label(frame_btm, text="", font=("Arial", 9), anchor='w')
+        if self.accounts.multi:
+            self.lbl_accounts.pack(fill='x', pady=(0, 5))
+        
         # 目標 Delta 計算
         f3 = tk.Frame(frame_btm)
         f3.pack(fill='x', pady=5)
@@ -115,6 +248,7 @@ class TradingApp:
         self.entry_target.pack(side='left')
         
         tk.Button(f3, text="計算建議", command=self.on_calculate, bg="orange").pack(side='left', padx=10)
+        tk.Button(f3, text="走勢圖", command=self.open_chart, bg="#D3D3D3").pack(side='left', padx=5)
         
         self.txt_result = tk.Text(frame_btm, height=5, bg="#f0f0f0")
         self.txt_result.pack(fill='x', pady=5)
@@ -127,6 +261,95 @@ class TradingApp:
         if creds.get('secret_key'):
             self.entry_secret.insert(0, creds['secret_key'])
     
+    # ===== 狀態還原 =====
+    def restore_state(self):
+        """還原上次的目標 Delta 與價差監測 (監測在登入後恢復檢查)"""
+        state = self.restored_state
+        if state.get('target_delta') is not None:
+            self.entry_target.delete(0, tk.END)
+            self.entry_target.insert(0, state['target_delta'])
+        
+        for monitor_id, monitor in state['monitors'].items():
+            monitor = dict(monitor, id=monitor_id, active=True)
+            monitor['direction'] = self._restore_direction(monitor['direction'])
+            self.spread_monitors.append(monitor)
+    
+    def resume_after_login(self):
+        """登入後恢復訂閱與價差監測"""
+        if self.restored_state['subscriptions'] and self.positions_data and not self.is_subscribed:
+            self.subscribe_quotes()
+        
+        if any(m['active'] for m in self.spread_monitors):
+            if self.remote:
+                for m in self.spread_monitors:
+                    self.backend.start_spread_monitoring(
+                        m['code'], m['qty'], m['direction'],
+                        m['target_spread'], m['is_逆價差'], m['auto_execute'], monitor_id=m['id']
+                    )
+            else:
+                self.check_spread_monitors()
+    
+    @staticmethod
+    def _restore_direction(value):
+        """日誌中的方向是字串,盡量還原成 Shioaji 的 Action"""
+        try:
+            import shioaji as sj
+            return sj.constant.Action.Sell if 'Sell' in str(value) else sj.constant.Action.Buy
+        except ImportError:
+            return value
+    
+    def on_close(self):
+        """關閉視窗 (引擎模式下一併結束引擎行程)"""
+        if self.remote:
+            self.backend.close()
+        if self.exporter is not None:
+            self.exporter.stop()
+        self.accounts.shutdown()
+        self.root.destroy()
+    
+    def poll_engine(self):
+        """引擎模式: 讀取共享記憶體並重繪有變動的倉位"""
+        try:
+            seq, summary, positions = self.backend.read()
+            if seq > 0 and seq != self._engine_seq:
+                self._engine_seq = seq
+                self.positions_view.sync_from_engine(summary, positions)
+        except Exception as e:
+            logger.warning(f"讀取共享記憶體失敗: {e}", extra={'rate_key': 'gui.poll_engine'})
+        try:
+            for event in self.backend.poll_events():
+                self.on_engine_monitor_event(event)
+        except Exception as e:
+            logger.warning(f"處理引擎監測事件失敗: {e}", extra={'rate_key': 'gui.engine_events'})
+        self.root.after(200, self.poll_engine)
+    
+    def on_engine_monitor_event(self, event):
+        """
+        引擎模式: 處理引擎送回的監測事件
+        confirm 由使用者確認後轉倉,triggered 為已自動轉倉,兩者都寫入日誌並移除監測;
+        rejected/failed 時引擎保留監測,這裡只記錄
+        """
+        monitor = next((m for m in self.spread_monitors if m.get('id') == event.get('id')), None)
+        if monitor is None:
+            logger.warning(f"引擎回報未知的監測: {event}")
+            return
+        
+        kind = event['event']
+        if kind == 'confirm':
+            self._confirm_roll(monitor, event.get('message', ''))
+            self._finish_monitor(monitor)
+        elif kind == 'triggered':
+            self._finish_monitor(monitor)
+            self.request_reconcile()
+            messagebox.showinfo("自動轉倉成功", event.get('message', ''))
+        else:
+            logger.warning(f"{monitor['code']} 引擎自動轉倉未執行 ({kind}),監測保留: {event.get('message', '')}",
+                           extra={'rate_key': f"monitor.engine.{monitor['code']}"})
+            self.bus.publish(MONITOR, monitor['code'], {
+                'event': kind, 'monitor': monitor,
+                'spread': event.get('spread'), 'message': event.get('message', '')
+            })
+    
     # ===== 保證金相關 =====
     def update_margin_status(self):
         """更新保證金狀態顯示"""
@@ -163,8 +386,12 @@ class TradingApp:
             # 登出
             if self.is_subscribed:
                 self.unsubscribe_quotes()
+            self.subscriptions.release_all()
+            self.spread_book.clear()
+            self.watchdog.stop()
             
             self.backend.logout()
+            self.accounts.reset()
             self.btn_auth.config(text="登入 Shioaji", bg="#add8e6")
             self.lbl_status.config(text="狀態: 已登出", fg="red")
             
@@ -176,6 +403,8 @@ class TradingApp:
             self.lbl_short_delta.config(text="0.0")
             self.lbl_net_direction.config(text="中立")
             self.lbl_current_delta.config(text="0.0")
+            self.lbl_risk.config(text="-", fg="black")
+            self.lbl_accounts.config(text="")
         else:
             # 登入
             success, msg = self.backend.login(
@@ -185,7 +414,16 @@ class TradingApp:
             if success:
                 self.btn_auth.config(text="已登入 (點擊登出)", bg="#ffcccb")
                 self.lbl_status.config(text="狀態: 已連線", fg="green")
+                self.contract_cache.api = self.backend.api
+                self.contract_cache.load_or_build()
+                self.subscriptions.api = self.backend.api
+                self.snapshots.api = self.backend.api
                 self.positions_view.refresh_positions()
+                self.load_account_cash()
+                if not self.remote:
+                    self._schedule('reconcile', 30000, self.check_reconcile)
+                    self.watchdog.start()
+                self.resume_after_login()
             else:
                 messagebox.showerror("錯誤", msg)
     
@@ -207,16 +445,18 @@ class TradingApp:
     
     def subscribe_quotes(self):
         """訂閱報價"""
-        codes = [item['data']['code'] for item in self.positions_data]
-        success = self.backend.start_subscribing(
-            codes, 
-            self.on_quote_update, 
-            self.on_order_update
-        )
+        codes = list(self.positions_index)
+        if self.remote:
+            success = self.backend.start_subscribing(codes)
+        else:
+            self.subscriptions.set_callbacks(self.on_quote_update, self.on_order_update)
+            self.subscriptions.set_consumer('positions', codes)
+            success = all(self.subscriptions.is_subscribed(code) for code in codes)
         
         if success:
             self.is_subscribed = True
             self.subscribed_contracts = codes.copy()
+            self.journal.record('subscriptions', codes=codes)
             self.positions_view.btn_subscribe.config(
                 text="已訂閱報價 (點擊取消)", 
                 bg="#FF4444"
@@ -225,65 +465,393 @@ class TradingApp:
         else:
             messagebox.showerror("失敗", "訂閱失敗,請檢查 console 輸出")
     
+    def update_position_subscriptions(self):
+        """倉位變動後只對差異的代碼訂閱/取消訂閱"""
+        if not self.is_subscribed or self.remote:
+            return
+        codes = list(self.positions_index)
+        self.subscriptions.set_consumer('positions', codes)
+        self.subscribed_contracts = codes.copy()
+    
+    def watch_depth(self, consumer, codes):
+        """
+        訂閱候選標的的五檔 (例如選擇權更換對話框),之後由 self.order_book 讀取
+        傳入空列表即釋放
+        """
+        if not self.backend.connected:
+            return
+        self.subscriptions.set_callbacks(self.on_quote_update, self.on_order_update)
+        self.subscriptions.set_consumer(consumer, codes, quote_type='bidask')
+    
     def unsubscribe_quotes(self):
         """取消訂閱"""
         if not self.is_subscribed and not self.subscribed_contracts:
-            print("[提示] 目前沒有訂閱")
+            logger.info("目前沒有訂閱")
             self.positions_view.btn_subscribe.config(text="訂閱即時報價", bg="#FFD700")
             return
         
         try:
-            if self.subscribed_contracts:
-                self.backend.subscription.unsubscribe(self.subscribed_contracts)
+            if self.remote:
+                self.backend.stop_subscribing()
+            self.subscriptions.release_consumer('positions', flush=False)
+            self.subscriptions.purge()
         except Exception as e:
-            print(f"取消訂閱錯誤: {e}")
+            logger.warning(f"取消訂閱錯誤: {e}")
         finally:
             self.is_subscribed = False
             self.subscribed_contracts = []
+            self.journal.record('subscriptions', codes=[])
             self.positions_view.btn_subscribe.config(text="訂閱即時報價", bg="#FFD700")
-            print("[狀態] 訂閱已完全取消")
+            logger.info("訂閱已完全取消")
     
     def check_subscription_status(self):
         """檢查訂閱狀態"""
-        from datetime import datetime
-        
         info = []
         info.append(f"GUI 訂閱狀態: {'已訂閱' if self.is_subscribed else '未訂閱'}")
         info.append(f"已訂閱合約數: {len(self.subscribed_contracts)}")
         
         if self.subscribed_contracts:
             info.append(f"合約列表: {', '.join(self.subscribed_contracts[:5])}")
+        if self.watchdog.stale:
+            info.append(f"報價停滯: {', '.join(sorted(self.watchdog.stale)[:5])}")
         
         now = datetime.now()
         info.append(f"\n當前時間: {now.strftime('%H:%M:%S')}")
         
-        hour = now.hour
-        minute = now.minute
-        
-        if (hour == 8 and minute >= 45) or (9 <= hour < 13) or (hour == 13 and minute <= 45):
-            session = "日盤交易時段"
-        elif (hour == 15) or (16 <= hour <= 23) or (0 <= hour < 5):
-            session = "夜盤交易時段"
-        else:
-            session = "休市時段"
-        
-        info.append(f"交易時段: {session}")
+        info.append(f"交易時段: {self.session_clock.describe(now)}")
         
-        if session == "休市時段":
+        if not self.session_clock.is_open(now):
             info.append("\n⚠️ 目前是休市時段,不會有報價更新!")
             info.append("日盤: 08:45-13:45")
             info.append("夜盤: 15:00-05:00")
         
         messagebox.showinfo("訂閱狀態", "\n".join(info))
     
+    # ===== 交易時段排程 =====
+    def _schedule(self, name, delay_ms, func):
+        """以名稱管理的 root.after,重複排程時取消前一個"""
+        job = self._timers.pop(name, None)
+        if job is not None:
+            self.root.after_cancel(job)
+        self._timers[name] = self.root.after(delay_ms, func)
+    
+    def _cancel_timers(self, *names):
+        for name in names:
+            job = self._timers.pop(name, None)
+            if job is not None:
+                self.root.after_cancel(job)
+    
+    def check_session(self):
+        """依交易時段切換: 開盤前預熱、開盤重新訂閱、收盤暫停"""
+        now = datetime.now()
+        session, end = self.session_clock.current_session(now)
+        next_name, next_start = self.session_clock.next_open(now)
+        until_open = (next_start - now).total_seconds() if next_start else None
+        
+        # 開盤前 OPEN_LEAD_SECONDS 即視為開盤
+        if session is None and until_open is not None and until_open <= OPEN_LEAD_SECONDS:
+            session = next_name
+        
+        if session != self.session:
+            previous, self.session = self.session, session
+            if session is None:
+                self.on_session_close(previous)
+            else:
+                self.on_session_open(session)
+        
+        # 下一次檢查對準最近的時間點 (預熱/開盤/收盤)
+        events = [SESSION_CHECK_MS / 1000]
+        if until_open is not None:
+            if until_open <= PREWARM_SECONDS and self._prewarmed_for != next_start:
+                self._prewarmed_for = next_start
+                self.prewarm_session()
+            events += [t for t in (until_open - PREWARM_SECONDS, until_open - OPEN_LEAD_SECONDS) if t > 0]
+        if end is not None:
+            events.append((end - now).total_seconds())
+        delay = max(int(min(events) * 1000), 200)
+        
+        self.lbl_session.config(
+            text=self.session_clock.describe(now),
+            fg="green" if self.session else "gray"
+        )
+        self._schedule('session', delay, self.check_session)
+    
+    def prewarm_session(self):
+        """開盤前於背景執行緒預載合約與倉位快照"""
+        if not self.backend.connected or self.remote:
+            return
+        codes = list(self.positions_index)
+        
+        def _prewarm():
+            try:
+                self.contract_cache.load_or_build()
+                for code in codes:
+                    self.contract_cache.get_contract(code)
+                self.snapshots.get_snapshots(codes, max_age=0)
+                logger.info(f"開盤前預熱完成: {len(codes)} 檔")
+            except Exception as e:
+                logger.warning(f"開盤前預熱失敗: {e}")
+        
+        threading.Thread(target=_prewarm, daemon=True).start()
+    
+    def on_session_open(self, session):
+        """開盤: 重新訂閱並恢復監測與計時器"""
+        logger.info(f"{session}開盤")
+        if self.timeseries is not None:
+            self._schedule('timeseries', 100, self.sample_timeseries)
+        if self.exporter is not None:
+            self._schedule('export', EXPORT_MS, self.export_snapshot)
+        if not self.backend.connected:
+            return
+        
+        if self.is_subscribed:
+            codes = list(self.positions_index)
+            if self.remote:
+                self.backend.start_subscribing(codes)
+            else:
+                self.subscriptions.set_callbacks(self.on_quote_update, self.on_order_update)
+                self.subscriptions.set_consumer('positions', codes)
+            self.subscribed_contracts = codes.copy()
+        
+        if not self.remote:
+            self._schedule('reconcile', 30000, self.check_reconcile)
+            if any(m['active'] for m in self.spread_monitors):
+                self._schedule('monitors', 1000, self.check_spread_monitors)
+        self.request_reconcile(delay_ms=5000)
+    
+    def on_session_close(self, session):
+        """收盤: 取消報價訂閱 (保留訂閱意圖),暫停監測與計時器"""
+        logger.info(f"{session or '交易時段'}收盤,暫停報價與監測")
+        self._cancel_timers('reconcile', 'monitors', 'timeseries', 'export')
+        if not self.backend.connected or not self.is_subscribed:
+            return
+        try:
+            if self.remote:
+                self.backend.stop_subscribing()
+            else:
+                self.subscriptions.release_consumer('positions', flush=False)
+                self.subscriptions.purge()
+        except Exception as e:
+            logger.warning(f"收盤取消訂閱失敗: {e}")
+    
+    def get_underlying_price(self):
+        """取得標的價格,backend 取不到時改用近月台指期快照"""
+        price = self.backend.get_underlying_price()
+        if price and price > 0:
+            return price
+        
+        code = self.contract_cache.near_month('TXF')
+        if code:
+            return self.snapshots.get_price(code)
+        return price
+    
     # ===== 報價更新回調 =====
     def on_quote_update(self, exchange, tick):
         """處理報價更新"""
-        self.positions_view.handle_quote_update(exchange, tick)
+        # 收盤後取消訂閱前仍可能收到零星報價,不再更新倉位與監測
+        if self.session is None:
+            return
+        code = getattr(tick, 'code', '')
+        if isinstance(getattr(tick, 'bid_price', None), (list, tuple)):
+            self.order_book.on_bidask(exchange, tick)
+            self.spread_book.on_bidask(exchange, tick)
+            self.watchdog.on_tick(code, 'bidask')
+        else:
+            self.watchdog.on_tick(code, 'tick')
+            if self.exporter is not None:
+                self.exporter.record_tick(code, tick)
+        self.bus.publish(TICK, code, tick)
     
     def on_order_update(self, stat, msg):
-        """處理委託更新"""
-        print(f"委託更新: {stat}, {msg}")
+        """處理委託更新 (Shioaji 回調執行緒)"""
+        logger.info(f"委託更新: {stat}, {msg}")
+        if isinstance(msg, dict) and self.accounts.accounts:
+            msg = dict(msg, account=self.accounts.account_name(msg))
+        code = self.position_book.on_order_update(stat, msg)
+        if code:
+            self.bus.publish(FILL, code, msg)
+    
+    def request_reconcile(self, delay_ms=2000):
+        """延遲後以 get_positions 對帳 (多次呼叫只執行一次)"""
+        if self._reconcile_job is not None:
+            self.root.after_cancel(self._reconcile_job)
+        self._reconcile_job = self.root.after(delay_ms, self._run_reconcile)
+    
+    def _run_reconcile(self):
+        self._reconcile_job = None
+        if self.backend.connected:
+            self.positions_view.refresh_positions()
+    
+    def check_reconcile(self):
+        """定期檢查是否需要對帳"""
+        if not self.backend.connected or self.session is None:
+            return
+        if self.position_book.needs_reconcile():
+            self.request_reconcile(delay_ms=0)
+        self._schedule('reconcile', 30000, self.check_reconcile)
+    
+    # ===== 風險監控 =====
+    def load_account_cash(self):
+        """從帳戶保證金資料取得現金 (權益數扣除目前未實現損益)"""
+        api = getattr(self.backend, 'api', None)
+        if api is None:
+            return
+        try:
+            # 多帳戶時使用各帳戶權益數合計 (刷新倉位時已同時查詢)
+            equity = self.accounts.total_equity() if self.accounts.multi else None
+            if equity is None:
+                equity = float(api.margin(api.futopt_account).equity)
+            self.pretrade.set_equity(equity)
+            self.update_risk_display(self.risk_engine.set_cash(equity - self.risk_engine.total_pnl))
+        except Exception as e:
+            logger.warning(f"取得帳戶權益數失敗: {e}")
+    
+    def update_risk_display(self, status):
+        """更新風險指標顯示"""
+        if status is None:
+            return
+        colors = {'正常': 'black', '警告': 'orange', '危險': 'red', '追繳': 'red'}
+        ratio = status['ratio']
+        text = f"{status['tier']} 權益 {status['equity']:,.0f} / 維持 {status['maintenance']:,.0f}"
+        if ratio != float('inf'):
+            text += f" ({ratio:.0%})"
+        if status['move_to_call'] is not None:
+            text += f" 距追繳 {status['move_to_call']:+,.0f} 點"
+        self.lbl_risk.config(text=text, fg=colors.get(status['tier'], 'black'))
+    
+    def on_risk_alert(self, tier, status):
+        """風險等級改變 (Tk 執行緒)"""
+        self.update_risk_display(status)
+        if tier in ('危險', '追繳'):
+            msg = f"風險等級: {tier}\n\n"
+            msg += f"權益數: {status['equity']:,.0f}\n"
+            msg += f"維持保證金: {status['maintenance']:,.0f}\n"
+            msg += f"原始保證金: {status['original']:,.0f}"
+            if status['move_to_call'] is not None:
+                msg += f"\n\n標的再變動 {status['move_to_call']:+,.0f} 點將跌破維持保證金"
+            messagebox.showwarning("保證金警示", msg)
+    
+    def pretrade_check(self, orders, interactive=True):
+        """
+        下單前風控檢查
+
+        Args:
+            orders: dict 列表 (code, action 'Buy'/'Sell', quantity, price 可省略)
+            interactive: 有警告時是否詢問使用者 (自動下單時只記錄)
+
+        Returns:
+            bool: 是否可以送出
+        """
+        # 委託送到預設帳戶,與該帳戶的部位一起計算
+        account = self.accounts.default_name()
+        result = self.pretrade.check([dict(o, account=o.get('account', account)) for o in orders])
+        text = "\n".join(result['messages'])
+        if result['level'] == REJECT:
+            logger.warning(f"下單前檢查拒絕: {text}", extra={'rate_key': 'pretrade.reject'})
+            if interactive:
+                messagebox.showerror("風控拒絕", f"委託超過風控限制:\n\n{text}")
+            return False
+        if result['level'] == WARN:
+            logger.warning(f"下單前檢查警告: {text}", extra={'rate_key': 'pretrade.warn'})
+            if interactive:
+                return messagebox.askyesno("風控警告", f"{text}\n\n仍要送出委託?")
+        return True
+    
+    def _roll_orders(self, code, qty, is_sell):
+        """轉倉的兩筆委託: 平近月、建下一個月"""
+        orders = [{'code': code, 'action': 'Buy' if is_sell else 'Sell', 'quantity': qty}]
+        next_code = self.contract_cache.next_month(code)
+        if next_code:
+            orders.append({'code': next_code, 'action': 'Sell' if is_sell else 'Buy', 'quantity': qty})
+        return orders
+    
+    # ===== 盤中走勢 =====
+    def _position_totals(self):
+        """總損益、淨 Delta、保證金"""
+        pnl = 0.0
+        delta = 0.0
+        margin = 0.0
+        for r in self.positions_data:
+            pnl += r.calc_pnl
+            delta += r.est_delta * r.quantity
+            margin += r.margin
+        if not self.remote:
+            margin = self.risk_engine.total_original
+        return pnl, delta, margin
+    
+    def sample_timeseries(self):
+        """每 100ms 記錄一次總損益、淨 Delta、保證金"""
+        if self.positions_data:
+            self.timeseries.record(self._position_totals())
+        self._schedule('timeseries', 100, self.sample_timeseries)
+    
+    def export_snapshot(self):
+        """每秒匯出一筆風險走勢,每分鐘附帶一次倉位快照 (寫檔在背景執行緒)"""
+        if self.positions_data:
+            pnl, delta, margin = self._position_totals()
+            self.exporter.record_risk(pnl, delta, margin, self.risk_engine.get_status())
+            if self._export_count % EXPORT_POSITIONS_EVERY == 0:
+                self.exporter.record_positions(self.positions_data)
+            self._export_count += 1
+        self._schedule('export', EXPORT_MS, self.export_snapshot)
+    
+    def open_chart(self):
+        if self.timeseries is None:
+            messagebox.showwarning("走勢圖", "需要安裝 numpy 才能記錄盤中走勢")
+            return
+        ChartWindow(self.root, self)
+    
+    # ===== 診斷 =====
+    def start_profiling(self, duration):
+        """取樣分析本行程所有執行緒 (引擎模式下引擎行程同時分析)"""
+        if self.profiler.running:
+            messagebox.showinfo("效能分析", "效能分析進行中")
+            return
+        self.profiler.start(
+            duration,
+            on_done=lambda report: self.root.after(0, self.show_profile_report, "GUI 行程", report)
+        )
+        if self.remote:
+            try:
+                self.backend.start_profiling(duration)
+                self._schedule_engine_profile(duration * 1000 + 1000)
+            except Exception as e:
+                logger.warning(f"引擎效能分析啟動失敗: {e}")
+    
+    def stop_profiling(self):
+        self.profiler.stop()
+        if self.remote and self._profile_job is not None:
+            self.backend.stop_profiling()
+            self._schedule_engine_profile(1000)
+    
+    def _schedule_engine_profile(self, delay_ms):
+        if self._profile_job is not None:
+            self.root.after_cancel(self._profile_job)
+        self._profile_job = self.root.after(delay_ms, self._fetch_engine_profile)
+    
+    def _fetch_engine_profile(self):
+        self._profile_job = None
+        try:
+            report = self.backend.profile_report()
+        except Exception as e:
+            logger.warning(f"取得引擎效能報告失敗: {e}")
+            return
+        if report is None:
+            self._schedule_engine_profile(1000)
+            return
+        self.show_profile_report("引擎行程", report)
+    
+    def show_profile_report(self, title, report):
+        top = tk.Toplevel(self.root)
+        top.title(f"效能分析 - {title}")
+        top.geometry("800x600")
+        scroll = tk.Scrollbar(top)
+        scroll.pack(side='right', fill='y')
+        text = tk.Text(top, font=("Courier New", 10), yscrollcommand=scroll.set)
+        text.pack(fill='both', expand=True)
+        scroll.config(command=text.yview)
+        text.insert('1.0', report)
+        text.config(state='disabled')
     
     # ===== 計算建議 =====
     def on_calculate(self):
@@ -291,6 +859,8 @@ class TradingApp:
         try:
             curr = self.positions_view.update_delta_display()
             target = float(self.entry_target.get())
+            if self.restored_state.get('target_delta') != self.entry_target.get():
+                self.journal.record('target_delta', value=self.entry_target.get())
             suggestion = self.backend.calculate_suggestion(curr, target)
             self.txt_result.delete("1.0", tk.END)
             self.txt_result.insert(tk.END, suggestion)
@@ -307,10 +877,22 @@ class TradingApp:
             'target_spread': target_spread,
             'is_逆價差': is_逆價差,
             'auto_execute': auto_execute,
-            'active': True
+            'active': True,
+            'id': uuid.uuid4().hex[:8]
         }
         
         self.spread_monitors.append(monitor)
+        self.journal.record(
+            'monitor_created',
+            id=monitor['id'],
+            monitor=dict(monitor, direction=str(direction))
+        )
+        self.bus.publish(MONITOR, code, {'event': 'created', 'monitor': monitor})
+        if self.remote:
+            # 引擎模式由引擎行程負責定期檢查
+            self.backend.start_spread_monitoring(
+                code, qty, direction, target_spread, is_逆價差, auto_execute, monitor_id=monitor['id']
+            )
         
         spread_type = "逆價差" if is_逆價差 else "正價差"
         auto_text = "自動下單" if auto_execute else "需確認"
@@ -319,7 +901,7 @@ class TradingApp:
         msg += f"類型: {spread_type}\n"
         msg += f"目標: {target_spread:.0f} 點\n"
         msg += f"模式: {auto_text}\n\n"
-        msg += f"系統將每30秒檢查一次價差"
+        msg += f"兩腳有五檔報價時逐筆以可成交價差檢查,否則每30秒檢查一次"
         
         messagebox.showinfo("監測已啟動", msg)
         
@@ -327,26 +909,82 @@ class TradingApp:
         MonitorWindow(self.root, self)
         
         # 開始檢查
-        self.check_spread_monitors()
+        if not self.remote:
+            self.check_spread_monitors()
     
-    def check_spread_monitors(self):
-        """定期檢查價差監測任務"""
-        if not hasattr(self, 'spread_monitors'):
+    def watch_spreads(self):
+        """依進行中的價差監測維護價差簿,並訂閱兩腳的五檔"""
+        if self.remote or not self.backend.connected:
             return
+        nears = sorted({m['code'] for m in self.spread_monitors if m['active']})
+        self.watch_depth('spreads', self.spread_book.set_pairs(nears))
+    
+    def on_spread_update(self, topic, code, quote):
+        """價差簿變動 (Tk 執行緒,已合併): 只檢查這個組合的監測"""
+        if any(m['active'] and m['code'] == code for m in self.spread_monitors):
+            self.check_spread_monitors(codes={code})
+    
+    def check_spread_monitors(self, codes=None):
+        """
+        檢查價差監測任務
+        
+        Args:
+            codes: 只檢查這些近月代碼 (價差簿變動時);None 為定期全部檢查
+        """
+        if not hasattr(self, 'spread_monitors') or self.session is None:
+            return
+        if self._checking_monitors:
+            # 觸發的對話框尚未關閉,定期檢查稍後再執行
+            if codes is None:
+                self._schedule('monitors', 1000, self.check_spread_monitors)
+            return
+        
+        self._checking_monitors = True
+        try:
+            self._check_spread_monitors(codes)
+        finally:
+            self._checking_monitors = False
+        
+        # 如果還有活躍監測,繼續檢查
+        if codes is None and any(m['active'] for m in self.spread_monitors):
+            self._schedule('monitors', 30000, self.check_spread_monitors)
+    
+    def _check_spread_monitors(self, codes):
+        if codes is None:
+            self.watch_spreads()
         
         for monitor in self.spread_monitors[:]:
+            if codes is not None and monitor['code'] not in codes:
+                continue
             if not monitor['active']:
+                if monitor.get('id') in self.journal.state['monitors']:
+                    self.journal.record('monitor_cancelled', id=monitor['id'])
+                    self.bus.publish(MONITOR, monitor['code'], {'event': 'cancelled', 'monitor': monitor})
                 continue
             
             is_sell = 'Sell' in str(monitor['direction'])
-            should_roll, msg, spread = self.backend.check_and_roll_if_spread_met(
+            # 優先以價差簿的可成交價差判斷,沒有新鮮五檔時才向 backend 查詢
+            result = self.spread_book.check(
                 monitor['code'],
-                monitor['qty'],
-                monitor['direction'],
                 monitor['target_spread'],
                 monitor['is_逆價差'],
-                is_sell_position=is_sell
+                is_sell
             )
+            if result is None:
+                if codes is not None:
+                    continue
+                result = self.backend.check_and_roll_if_spread_met(
+                    monitor['code'],
+                    monitor['qty'],
+                    monitor['direction'],
+                    monitor['target_spread'],
+                    monitor['is_逆價差'],
+                    is_sell_position=is_sell
+                )
+            should_roll, msg, spread = result
+            self.bus.publish(MONITOR, monitor['code'], {
+                'event': 'checked', 'monitor': monitor, 'spread': spread, 'message': msg
+            })
             
             if should_roll:
                 auto_exec = monitor.get('auto_execute', False)
@@ -354,7 +992,18 @@ class TradingApp:
                 if auto_exec:
                     # 自動執行
                     result_msg = f"價差監測觸發!\n\n{msg}\n\n自動執行轉倉..."
-                    print(result_msg)
+                    logger.info(result_msg)
+                    
+                    if not self.pretrade_check(
+                        self._roll_orders(monitor['code'], monitor['qty'], is_sell), interactive=False
+                    ):
+                        # 風控拒絕時不跳出視窗也不移除監測,風險降低後價差仍符合時再轉倉
+                        logger.warning(f"{monitor['code']} 自動轉倉未通過下單前風控,監測保留",
+                                       extra={'rate_key': f"monitor.pretrade.{monitor['code']}"})
+                        self.bus.publish(MONITOR, monitor['code'], {
+                            'event': 'rejected', 'monitor': monitor, 'spread': spread, 'message': msg
+                        })
+                        continue
                     
                     success, roll_msg = self.backend.roll_futures(
                         monitor['code'],
@@ -365,29 +1014,39 @@ class TradingApp:
                     
                     if success:
                         messagebox.showinfo("自動轉倉成功", roll_msg)
-                        self.positions_view.refresh_positions()
+                        self.request_reconcile()
                     else:
                         messagebox.showerror("自動轉倉失敗", roll_msg)
                 else:
                     # 需要確認
-                    result_msg = f"價差監測觸發!\n\n{msg}\n\n即將執行轉倉..."
-                    if messagebox.askyesno("確認轉倉", result_msg):
-                        success, roll_msg = self.backend.roll_futures(
-                            monitor['code'],
-                            monitor['qty'],
-                            monitor['direction'],
-                            is_sell_position=is_sell
-                        )
-                        
-                        if success:
-                            messagebox.showinfo("轉倉成功", roll_msg)
-                            self.positions_view.refresh_positions()
-                        else:
-                            messagebox.showerror("轉倉失敗", roll_msg)
+                    self._confirm_roll(monitor, msg)
                 
-                # 移除已觸發的監測
-                self.spread_monitors.remove(monitor)
-        
-        # 如果還有活躍監測,繼續檢查
-        if any(m['active'] for m in self.spread_monitors):
-            self.root.after(30000, self.check_spread_monitors)
\ No newline at end of file
+                self._finish_monitor(monitor)
+    
+    def _confirm_roll(self, monitor, msg):
+        """價差監測觸發後詢問使用者,通過下單前風控才轉倉"""
+        is_sell = 'Sell' in str(monitor['direction'])
+        result_msg = f"價差監測觸發!\n\n{msg}\n\n即將執行轉倉..."
+        if messagebox.askyesno("確認轉倉", result_msg) and self.pretrade_check(
+            self._roll_orders(monitor['code'], monitor['qty'], is_sell)
+        ):
+            success, roll_msg = self.backend.roll_futures(
+                monitor['code'],
+                monitor['qty'],
+                monitor['direction'],
+                is_sell_position=is_sell
+            )
+            
+            if success:
+                messagebox.showinfo("轉倉成功", roll_msg)
+                self.request_reconcile()
+            else:
+                messagebox.showerror("轉倉失敗", roll_msg)
+    
+    def _finish_monitor(self, monitor):
+        """移除已觸發的監測並寫入日誌"""
+        if monitor in self.spread_monitors:
+            self.spread_monitors.remove(monitor)
+        if monitor.get('id'):
+            self.journal.record('monitor_triggered', id=monitor['id'])
+        self.bus.publish(MONITOR, monitor['code'], {'event': 'triggered', 'monitor': monitor})
\ No newline at end of file
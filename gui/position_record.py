@@ -0,0 +1,103 @@
+# gui/position_record.py
+"""
+倉位紀錄模組
+負責將 backend.get_positions() 的 dict 在刷新時一次轉成固定欄位的紀錄,
+數值欄位先轉好型別並快取乘數,報價更新與 Delta 加總時直接讀屬性
+"""
+
+
+class PositionRecord:
+    """
+    倉位表格的一列
+
+    仍可用舊的 {'data': dict, 'selected', 'id'} 方式存取 (record['data']['code']),
+    給尚未改寫的對話框模組使用
+    """
+    __slots__ = ('code', 'account', 'direction', 'is_buy', 'dir_str', 'quantity', 'price', 'last_price',
+                 'calc_pnl', 'est_delta', 'margin', 'days_left', 'multiplier', 'selected', 'id')
+
+    _FIELDS = ('code', 'account', 'direction', 'dir_str', 'quantity', 'price', 'last_price',
+               'calc_pnl', 'est_delta', 'margin', 'days_left')
+
+    def __init__(self, p, multiplier=1.0, selected=True):
+        self.code = p.get('code', '')
+        self.account = p.get('account', '')
+        self.direction = p.get('direction', '')
+        self.is_buy = 'Buy' in str(self.direction)
+        self.dir_str = p.get('dir_str') or ('買' if self.is_buy else '賣')
+        self.quantity = float(p.get('quantity', 0) or 0)
+        self.price = float(p.get('price', 0) or 0)
+        self.last_price = float(p.get('last_price', 0) or 0)
+        self.calc_pnl = int(p.get('calc_pnl', 0) or 0)
+        self.est_delta = float(p.get('est_delta', 0) or 0)
+        self.margin = int(p.get('margin', 0) or 0)
+        self.days_left = int(p.get('days_left', 0) or 0)
+        self.multiplier = float(multiplier)
+        self.selected = selected
+        self.id = ''
+
+    @property
+    def key(self):
+        """勾選狀態的鍵 (多帳戶時加上帳戶名稱)"""
+        return f"{self.account}|{self.code}" if self.account else self.code
+
+    @property
+    def net_delta(self):
+        return self.est_delta * self.quantity
+
+    def update_price(self, close):
+        """以最新價重算損益,回傳損益"""
+        self.last_price = close
+        diff = (close - self.price) if self.is_buy else (self.price - close)
+        self.calc_pnl = int(diff * self.quantity * self.multiplier)
+        return self.calc_pnl
+
+    def set_position(self, quantity, price):
+        """成交後更新口數與成本,有現價時重算損益"""
+        self.quantity = float(quantity)
+        self.price = round(float(price), 2)
+        if self.last_price > 0:
+            self.update_price(self.last_price)
+        return self.calc_pnl
+
+    def update(self, p):
+        """以 dict 更新欄位 (引擎共享記憶體的資料)"""
+        for key in self._FIELDS:
+            if key in p:
+                self[key] = p[key]
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self._FIELDS}
+
+    # ===== 相容舊的 dict 存取 =====
+    def __getitem__(self, key):
+        if key == 'data':
+            return self
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key in ('quantity', 'price', 'last_price', 'est_delta', 'multiplier'):
+            value = float(value or 0)
+        elif key in ('calc_pnl', 'margin', 'days_left'):
+            value = int(value or 0)
+        elif key == 'direction':
+            self.is_buy = 'Buy' in str(value)
+        try:
+            setattr(self, key, value)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return key == 'data' or key in self.__slots__
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return f"PositionRecord({self.code} {self.dir_str} {self.quantity:g} @ {self.price:g})"
@@ -3,14 +3,33 @@
 倉位表格模組
 負責顯示倉位、右鍵選單、雙擊切換、報價更新
 """
+import logging
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox
+from my_utils.event_bus import TICK, FILL, POSITION
+from my_utils.helpers import tick_price
+from .position_record import PositionRecord
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_POLL_MS = 100  # 多帳戶查詢進行中時輪詢結果的間隔
 
 class PositionsView:
     def __init__(self, root, app):
         self.root = root
         self.app = app  # 主視窗的參考
+        self._accounts_job = None
+        # 組合保證金配對在背景執行緒計算,只顯示最新一次的結果
+        self._margin_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='portfolio-margin')
+        self._margin_seq = 0
         self.setup_ui()
+        
+        # 報價合併後在 Tk 執行緒更新,成交回報逐筆處理
+        self.app.bus.subscribe(TICK, lambda topic, code, tick: self.handle_quote_update(None, tick),
+                               widget=self.tree, coalesce=True)
+        self.app.bus.subscribe(FILL, lambda topic, code, msg: self.apply_fill(code, msg.get('account', '')),
+                               widget=self.tree)
     
     def setup_ui(self):
         """建立倉位表格 UI"""
@@ -23,7 +42,7 @@ class PositionsView:
         
         # 建立表格
         cols = ("select", "code", "direction", "days", "quantity", "cost", 
-                "last_price", "pnl", "margin", "delta", "net_delta", "weight")
+                "last_price", "pnl", "margin", "delta", "net_delta", "weight", "account")
         self.tree = ttk.Treeview(frame_mid, columns=cols, show='headings')
         
         # 設定欄位標題
@@ -39,6 +58,7 @@ class PositionsView:
         self.tree.heading("delta", text="單位Δ")
         self.tree.heading("net_delta", text="淨Δ")
         self.tree.heading("weight", text="權重")
+        self.tree.heading("account", text="帳戶")
         
         # 設定欄位寬度
         self.tree.column("select", width=30, anchor='center')
@@ -53,6 +73,10 @@ class PositionsView:
         self.tree.column("delta", width=60, anchor='center')
         self.tree.column("net_delta", width=70, anchor='center')
         self.tree.column("weight", width=80, anchor='center')
+        self.tree.column("account", width=80, anchor='center')
+        # 單一帳戶時不顯示帳戶欄
+        if not self.app.accounts.multi:
+            self.tree.configure(displaycolumns=cols[:-1])
         
         self.tree.pack(fill='both', expand=True)
         
@@ -64,6 +88,8 @@ class PositionsView:
         self.tree.tag_configure('profit', foreground='red')
         self.tree.tag_configure('loss', foreground='green')
         self.tree.tag_configure('neutral', foreground='black')
+        self.tree.tag_configure('stale', background='#E8E8E8')
+        self.stale_codes = set()
         
         # 按鈕區
         btn_frame = tk.Frame(frame_mid)
@@ -89,20 +115,42 @@ class PositionsView:
         ).pack(side='left', padx=5)
     
     def refresh_positions(self):
-        """刷新倉位資料"""
+        """刷新倉位資料 (多帳戶時在背景查詢,完成後才更新表格)"""
         if not self.app.backend.connected:
             return
         
+        if not self.app.accounts.start():
+            self._load_positions(self.app.accounts.get_positions())
+        elif self._accounts_job is None:
+            self._poll_accounts()
+    
+    def _poll_accounts(self):
+        """以 root.after 輪詢多帳戶查詢結果,不阻塞 Tk 執行緒"""
+        self._accounts_job = None
+        if not self.app.backend.connected:
+            return
+        # 等待期間重新登入 (reset) 時重新送出;帳戶都找不到時改用預設帳戶
+        if not self.app.accounts.start():
+            self._load_positions(self.app.accounts.get_positions())
+            return
+        raw_data = self.app.accounts.poll()
+        if raw_data is None:
+            self._accounts_job = self.root.after(ACCOUNT_POLL_MS, self._poll_accounts)
+            return
+        self._load_positions(raw_data)
+    
+    def _load_positions(self, raw_data):
+        """以查詢結果重建表格;倉位簿、風險與風控以 (帳戶, 代碼) 分開記錄,不跨帳戶合併"""
         # 清空表格
         for row in self.tree.get_children():
             self.tree.delete(row)
         
-        # 取得倉位資料
-        raw_data = self.app.backend.get_positions()
         self.app.positions_data = []
+        self.app.positions_index = {}
+        self.app.position_book.load(raw_data)
         
-        underlying_price = self.app.backend.get_underlying_price()
-        print(f"[GUI] 標的價格: {underlying_price}")
+        underlying_price = self.app.get_underlying_price()
+        logger.debug(f"標的價格: {underlying_price}")
         
         # 計算總 Delta
         total_net_delta = sum(p['est_delta'] * float(p['quantity']) for p in raw_data)
@@ -125,18 +173,21 @@ class PositionsView:
             code = p.get('code', '')
             last_price = p.get('last_price', 0)
             
-            print(f"[GUI] 計算 {code} 保證金: qty={qty}, last_price={last_price}, underlying={underlying_price}")
+            logger.debug(f"計算 {code} 保證金: qty={qty}, last_price={last_price}, underlying={underlying_price}")
             
-            # 計算保證金
-            margin = self.app.margin_fetcher.calculate_margin(
-                code,
-                int(qty),
-                last_price=last_price,
-                underlying_price=underlying_price
-            )
+            # 計算保證金 (引擎模式已由引擎計算)
+            if 'margin' in p:
+                margin = int(p['margin'])
+            else:
+                margin = self.app.margin_fetcher.calculate_margin(
+                    code,
+                    int(qty),
+                    last_price=last_price,
+                    underlying_price=underlying_price
+                )
             total_margin_val += margin
             
-            print(f"[GUI] {code} 保證金結果: {margin}")
+            logger.debug(f"{code} 保證金結果: {margin}")
             
             net_delta = delta * qty
             
@@ -146,7 +197,11 @@ class PositionsView:
                 weight_pct = (net_delta / total_net_delta) * 100
                 weight_str = f"{weight_pct:+.1f}%"
             
-            days_val = p.get('days_left', 0)
+            # 剩餘交易日 (已排除假日),日曆查不到時沿用 backend 的天數
+            if self.app.settlement.expiry(code):
+                days_val = p['days_left'] = self.app.settlement.trading_days_left(code)
+            else:
+                days_val = p.get('days_left', 0)
             days_str = str(days_val) if days_val > 0 else "-"
             
             # 決定顏色標籤
@@ -156,11 +211,13 @@ class PositionsView:
             elif pnl < 0:
                 tag = 'loss'
             
-            # 建立項目
-            item_entry = {'data': p, 'selected': True}
+            # 建立項目 (勾選狀態沿用上次記錄),數值欄位在這裡一次轉好
+            record = PositionRecord(p, multiplier=self._multiplier(code))
+            record.selected = self.app.journal.state['selected'].get(record.key, True)
+            record.margin = int(margin)
             
             row_id = self.tree.insert("", "end", values=(
-                "X",
+                "X" if record.selected else "",
                 code,
                 p['dir_str'],
                 days_str,
@@ -171,11 +228,13 @@ class PositionsView:
                 f"{margin:,}",
                 f"{delta:.2f}",
                 f"{net_delta:+.2f}",
-                weight_str
-            ), tags=(tag,))
+                weight_str,
+                record.account
+            ), tags=self._row_tags(code, tag))
             
-            item_entry['id'] = row_id
-            self.app.positions_data.append(item_entry)
+            record.id = row_id
+            self.app.positions_data.append(record)
+            self.app.positions_index.setdefault(code, []).append(record)
         
         # 更新總計顯示
         self.app.lbl_total_pnl.config(
@@ -184,6 +243,7 @@ class PositionsView:
         )
         
         self.app.lbl_total_margin.config(text=f"{total_margin_val:,}", fg="blue")
+        self.update_portfolio_margin(raw_data, underlying_price)
         
         self.app.lbl_long_delta.config(text=f"{long_delta:+.2f}")
         self.app.lbl_short_delta.config(text=f"{short_delta:+.2f}")
@@ -202,12 +262,21 @@ class PositionsView:
         self.app.lbl_net_direction.config(text=direction_text, fg=direction_color)
         
         self.update_delta_display()
+        self.update_account_totals()
+        self.app.update_risk_display(self.app.risk_engine.load(raw_data, underlying_price))
+        self.app.pretrade.load(raw_data, underlying_price)
+        self.app.update_position_subscriptions()
+        for record in self.app.positions_data:
+            self.app.bus.publish(POSITION, record.code, record)
+        if self.app.exporter is not None:
+            self.app.exporter.record_positions(self.app.positions_data)
     
     def clear_all(self):
         """清空表格"""
         for row in self.tree.get_children():
             self.tree.delete(row)
         self.app.positions_data = []
+        self.app.positions_index = {}
     
     def on_double_click(self, event):
         """雙擊切換選取"""
@@ -215,10 +284,11 @@ class PositionsView:
         if not item_id:
             return
         
-        target = next((x for x in self.app.positions_data if x['id'] == item_id), None)
+        target = next((x for x in self.app.positions_data if x.id == item_id), None)
         if target:
-            target['selected'] = not target['selected']
-            new_symbol = "X" if target['selected'] else ""
+            target.selected = not target.selected
+            self.app.journal.record('selection', code=target.key, selected=target.selected)
+            new_symbol = "X" if target.selected else ""
             vals = self.tree.item(item_id, "values")
             self.tree.item(item_id, values=(new_symbol, *vals[1:]))
             self.update_delta_display()
@@ -230,120 +300,211 @@ class PositionsView:
     
     def update_delta_display(self):
         """更新 Delta 顯示"""
-        total = 0.0
-        for item in self.app.positions_data:
-            if item['selected']:
-                qty = float(item['data'].get('quantity', 0))
-                delta = float(item['data'].get('est_delta', 0))
-                total += (qty * delta)
+        total = sum(r.est_delta * r.quantity for r in self.app.positions_data if r.selected)
         self.app.lbl_current_delta.config(text=f"{total:.2f}")
         return total
     
+    def _row_tags(self, code, tag):
+        return (tag, 'stale') if code in self.stale_codes else (tag,)
+    
+    def mark_stale(self, codes):
+        """標示報價停滯的列 (看門狗回報後由 Tk 執行緒呼叫)"""
+        self.stale_codes = set(codes)
+        for record in self.app.positions_data:
+            tags = [t for t in self.tree.item(record.id, 'tags') if t != 'stale']
+            if record.code in self.stale_codes:
+                tags.append('stale')
+            self.tree.item(record.id, tags=tags)
+
+    def update_account_totals(self):
+        """多帳戶時顯示各帳戶的損益、保證金、淨 Delta 與權益數"""
+        if not self.app.accounts.multi:
+            return
+        parts = []
+        for name, t in self.app.accounts.summary(self.app.positions_data).items():
+            text = f"{name}: 損益 {t['pnl']:,} 保證金 {t['margin']:,} Δ {t['delta']:+.2f}"
+            if t['equity']:
+                text += f" 權益 {t['equity']:,.0f}"
+            if t['stale']:
+                text += f" ({t['error'] or '舊資料'})"
+            parts.append(text)
+        self.app.lbl_accounts.config(text="  |  ".join(parts))
+
+    def _multiplier(self, code):
+        multiplier = self.app.contract_cache.get_multiplier(code, default=None)
+        if multiplier is None:
+            contracts = getattr(self.app.backend, 'contracts', None)
+            multiplier = contracts.get_multiplier(code) if contracts is not None else 1
+        return multiplier
+
+    def update_portfolio_margin(self, positions, underlying_price):
+        """
+        更新組合保證金 (價差/跨式等組合折抵後,各帳戶分別計算)
+        配對在背景執行緒計算,完成後以 root.after 回到 Tk 執行緒更新;較舊的結果直接捨棄
+        """
+        self._margin_seq += 1
+        seq = self._margin_seq
+        rows = [dict(p) for p in positions]
+        future = self._margin_pool.submit(self._compute_portfolio_margin, rows, underlying_price)
+        future.add_done_callback(lambda f: self.root.after(0, self._show_portfolio_margin, seq, f))
+        return future
+
+    def _compute_portfolio_margin(self, positions, underlying_price):
+        """背景執行緒: 各帳戶分別配對"""
+        by_account = {}
+        for p in positions:
+            by_account.setdefault(p.get('account', ''), []).append(p)
+        results = {name: self.app.portfolio_margin.compute(rows, underlying_price)
+                   for name, rows in by_account.items()}
+        if len(results) == 1:
+            return next(iter(results.values()))
+        return {
+            'total': sum(r['total'] for r in results.values()),
+            'savings': sum(r['savings'] for r in results.values()),
+            'accounts': results,
+        }
+
+    def _show_portfolio_margin(self, seq, future):
+        if seq != self._margin_seq:
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.warning(f"組合保證金計算失敗: {e}")
+            self.app.lbl_portfolio_margin.config(text="-", fg="black")
+            return
+
+        total = int(result['total'])
+        savings = int(result['savings'])
+        text = f"{total:,}"
+        if savings > 0:
+            text += f" (省 {savings:,})"
+        self.app.lbl_portfolio_margin.config(text=text, fg="blue")
+        return result
+
     def handle_quote_update(self, exchange, tick):
         """處理報價更新"""
         try:
             code = tick.code if hasattr(tick, 'code') else str(tick.get('code', ''))
             
             # 取得最新價格
-            close = 0
-            
-            if hasattr(tick, 'close') and tick.close and tick.close > 0:
-                close = float(tick.close)
-            
-            elif hasattr(tick, 'bid_price') and hasattr(tick, 'ask_price'):
-                bid = float(tick.bid_price[0]) if tick.bid_price and len(tick.bid_price) > 0 and tick.bid_price[0] > 0 else 0
-                ask = float(tick.ask_price[0]) if tick.ask_price and len(tick.ask_price) > 0 and tick.ask_price[0] > 0 else 0
-                
-                if bid > 0 and ask > 0:
-                    close = (bid + ask) / 2
-                elif bid > 0:
-                    close = bid
-                elif ask > 0:
-                    close = ask
-            
-            elif hasattr(tick, 'buy_price') and hasattr(tick, 'sell_price'):
-                buy = float(tick.buy_price) if tick.buy_price and tick.buy_price > 0 else 0
-                sell = float(tick.sell_price) if tick.sell_price and tick.sell_price > 0 else 0
-                
-                if buy > 0 and sell > 0:
-                    close = (buy + sell) / 2
-                elif buy > 0:
-                    close = buy
-                elif sell > 0:
-                    close = sell
+            close = tick_price(tick)
             
             if close <= 0:
                 return
             
-            # 更新倉位資料
-            updated = False
+            # 更新倉位資料 (多帳戶時同一代碼可能有多列)
+            records = self.app.positions_index.get(code)
+            if not records:
+                return
             
-            for item in self.app.positions_data:
-                if item['data']['code'] == code:
-                    item['data']['last_price'] = close
-                    
-                    # 重新計算損益
-                    qty = float(item['data'].get('quantity', 0))
-                    cost = float(item['data'].get('price', 0))
-                    direction = item['data'].get('direction', '')
-                    multiplier = self.app.backend.contracts.get_multiplier(code)
-                    
-                    diff = (close - cost) if 'Buy' in str(direction) else (cost - close)
-                    pnl = int(diff * qty * multiplier)
-                    item['data']['calc_pnl'] = pnl
-                    
-                    # 重新計算保證金
-                    if code.startswith('TXO'):
-                        underlying_price = self.app.backend.get_underlying_price()
-                        margin = self.app.margin_fetcher.calculate_margin(
-                            code,
-                            int(qty),
-                            last_price=close,
-                            underlying_price=underlying_price
-                        )
-                    else:
-                        margin = self.app.margin_fetcher.calculate_margin(code, int(qty))
-                    
-                    # 更新表格顯示
-                    vals = list(self.tree.item(item['id'], 'values'))
-                    vals[6] = f"{close:.2f}"
-                    vals[7] = pnl
-                    vals[8] = f"{margin:,}"
-                    
-                    tag = 'neutral'
-                    if pnl > 0:
-                        tag = 'profit'
-                    elif pnl < 0:
-                        tag = 'loss'
-                    
-                    self.tree.item(item['id'], values=vals, tags=(tag,))
-                    updated = True
-                    break
+            underlying_price = None
+            if code.startswith('TXO'):
+                underlying_price = self.app.get_underlying_price()
             
-            if updated:
-                self.update_totals()
+            for record in records:
+                pnl = record.update_price(close)
+                
+                # 重新計算保證金
+                if code.startswith('TXO'):
+                    margin = self.app.margin_fetcher.calculate_margin(
+                        code,
+                        int(record.quantity),
+                        last_price=close,
+                        underlying_price=underlying_price
+                    )
+                else:
+                    margin = self.app.margin_fetcher.calculate_margin(code, int(record.quantity))
+                record.margin = int(margin)
+                
+                # 更新表格顯示
+                vals = list(self.tree.item(record.id, 'values'))
+                vals[6] = f"{close:.2f}"
+                vals[7] = pnl
+                vals[8] = f"{margin:,}"
+                
+                tag = 'neutral'
+                if pnl > 0:
+                    tag = 'profit'
+                elif pnl < 0:
+                    tag = 'loss'
+                
+                self.tree.item(record.id, values=vals, tags=self._row_tags(code, tag))
+            
+            self.update_totals()
+            self.app.update_risk_display(
+                self.app.risk_engine.on_price(code, close, underlying_price)
+            )
         
         except Exception as e:
-            print(f"[報價更新錯誤] {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"報價更新錯誤: {e}", extra={'rate_key': 'gui.handle_quote_update'})
     
-    def update_totals(self):
-        """更新總損益和總保證金"""
-        total_pnl = 0
-        total_margin = 0
+    def apply_fill(self, code, account=''):
+        """依倉位簿更新單一帳戶的單一代碼 (成交回報後由 Tk 執行緒呼叫)"""
+        book = self.app.position_book.get(code, account)
+        if book is not None:
+            self.app.pretrade.set_position(code, book['qty'], account)
+        records = [r for r in self.app.positions_index.get(code) or [] if r.account == account]
+        
+        # 新增或平光的代碼需要完整資料,交給對帳處理
+        if book is None or len(records) != 1 or book['qty'] == 0:
+            self.app.request_reconcile()
+            return
+        
+        record = records[0]        
+        if (book['qty'] > 0) != record.is_buy:
+            self.app.request_reconcile()
+            return
+        
+        pnl = record.set_position(abs(book['qty']), book['avg_cost'])
+        
+        vals = list(self.tree.item(record.id, 'values'))
+        vals[4] = int(record.quantity)
+        vals[5] = record.price
+        vals[7] = pnl
+        self.tree.item(record.id, values=vals)
+        
+        self.update_totals()
+        self.update_delta_display()
+        self.app.bus.publish(POSITION, code, record)
+    
+    def sync_from_engine(self, summary, positions):
+        """引擎模式: 依共享記憶體內容更新表格,代碼有增減時才重建"""
+        rows = {r.code: r for r in self.app.positions_data}
+        if set(rows) != {p['code'] for p in positions}:
+            self.refresh_positions()
+            return
         
-        for item in self.app.positions_data:
-            pnl = item['data'].get('calc_pnl', 0)
-            total_pnl += pnl
+        for p in positions:
+            record = rows[p['code']]
+            record.update(p)
+            vals = list(self.tree.item(record.id, 'values'))
+            vals[4] = int(p['quantity'])
+            vals[5] = p['price']
+            vals[6] = f"{p['last_price']:.2f}"
+            vals[7] = p['calc_pnl']
+            vals[8] = f"{int(p['margin']):,}"
             
-            vals = self.tree.item(item['id'], 'values')
-            margin_str = str(vals[8]).replace(',', '')
-            try:
-                margin = int(margin_str) if margin_str.isdigit() else 0
-                total_margin += margin
-            except:
-                pass
+            tag = 'neutral'
+            if p['calc_pnl'] > 0:
+                tag = 'profit'
+            elif p['calc_pnl'] < 0:
+                tag = 'loss'
+            self.tree.item(record.id, values=vals, tags=(tag,))
+        
+        total_pnl = int(summary.get('total_pnl', 0))
+        self.app.lbl_total_pnl.config(
+            text=f"{total_pnl:,}", 
+            fg="red" if total_pnl > 0 else "green" if total_pnl < 0 else "black"
+        )
+        self.app.lbl_total_margin.config(text=f"{int(summary.get('total_margin', 0)):,}", fg="blue")
+        self.update_delta_display()
+    
+    def update_totals(self):
+        """更新總損益和總保證金"""
+        total_pnl = sum(r.calc_pnl for r in self.app.positions_data)
+        total_margin = sum(r.margin for r in self.app.positions_data)
+        self.update_account_totals()
         
         self.app.lbl_total_pnl.config(
             text=f"{total_pnl:,}", 
@@ -1,15 +1,61 @@
 # main.py
 """
 Python 程式交易中控台 - 主程式入口
+
+用法:
+    python main.py              # 單一行程 (預設)
+    python main.py --engine     # 引擎在獨立行程,GUI 只讀取共享記憶體
+    python main.py --headless   # 只執行引擎,不開 GUI (伺服器用)
+    python main.py --headless --stream-port 8765
+                                # 同時在 localhost 提供倉位/風險串流
+    python main.py --sim --sim-speed 10
+                                # 改用本機模擬交易所 (不需網路與帳號),報價 10 倍速
 """
+import argparse
+import functools
 import tkinter as tk
 from gui import TradingApp
+from my_utils.logger import setup_logging, shutdown_logging
 
 def main():
     """主程式"""
+    parser = argparse.ArgumentParser(description="Python 程式交易中控台")
+    parser.add_argument('--engine', action='store_true', help="引擎在獨立行程執行")
+    parser.add_argument('--headless', action='store_true', help="只執行引擎,不開 GUI")
+    parser.add_argument('--stream-port', type=int, default=None, help="本機串流服務埠號")
+    parser.add_argument('--sim', action='store_true', help="使用本機模擬交易所")
+    parser.add_argument('--sim-speed', type=float, default=1.0, help="模擬報價頻率倍數")
+    args = parser.parse_args()
+    
+    setup_logging()
+    
+    backend_factory = None
+    if args.sim:
+        from backend import SimulatedBackend
+        backend_factory = functools.partial(SimulatedBackend, speed=args.sim_speed)
+    
+    if args.headless:
+        from backend import run_headless
+        from config import load_credentials
+        try:
+            run_headless(load_credentials(), backend_factory=backend_factory, stream_port=args.stream_port)
+        finally:
+            shutdown_logging()
+        return
+    
+    backend = None
+    if args.engine or args.stream_port is not None:
+        from backend import EngineClient
+        backend = EngineClient(backend_factory=backend_factory, stream_port=args.stream_port)
+    elif backend_factory is not None:
+        backend = backend_factory()
+    
     root = tk.Tk()
-    app = TradingApp(root)
-    root.mainloop()
+    app = TradingApp(root, backend=backend)
+    try:
+        root.mainloop()
+    finally:
+        shutdown_logging()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,153 @@
+# my_utils/event_bus.py
+"""
+事件匯流排模組
+負責在程式內以 主題 + 合約代碼 發佈/訂閱事件 (報價、成交、倉位變動、價差監測、跨月價差),
+Tk 視窗的訂閱者經由 root.after 在 Tk 執行緒收到事件,
+可選擇合併: 同一代碼在間隔內只送最新的一筆
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+TICK = 'tick'
+FILL = 'fill'
+POSITION = 'position'
+MONITOR = 'monitor'
+SPREAD = 'spread'
+
+
+class Subscription:
+    def __init__(self, bus, topic, callback, codes, widget, coalesce, interval_ms):
+        self.bus = bus
+        self.topic = topic
+        self.callback = callback
+        self.codes = set(codes) if codes is not None else None  # None 表示全部代碼
+        self.widget = widget
+        self.coalesce = coalesce
+        self.interval_ms = interval_ms
+        self.active = True
+
+        self._pending = {}  # code -> 最新 payload (合併模式)
+        self._scheduled = False
+
+    def set_codes(self, codes):
+        """更換要接收的代碼"""
+        self.bus._reindex(self, codes)
+
+    def unsubscribe(self):
+        self.bus.unsubscribe(self)
+
+    # ===== 投遞 =====
+    def _deliver(self, code, payload):
+        if not self.active:
+            return
+        if self.widget is None:
+            self._call(code, payload)
+            return
+
+        if not self.coalesce:
+            self._after(0, self._call, code, payload)
+            return
+
+        with self.bus._lock:
+            self._pending[code] = payload
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._after(self.interval_ms, self._flush)
+
+    def _after(self, delay_ms, func, *args):
+        try:
+            self.widget.after(delay_ms, func, *args)
+        except Exception:
+            # 視窗已關閉
+            self.bus.unsubscribe(self)
+
+    def _flush(self):
+        with self.bus._lock:
+            pending, self._pending = self._pending, {}
+            self._scheduled = False
+        for code, payload in pending.items():
+            self._call(code, payload)
+
+    def _call(self, code, payload):
+        if not self.active:
+            return
+        try:
+            self.callback(self.topic, code, payload)
+        except Exception as e:
+            logger.exception(f"事件處理錯誤 {self.topic} {code}: {e}",
+                             extra={'rate_key': f'bus.{self.topic}'})
+
+
+class EventBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_code = {}   # (topic, code) -> [Subscription]
+        self._wildcard = {}  # topic -> [Subscription]
+
+    def subscribe(self, topic, callback, codes=None, widget=None, coalesce=False, interval_ms=50):
+        """
+        訂閱事件
+
+        Args:
+            topic: TICK / FILL / POSITION / MONITOR / SPREAD
+            callback: callback(topic, code, payload)
+            codes: 只接收這些代碼,None 表示全部
+            widget: Tk 元件;有指定時經由 widget.after 在 Tk 執行緒呼叫,元件關閉時自動取消
+            coalesce: 合併模式,同一代碼在 interval_ms 內只送最新一筆
+            interval_ms: 合併間隔
+
+        Returns:
+            Subscription
+        """
+        sub = Subscription(self, topic, callback, codes, widget, coalesce, interval_ms)
+        with self._lock:
+            self._add(sub)
+
+        if widget is not None:
+            widget.bind('<Destroy>', lambda e: self.unsubscribe(sub) if e.widget is widget else None, add='+')
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if sub.active:
+                sub.active = False
+                self._remove(sub)
+
+    def publish(self, topic, code, payload=None):
+        """發佈事件 (任何執行緒)"""
+        with self._lock:
+            subs = self._by_code.get((topic, code), []) + self._wildcard.get(topic, [])
+        for sub in subs:
+            sub._deliver(code, payload)
+
+    # ===== 索引 =====
+    def _add(self, sub):
+        if sub.codes is None:
+            self._wildcard.setdefault(sub.topic, []).append(sub)
+        else:
+            for code in sub.codes:
+                self._by_code.setdefault((sub.topic, code), []).append(sub)
+
+    def _remove(self, sub):
+        if sub.codes is None:
+            subs = self._wildcard.get(sub.topic, [])
+            if sub in subs:
+                subs.remove(sub)
+            return
+        for code in sub.codes:
+            subs = self._by_code.get((sub.topic, code))
+            if subs and sub in subs:
+                subs.remove(sub)
+                if not subs:
+                    del self._by_code[(sub.topic, code)]
+
+    def _reindex(self, sub, codes):
+        with self._lock:
+            if not sub.active:
+                return
+            self._remove(sub)
+            sub.codes = set(codes) if codes is not None else None
+            self._add(sub)
@@ -0,0 +1,317 @@
+# my_utils/exporter.py
+"""
+欄式匯出模組
+負責將倉位快照、逐筆成交與風險走勢寫成 Parquet (或 Arrow IPC) 檔案,依日期分區:
+    exports/<表格>/date=YYYY-MM-DD/part-HHMMSS-<pid>.parquet
+寫入端只把資料放進佇列,由背景執行緒批次轉換與寫檔,報價回調不會被磁碟 I/O 卡住;
+盤後可直接以 pandas.read_parquet('exports/ticks') 或 polars.scan_parquet 載入整天的資料
+
+時間欄位為 Asia/Taipei 時區的毫秒時間戳,與 date= 分區使用同一個時區的日期
+
+寫入中的檔案名稱為 .part-*.tmp,輪替或停止時關閉並改名;以 . 開頭的檔案
+會被 pyarrow dataset 略過,寫入中或當機殘留的檔案都不影響整個目錄的讀取
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIR = 'exports'
+DEFAULT_BATCH_SIZE = 5000      # 累積筆數達到即寫出一個 row group
+DEFAULT_FLUSH_SECONDS = 5.0    # 未滿批次時最長等待秒數
+DEFAULT_ROTATE_SECONDS = 900   # 每個檔案最長開啟秒數 (當機時最多損失這段時間)
+DEFAULT_MAX_PENDING = 200_000  # 佇列上限,超過時丟棄並記錄 (不阻塞報價回調)
+POLL_SECONDS = 0.2
+
+TIMEZONE = 'Asia/Taipei'
+# 台灣沒有日光節約時間,分區日期以固定 +8 計算,不依賴執行環境的時區
+_TAIPEI = timezone(timedelta(hours=8), TIMEZONE)
+
+SCHEMAS = {
+    'ticks': pa.schema([
+        ('ts', pa.timestamp('ms', tz=TIMEZONE)),
+        ('code', pa.string()),
+        ('close', pa.float64()),
+        ('volume', pa.int64()),
+        ('total_volume', pa.int64()),
+    ]),
+    'positions': pa.schema([
+        ('ts', pa.timestamp('ms', tz=TIMEZONE)),
+        ('code', pa.string()),
+        ('account', pa.string()),
+        ('direction', pa.string()),
+        ('quantity', pa.float64()),
+        ('price', pa.float64()),
+        ('last_price', pa.float64()),
+        ('calc_pnl', pa.int64()),
+        ('est_delta', pa.float64()),
+        ('margin', pa.int64()),
+        ('days_left', pa.int32()),
+    ]),
+    'risk': pa.schema([
+        ('ts', pa.timestamp('ms', tz=TIMEZONE)),
+        ('pnl', pa.float64()),
+        ('delta', pa.float64()),
+        ('margin', pa.float64()),
+        ('equity', pa.float64()),
+        ('maintenance', pa.float64()),
+        ('ratio', pa.float64()),
+        ('tier', pa.string()),
+    ]),
+}
+
+
+def _epoch(value):
+    """datetime 或 epoch 秒 -> epoch 秒"""
+    if value is None:
+        return time.time()
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+class _Writer:
+    """單一 (表格, 日期) 的檔案,關閉時由隱藏的 .tmp 檔改名"""
+
+    def __init__(self, path, schema, fmt):
+        self.path = path
+        directory, filename = os.path.split(path)
+        self.tmp_path = os.path.join(directory, f'.{filename}.tmp')
+        self.opened = time.time()
+        self.rows = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if fmt == 'parquet':
+            self._writer = pq.ParquetWriter(self.tmp_path, schema, compression='zstd')
+        else:
+            self._writer = pa.ipc.new_file(self.tmp_path, schema)
+
+    def write(self, table):
+        self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self):
+        self._writer.close()
+        os.replace(self.tmp_path, self.path)
+
+
+class ColumnarExporter:
+    def __init__(self, out_dir=DEFAULT_DIR, fmt='parquet', batch_size=DEFAULT_BATCH_SIZE,
+                 flush_seconds=DEFAULT_FLUSH_SECONDS, rotate_seconds=DEFAULT_ROTATE_SECONDS,
+                 max_pending=DEFAULT_MAX_PENDING):
+        """
+        Args:
+            out_dir: 輸出根目錄
+            fmt: 'parquet' 或 'arrow' (Arrow IPC 檔,pyarrow.ipc.open_file / polars.read_ipc)
+            batch_size: 每個表格累積多少筆寫出一次
+            flush_seconds: 未滿批次時最長等待秒數
+            rotate_seconds: 檔案開啟超過秒數即關閉,下一批寫入新檔
+            max_pending: 佇列上限
+        """
+        if fmt not in ('parquet', 'arrow'):
+            raise ValueError(f"不支援的格式: {fmt}")
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.rotate_seconds = rotate_seconds
+
+        self.max_pending = max_pending
+        # deque 的 append/popleft 是原子操作,寫入端不需要取鎖
+        self._pending = deque()
+        self._buffers = {name: [] for name in SCHEMAS}  # 表格 -> 待寫入的列 (tuple)
+        self._writers = {}                                # (表格, 日期) -> _Writer
+        self._thread = None
+        self._stop = threading.Event()
+        self.dropped = 0
+        self.written = {name: 0 for name in SCHEMAS}
+
+    # ===== 寫入端 (任何執行緒) =====
+    def record_tick(self, code, tick):
+        """記錄一筆成交 (Shioaji TickFOPv1 或同介面的物件)"""
+        self._put('ticks', (
+            _epoch(getattr(tick, 'datetime', None)),
+            code,
+            float(getattr(tick, 'close', 0) or 0),
+            int(getattr(tick, 'volume', 0) or 0),
+            int(getattr(tick, 'total_volume', 0) or 0),
+        ))
+
+    def record_positions(self, positions, ts=None):
+        """
+        記錄一次倉位快照
+
+        Args:
+            positions: PositionRecord 或 get_positions() 的 dict 列表
+        """
+        ts = _epoch(ts)
+        for p in positions:
+            self._put('positions', (
+                ts,
+                p.get('code', ''),
+                p.get('account', ''),
+                'Buy' if 'Buy' in str(p.get('direction', '')) else 'Sell',
+                float(p.get('quantity', 0) or 0),
+                float(p.get('price', 0) or 0),
+                float(p.get('last_price', 0) or 0),
+                int(p.get('calc_pnl', 0) or 0),
+                float(p.get('est_delta', 0) or 0),
+                int(p.get('margin', 0) or 0),
+                int(p.get('days_left', 0) or 0),
+            ))
+
+    def record_risk(self, pnl, delta, margin, status=None, ts=None):
+        """記錄一筆風險走勢 (status 為 RiskEngine.get_status() 的結果)"""
+        status = status or {}
+        self._put('risk', (
+            _epoch(ts),
+            float(pnl),
+            float(delta),
+            float(margin),
+            float(status.get('equity', 'nan')),
+            float(status.get('maintenance', 'nan')),
+            float(status.get('ratio', 'nan')),
+            status.get('tier'),
+        ))
+
+    def _put(self, name, row):
+        if len(self._pending) < self.max_pending:
+            self._pending.append((name, row))
+        else:
+            self.dropped += 1
+            logger.warning(f"匯出佇列已滿,已丟棄 {self.dropped} 筆",
+                           extra={'rate_key': 'exporter.queue_full'})
+
+    # ===== 背景執行緒 =====
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='columnar-exporter', daemon=True)
+        self._thread.start()
+        logger.info(f"欄式匯出已啟動: {os.path.abspath(self.out_dir)} ({self.fmt})")
+
+    def stop(self, timeout=10):
+        """寫出剩餘資料並關閉所有檔案"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def _run(self):
+        last_flush = time.time()
+        while True:
+            stopping = self._stop.is_set()
+            # 每次最多取一個批次,避免積壓時一次轉換過多資料
+            full = False
+            for _ in range(min(len(self._pending), self.batch_size)):
+                name, row = self._pending.popleft()
+                rows = self._buffers[name]
+                rows.append(row)
+                full = full or len(rows) >= self.batch_size
+
+            now = time.time()
+            if full or stopping or now - last_flush >= self.flush_seconds:
+                self._flush(now)
+                last_flush = now
+            if stopping and not self._pending:
+                break
+            if not full and not stopping:
+                self._stop.wait(POLL_SECONDS)
+        self._close_all()
+
+    def _flush(self, now):
+        for name, rows in self._buffers.items():
+            if rows:
+                self._buffers[name] = []
+                try:
+                    self._write(name, rows)
+                except Exception as e:
+                    logger.exception(f"匯出 {name} 失敗 ({len(rows)} 筆): {e}",
+                                     extra={'rate_key': f'exporter.write.{name}'})
+
+        # 輪替開啟過久的檔案
+        for key, writer in list(self._writers.items()):
+            if now - writer.opened >= self.rotate_seconds:
+                self._close(key)
+
+    def _write(self, name, rows):
+        schema = SCHEMAS[name]
+        # 依日期分區 (跨午夜的夜盤會分成兩個分區)
+        by_date = {}
+        for row in rows:
+            day = datetime.fromtimestamp(row[0], _TAIPEI).strftime('%Y-%m-%d')
+            by_date.setdefault(day, []).append(row)
+
+        for day, day_rows in by_date.items():
+            columns = list(zip(*day_rows))
+            arrays = [pa.array([int(t * 1000) for t in columns[0]], type=schema.field(0).type)]
+            arrays += [pa.array(col, type=field.type) for col, field in zip(columns[1:], list(schema)[1:])]
+            table = pa.Table.from_arrays(arrays, schema=schema)
+            self._writer(name, day).write(table)
+            self.written[name] += table.num_rows
+
+    def _writer(self, name, day):
+        key = (name, day)
+        writer = self._writers.get(key)
+        if writer is None:
+            suffix = 'parquet' if self.fmt == 'parquet' else 'arrow'
+            stamp = datetime.now().strftime('%H%M%S')
+            path = os.path.join(self.out_dir, name, f'date={day}', f'part-{stamp}-{os.getpid()}.{suffix}')
+            writer = self._writers[key] = _Writer(path, SCHEMAS[name], self.fmt)
+        return writer
+
+    def _close(self, key):
+        writer = self._writers.pop(key)
+        try:
+            writer.close()
+            logger.info(f"匯出檔案完成: {writer.path} ({writer.rows} 筆)")
+        except Exception as e:
+            logger.warning(f"關閉匯出檔案失敗 {writer.tmp_path}: {e}")
+
+    def _close_all(self):
+        for key in list(self._writers):
+            self._close(key)
+
+
+if __name__ == "__main__":
+    # 效能測試: 寫入端每筆成本與整體吞吐量
+    import argparse
+    import random
+    import tempfile
+    from types import SimpleNamespace
+
+    parser = argparse.ArgumentParser(description="欄式匯出效能測試")
+    parser.add_argument('--out', default=None, help="輸出目錄 (預設為暫存目錄)")
+    parser.add_argument('--ticks', type=int, default=500_000)
+    parser.add_argument('--format', default='parquet', choices=('parquet', 'arrow'))
+    args = parser.parse_args()
+
+    out_dir = args.out or tempfile.mkdtemp(prefix='export-')
+    exporter = ColumnarExporter(out_dir, fmt=args.format, max_pending=args.ticks + 10)
+    exporter.start()
+
+    rng = random.Random(0)
+    codes = ['TXFK6', 'TXFL6', 'MXFK6', 'TXO22000K6']
+    start_ts = time.time()
+    started = time.perf_counter()
+    for i in range(args.ticks):
+        tick = SimpleNamespace(datetime=start_ts + i * 0.01, close=22000 + rng.randint(-50, 50),
+                               volume=rng.randint(1, 5), total_volume=i)
+        exporter.record_tick(codes[i % len(codes)], tick)
+    enqueue = time.perf_counter() - started
+    exporter.record_positions([{'code': 'TXFK6', 'direction': 'Buy', 'quantity': 1, 'price': 22000}])
+    exporter.record_risk(1000, 1.0, 360000)
+    exporter.stop(timeout=60)
+    total = time.perf_counter() - started
+
+    print(f"{args.ticks:,} 筆, 寫入端每筆 {enqueue / args.ticks * 1e6:.2f} us, 全部寫完 {total:.2f} 秒")
+    print(f"輸出: {out_dir}, 寫入 {exporter.written}, 丟棄 {exporter.dropped}")
@@ -0,0 +1,109 @@
+# my_utils/helpers.py
+"""
+共用工具函數
+"""
+
+
+def tick_price(tick):
+    """
+    從 Tick / BidAsk / Quote 物件取出最新價格
+
+    Returns:
+        float: 成交價,沒有時用買賣價中間值;都沒有時為 0
+    """
+    if hasattr(tick, 'close') and tick.close and tick.close > 0:
+        return float(tick.close)
+
+    if hasattr(tick, 'bid_price') and hasattr(tick, 'ask_price'):
+        bid = float(tick.bid_price[0]) if tick.bid_price and len(tick.bid_price) > 0 and tick.bid_price[0] > 0 else 0
+        ask = float(tick.ask_price[0]) if tick.ask_price and len(tick.ask_price) > 0 and tick.ask_price[0] > 0 else 0
+
+        if bid > 0 and ask > 0:
+            return (bid + ask) / 2
+        return bid or ask
+
+    if hasattr(tick, 'buy_price') and hasattr(tick, 'sell_price'):
+        buy = float(tick.buy_price) if tick.buy_price and tick.buy_price > 0 else 0
+        sell = float(tick.sell_price) if tick.sell_price and tick.sell_price > 0 else 0
+
+        if buy > 0 and sell > 0:
+            return (buy + sell) / 2
+        return buy or sell
+
+    return 0
+
+
+# 期貨/選擇權月份代碼: 期貨與買權 A-L, 賣權 M-X
+_CALL_MONTHS = 'ABCDEFGHIJKL'
+_PUT_MONTHS = 'MNOPQRSTUVWX'
+OPTION_PRODUCTS = ('TXO', 'TX1', 'TX2', 'TX4', 'TX5')
+FUTURES_PRODUCTS = ('TXF', 'MXF', 'TMF')
+
+
+def parse_code(code):
+    """
+    解析台指期/台指選代碼
+
+    例如 'MXFL5' -> 小台 12 月 (年份尾數 5)
+         'TXO26500X5' -> 台指選 26500 賣權 12 月
+
+    Returns:
+        dict: product, is_option, strike, cp ('C'/'P'/''), month (1-12), year_digit;
+              無法解析 (例如 R1/R2 連續月代碼) 時回傳 None
+    """
+    code = code.strip().upper()
+    if len(code) < 5 or not code[-1].isdigit():
+        return None
+
+    product = code[:3]
+    month_letter = code[-2]
+    year_digit = int(code[-1])
+
+    if product in OPTION_PRODUCTS:
+        strike_text = code[3:-2]
+        if not strike_text.isdigit():
+            return None
+        if month_letter in _CALL_MONTHS:
+            cp, month = 'C', _CALL_MONTHS.index(month_letter) + 1
+        elif month_letter in _PUT_MONTHS:
+            cp, month = 'P', _PUT_MONTHS.index(month_letter) + 1
+        else:
+            return None
+        return {
+            'product': product,
+            'is_option': True,
+            'strike': int(strike_text),
+            'cp': cp,
+            'month': month,
+            'year_digit': year_digit,
+        }
+
+    if product in FUTURES_PRODUCTS and len(code) == 5 and month_letter in _CALL_MONTHS:
+        return {
+            'product': product,
+            'is_option': False,
+            'strike': 0,
+            'cp': '',
+            'month': _CALL_MONTHS.index(month_letter) + 1,
+            'year_digit': year_digit,
+        }
+
+    return None
+
+
+def format_code(product, delivery_month, strike=0, cp=''):
+    """
+    由商品、交割月份 (YYYYMM) 與履約價組出期貨/選擇權代碼,parse_code 的反向
+
+    例如 ('TXF', '202610') -> 'TXFJ6'; ('TXO', '202610', 22000, 'P') -> 'TXO22000V6'
+
+    Returns:
+        str: 代碼;交割月份格式錯誤時回傳 None
+    """
+    month_text = str(delivery_month or '')
+    if len(month_text) != 6 or not month_text.isdigit() or not 1 <= int(month_text[4:]) <= 12:
+        return None
+    month = int(month_text[4:])
+    letter = (_PUT_MONTHS if cp == 'P' else _CALL_MONTHS)[month - 1]
+    strike_text = str(int(float(strike))) if cp else ''
+    return f"{product}{strike_text}{letter}{month_text[3]}"
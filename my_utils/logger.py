@@ -0,0 +1,123 @@
+# my_utils/logger.py
+"""
+日誌模組
+負責非阻塞的日誌輸出: 呼叫端只把紀錄放進佇列,由背景執行緒寫入輪替檔案與 console,
+並提供依 key 限流的警告,避免報價路徑被 I/O 卡住
+"""
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+LOG_FORMAT = '%(asctime)s %(levelname)-7s [%(name)s] %(message)s'
+
+# 預設各模組等級,可由 setup_logging(levels=...) 覆寫
+DEFAULT_LEVELS = {
+    'gui': logging.INFO,
+    'backend': logging.INFO,
+    'my_utils': logging.INFO,
+}
+
+_listener = None
+_queue_handler = None
+_pid = None  # 建立 _listener 的行程;fork 出的子行程繼承的 listener 沒有寫入執行緒
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    同一個 key 在 interval 秒內只放行一次,被擋下的次數附加在下一筆訊息後面
+    key 以 extra={'rate_key': ...} 指定,沒有指定的紀錄不受影響
+    """
+
+    def __init__(self, interval=60.0):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, 'rate_key', None)
+        if key is None:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            self._last[key] = now
+            skipped = self._suppressed.pop(key, 0)
+
+        if skipped:
+            record.msg = f"{record.msg} (期間略過 {skipped} 筆)"
+        return True
+
+
+def setup_logging(log_file='logs/trading.log', levels=None, console=True,
+                  max_bytes=5 * 1024 * 1024, backup_count=5, rate_interval=60.0):
+    """
+    啟動日誌系統 (重複呼叫不會重複建立)
+
+    Args:
+        log_file: 日誌檔路徑
+        levels: {logger 名稱: 等級} 覆寫 DEFAULT_LEVELS
+        console: 是否同時輸出到 console
+        rate_interval: 限流警告的間隔秒數
+    """
+    global _listener, _queue_handler, _pid
+    if _listener is not None:
+        if _pid == os.getpid():
+            return _listener
+        # fork 的子行程: 移除指向無人讀取佇列的 handler 後重新建立
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener = _queue_handler = None
+
+    handlers = []
+    log_dir = os.path.dirname(log_file)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+    )
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handlers.append(file_handler)
+
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(rate_interval))
+
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+    _queue_handler = queue_handler
+    _pid = os.getpid()
+    root.setLevel(logging.INFO)
+
+    for name, level in {**DEFAULT_LEVELS, **(levels or {})}.items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """停止背景寫入執行緒 (會先寫完佇列中的紀錄)"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        if _pid == os.getpid():
+            _listener.stop()
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener = _queue_handler = None
+
+
+def get_logger(name):
+    return logging.getLogger(name)
@@ -1,170 +1,361 @@
 # margin_fetcher.py
+import logging
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 import re
 
+logger = logging.getLogger(__name__)
+
+# 期交所保證金頁面 (相對於 base_url)
+TAIFEX_BASE_URL = "https://www.taifex.com.tw"
+MARGIN_PAGES = {
+    'index': "/cht/5/indexMarging",             # 股價指數類期貨/選擇權
+    'stock_futures': "/cht/5/stockMargining",   # 股票期貨 (保證金適用比例)
+    'stock_options': "/cht/5/stockOptMargining",  # 股票選擇權 (風險保證金 A/B 值適用比例)
+}
+FETCH_TIMEOUT = 15
+FETCH_RETRIES = 3
+FETCH_BACKOFF = 0.5
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+# 期交所商品名稱 -> 商品代碼 (統一保證金表以代碼為鍵)
+INDEX_PRODUCT_CODES = {
+    '臺股期貨': ('TXF',),
+    '小型臺指期貨': ('MXF',),
+    '微型臺指期貨': ('TMF',),
+    '電子期貨': ('EXF',),
+    '小型電子期貨': ('ZEF',),
+    '金融期貨': ('FXF',),
+    '小型金融期貨': ('ZFF',),
+}
+STOCK_MULTIPLIER = 2000       # 股票期貨/選擇權每口股數 (合約資料沒有乘數時)
+MAINTENANCE_RATIO = 0.75      # 股票選擇權維持保證金相對原始保證金
+
+
+def _parse_number(text):
+    """
+    解析表格數字
+
+    Returns:
+        tuple: (數值, 是否為百分比),無法解析時為 (None, False)
+    """
+    text = text.replace(',', '').replace('元', '').replace(' ', '')
+    is_percent = text.endswith('%')
+    try:
+        value = float(text.rstrip('%'))
+    except ValueError:
+        return None, False
+    return (value / 100 if is_percent else value), is_percent
+
+
+def _find_table(soup):
+    """尋找表格 - 期交所使用多種可能的 class"""
+    for table_class in ['table_f', 'table_c', 'table']:
+        table = soup.find('table', {'class': table_class})
+        if table:
+            return table
+    # 找包含「保證金」的表格
+    for t in soup.find_all('table'):
+        if '保證金' in t.get_text() or '契約' in t.get_text():
+            return t
+    return None
+
+
+def _header_indices(headers, rules):
+    """依關鍵字規則找出欄位索引,rules: [(欄位, 判斷函式)],先符合者優先"""
+    indices = {}
+    for idx, header in enumerate(headers):
+        for field, match in rules:
+            if field not in indices and match(header):
+                indices[field] = idx
+                break
+    return indices
+
+
+_STOCK_RULES = [
+    ('code', lambda h: '英文代碼' in h or ('代碼' in h and '證券' not in h)),
+    ('underlying', lambda h: '證券代號' in h or '標的代號' in h),
+    ('name', lambda h: '簡稱' in h or '名稱' in h),
+    ('A', lambda h: 'A' in h.upper() and '值' in h),
+    ('B', lambda h: 'B' in h.upper() and '值' in h),
+    ('original', lambda h: '原始' in h),
+    ('maintenance', lambda h: '維持' in h),
+]
+
+
 class MarginFetcher:
-    def __init__(self, cache_file='margin_data.json'):
+    def __init__(self, cache_file='margin_data.json', contract_lookup=None):
+        """
+        Args:
+            cache_file: 保證金快取檔
+            contract_lookup: code -> 合約資訊 dict (ContractCache.get),
+                             提供股票期貨/選擇權的乘數與履約價
+        """
         self.cache_file = cache_file
+        self.contract_lookup = contract_lookup
         self.margin_data = {}
         self.load_from_cache()
-        
-    def fetch_and_save(self):
-        """從期交所抓取保證金資料並存檔"""
+
+    @staticmethod
+    def _make_session():
+        """共用連線的 Session,連線錯誤與 5xx 自動重試"""
+        session = requests.Session()
+        retry = Retry(
+            total=FETCH_RETRIES,
+            backoff_factor=FETCH_BACKOFF,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=('GET',)
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_maxsize=len(MARGIN_PAGES))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update(HEADERS)
+        return session
+
+    @staticmethod
+    def _fetch_page(session, url):
+        response = session.get(url, timeout=FETCH_TIMEOUT)
+        response.encoding = 'utf-8'
+        if response.status_code != 200:
+            raise IOError(f"HTTP {response.status_code}")
+        return response.text
+
+    def fetch_and_save(self, base_url=TAIFEX_BASE_URL, pages=None):
+        """
+        從期交所並行抓取各保證金頁面,合併成以商品代碼為鍵的保證金表並存檔;
+        抓取失敗的頁面沿用快取中的舊資料
+
+        Args:
+            base_url: 期交所網址 (可改為本機伺服器,以存檔的 HTML 測試)
+            pages: {種類: 路徑},預設為 MARGIN_PAGES
+        """
+        pages = pages or MARGIN_PAGES
+        parsers = {
+            'index': self._parse_index_table,
+            'stock_futures': lambda table: self._parse_stock_table(table, 'stock_future'),
+            'stock_options': lambda table: self._parse_stock_table(table, 'stock_option'),
+        }
+
+        logger.info("正在抓取期交所保證金資料...")
+        session = self._make_session()
+        results, errors = {}, {}
         try:
-            # 正確的期交所保證金網址
-            url = "https://www.taifex.com.tw/cht/5/indexMarging"
-            
-            print("正在抓取期交所保證金資料...")
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            
-            response = requests.get(url, headers=headers, timeout=15)
-            response.encoding = 'utf-8'
-            
-            if response.status_code != 200:
-                return False, f"無法連接期交所網站 (HTTP {response.status_code})"
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 尋找表格 - 期交所使用多種可能的 class
-            table = None
-            for table_class in ['table_f', 'table_c', 'table', None]:
-                if table_class:
-                    table = soup.find('table', {'class': table_class})
-                else:
-                    # 嘗試找任何 table
-                    tables = soup.find_all('table')
-                    if tables:
-                        # 找包含「保證金」的表格
-                        for t in tables:
-                            if '保證金' in t.get_text() or '契約' in t.get_text():
-                                table = t
-                                break
-                if table:
-                    break
-            
-            if not table:
-                # 儲存 HTML 供除錯
-                with open('debug_margin.html', 'w', encoding='utf-8') as f:
-                    f.write(response.text)
-                return False, "找不到保證金表格，已儲存 debug_margin.html 供檢查"
-            
-            self.margin_data = {
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'contracts': {}
-            }
-            
-            # 解析表格
-            rows = table.find_all('tr')
-            print(f"找到 {len(rows)} 行資料")
-            
-            # 先找出表頭，確定欄位順序
-            header_row = rows[0] if rows else None
-            col_indices = {}
-            
-            if header_row:
-                headers = [th.get_text(strip=True) for th in header_row.find_all(['th', 'td'])]
-                print(f"表頭: {headers}")
-                
-                # 找出各欄位的索引
-                for idx, header in enumerate(headers):
-                    if '商品' in header or '契約' in header:
-                        col_indices['product'] = idx
-                    elif '原始保證金' in header:
-                        col_indices['original'] = idx
-                    elif '維持保證金' in header:
-                        col_indices['maintenance'] = idx
-                    elif '結算保證金' in header:
-                        col_indices['settlement'] = idx
-                
-                print(f"欄位索引: {col_indices}")
-            
-            for i, row in enumerate(rows):
-                # 跳過表頭
-                if i == 0:
+            with ThreadPoolExecutor(max_workers=len(pages)) as pool:
+                futures = {pool.submit(self._fetch_page, session, base_url + path): kind
+                           for kind, path in pages.items()}
+                for future in as_completed(futures):
+                    kind = futures[future]
+                    try:
+                        html = future.result()
+                    except requests.Timeout:
+                        errors[kind] = "連線逾時"
+                        continue
+                    except Exception as e:
+                        errors[kind] = str(e)
+                        continue
+
+                    table = _find_table(BeautifulSoup(html, 'html.parser'))
+                    if not table:
+                        # 儲存 HTML 供除錯
+                        with open(f'debug_margin_{kind}.html', 'w', encoding='utf-8') as f:
+                            f.write(html)
+                        errors[kind] = f"找不到保證金表格，已儲存 debug_margin_{kind}.html 供檢查"
+                        continue
+                    results[kind] = parsers[kind](table)
+        finally:
+            session.close()
+
+        for kind, error in errors.items():
+            logger.warning(f"抓取保證金頁面 {kind} 失敗: {error}")
+
+        contracts = dict(self.margin_data.get('contracts', {}))
+        products = dict(self.margin_data.get('products', {}))
+        if results.get('index'):
+            contracts = results['index']
+            products = {code: p for code, p in products.items() if p.get('kind') != 'index_future'}
+        for kind in ('stock_futures', 'stock_options'):
+            if results.get(kind):
+                product_kind = kind[:-1]
+                products = {code: p for code, p in products.items() if p.get('kind') != product_kind}
+                products.update(results[kind])
+
+        # 指數類期貨也以代碼建立索引
+        for name, codes in INDEX_PRODUCT_CODES.items():
+            if name in contracts:
+                for code in codes:
+                    products[code] = dict(contracts[name], kind='index_future')
+
+        parsed = {kind: len(rows) for kind, rows in results.items() if rows}
+        if not parsed:
+            return False, "未能解析任何保證金資料" + (f" ({'; '.join(errors.values())})" if errors else "")
+
+        self.margin_data = {
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'contracts': contracts,
+            'products': products,
+        }
+
+        # 儲存到檔案
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump(self.margin_data, f, ensure_ascii=False, indent=2)
+
+        message = f"成功載入 {len(contracts)} 個指數商品、{len(products)} 個商品代碼的保證金資料"
+        if errors:
+            message += f" (失敗沿用舊資料: {', '.join(sorted(errors))})"
+        return True, message
+
+    def _parse_index_table(self, table):
+        """解析股價指數類保證金表,回傳 商品名稱 -> 保證金"""
+        contracts = {}
+
+        # 解析表格
+        rows = table.find_all('tr')
+        logger.debug(f"找到 {len(rows)} 行資料")
+
+        # 先找出表頭，確定欄位順序
+        header_row = rows[0] if rows else None
+        col_indices = {}
+
+        if header_row:
+            headers = [th.get_text(strip=True) for th in header_row.find_all(['th', 'td'])]
+            logger.debug(f"表頭: {headers}")
+
+            # 找出各欄位的索引
+            for idx, header in enumerate(headers):
+                if '商品' in header or '契約' in header:
+                    col_indices['product'] = idx
+                elif '原始保證金' in header:
+                    col_indices['original'] = idx
+                elif '維持保證金' in header:
+                    col_indices['maintenance'] = idx
+                elif '結算保證金' in header:
+                    col_indices['settlement'] = idx
+
+            logger.debug(f"欄位索引: {col_indices}")
+
+        for i, row in enumerate(rows):
+            # 跳過表頭
+            if i == 0:
+                continue
+
+            cols = row.find_all(['td', 'th'])
+            if len(cols) < 2:
+                continue
+
+            try:
+                # 提取文字並清理
+                texts = [col.get_text(strip=True) for col in cols]
+
+                # 跳過空行或標題行
+                if not texts[0] or '商品名稱' in texts[0]:
                     continue
-                    
-                cols = row.find_all(['td', 'th'])
-                if len(cols) < 2:
+
+                # 根據表頭索引取得欄位
+                product_name = texts[col_indices.get('product', 0)]
+
+                original_margin = 0
+                maintenance_margin = 0
+
+                # 使用正確的欄位索引
+                if 'original' in col_indices and col_indices['original'] < len(texts):
+                    text = texts[col_indices['original']].replace(',', '').replace('元', '').replace(' ', '')
+                    if text.isdigit():
+                        original_margin = int(text)
+
+                if 'maintenance' in col_indices and col_indices['maintenance'] < len(texts):
+                    text = texts[col_indices['maintenance']].replace(',', '').replace('元', '').replace(' ', '')
+                    if text.isdigit():
+                        maintenance_margin = int(text)
+
+                # 如果沒有找到欄位索引，使用預設邏輯（但避開結算保證金）
+                if original_margin == 0 and 'original' not in col_indices:
+                    # 假設順序：商品名稱、原始保證金、維持保證金、結算保證金
+                    # 所以原始保證金在索引 1，維持保證金在索引 2
+                    if len(texts) >= 3:
+                        # 第一個數字是原始保證金
+                        text1 = texts[1].replace(',', '').replace('元', '').replace(' ', '')
+                        if text1.isdigit():
+                            original_margin = int(text1)
+
+                        # 第二個數字是維持保證金
+                        text2 = texts[2].replace(',', '').replace('元', '').replace(' ', '')
+                        if text2.isdigit():
+                            maintenance_margin = int(text2)
+
+                if original_margin > 0:
+                    # 使用商品名稱作為 key
+                    contracts[product_name] = {
+                        'name': product_name,
+                        'original_margin': original_margin,
+                        'maintenance_margin': maintenance_margin if maintenance_margin > 0 else int(original_margin * 0.75)
+                    }
+
+                    logger.debug(f"載入: {product_name:<20s} - 原始: {original_margin:>8,}, 維持: {maintenance_margin:>8,}")
+
+            except Exception as e:
+                logger.warning(f"解析第 {i} 行失敗: {e}, 資料: {texts[:3] if 'texts' in locals() else 'N/A'}")
+                continue
+
+        return contracts
+
+    def _parse_stock_table(self, table, kind):
+        """
+        解析股票期貨/股票選擇權保證金表 (數百行),回傳 商品代碼 -> 保證金適用比例
+
+        股票期貨: original_ratio / maintenance_ratio
+        股票選擇權: a_ratio / b_ratio (原始保證金用,維持保證金乘 MAINTENANCE_RATIO)
+        """
+        products = {}
+        rows = table.find_all('tr')
+        col_indices = {}
+        for row in rows:
+            texts = [col.get_text(strip=True) for col in row.find_all(['td', 'th'])]
+            if not texts:
+                continue
+            if 'code' not in col_indices:
+                # 表頭可能有多列,找到代碼欄之前都視為表頭
+                col_indices = _header_indices(texts, _STOCK_RULES)
+                continue
+
+            def _cell(field):
+                idx = col_indices.get(field)
+                return texts[idx] if idx is not None and idx < len(texts) else ''
+
+            code = _cell('code').upper()
+            if not code.isalnum():
+                continue
+
+            entry = {
+                'name': _cell('name') or code,
+                'kind': kind,
+                'underlying': _cell('underlying'),
+            }
+            if kind == 'stock_option':
+                a, _ = _parse_number(_cell('A'))
+                b, _ = _parse_number(_cell('B'))
+                if not a or not b:
                     continue
-                    
-                try:
-                    # 提取文字並清理
-                    texts = [col.get_text(strip=True) for col in cols]
-                    
-                    # 跳過空行或標題行
-                    if not texts[0] or '商品名稱' in texts[0]:
-                        continue
-                    
-                    # 根據表頭索引取得欄位
-                    product_name = texts[col_indices.get('product', 0)]
-                    
-                    original_margin = 0
-                    maintenance_margin = 0
-                    
-                    # 使用正確的欄位索引
-                    if 'original' in col_indices and col_indices['original'] < len(texts):
-                        text = texts[col_indices['original']].replace(',', '').replace('元', '').replace(' ', '')
-                        if text.isdigit():
-                            original_margin = int(text)
-                    
-                    if 'maintenance' in col_indices and col_indices['maintenance'] < len(texts):
-                        text = texts[col_indices['maintenance']].replace(',', '').replace('元', '').replace(' ', '')
-                        if text.isdigit():
-                            maintenance_margin = int(text)
-                    
-                    # 如果沒有找到欄位索引，使用預設邏輯（但避開結算保證金）
-                    if original_margin == 0 and 'original' not in col_indices:
-                        # 假設順序：商品名稱、原始保證金、維持保證金、結算保證金
-                        # 所以原始保證金在索引 1，維持保證金在索引 2
-                        if len(texts) >= 3:
-                            # 第一個數字是原始保證金
-                            text1 = texts[1].replace(',', '').replace('元', '').replace(' ', '')
-                            if text1.isdigit():
-                                original_margin = int(text1)
-                            
-                            # 第二個數字是維持保證金
-                            text2 = texts[2].replace(',', '').replace('元', '').replace(' ', '')
-                            if text2.isdigit():
-                                maintenance_margin = int(text2)
-                    
-                    if original_margin > 0:
-                        # 使用商品名稱作為 key
-                        self.margin_data['contracts'][product_name] = {
-                            'name': product_name,
-                            'original_margin': original_margin,
-                            'maintenance_margin': maintenance_margin if maintenance_margin > 0 else int(original_margin * 0.75)
-                        }
-                        
-                        print(f"  載入: {product_name:<20s} - 原始: {original_margin:>8,}, 維持: {maintenance_margin:>8,}")
-                        
-                except Exception as e:
-                    print(f"  解析第 {i} 行失敗: {e}, 資料: {texts[:3] if 'texts' in locals() else 'N/A'}")
+                entry.update(a_ratio=a, b_ratio=b)
+            else:
+                original, _ = _parse_number(_cell('original'))
+                maintenance, _ = _parse_number(_cell('maintenance'))
+                if not original:
                     continue
-            
-            if not self.margin_data['contracts']:
-                return False, "未能解析任何保證金資料"
-            
-            # 儲存到檔案
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.margin_data, f, ensure_ascii=False, indent=2)
-            
-            count = len(self.margin_data['contracts'])
-            return True, f"成功載入 {count} 個商品的保證金資料"
-            
-        except requests.Timeout:
-            return False, "連線逾時，請檢查網路"
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            return False, f"抓取失敗: {str(e)}"
-    
+                entry.update(original_ratio=original,
+                             maintenance_ratio=maintenance or original * MAINTENANCE_RATIO)
+            products[code] = entry
+
+        logger.info(f"{kind}: 載入 {len(products)} 個商品代碼")
+        return products
+
     def load_from_cache(self):
         """從檔案載入保證金資料"""
         if os.path.exists(self.cache_file):
@@ -190,6 +381,12 @@ class MarginFetcher:
     def _get_multiplier(self, code):
         """ 根據合約代碼回傳乘數 """
         code = code.strip().upper()
+        info = self.contract_lookup(code) if self.contract_lookup else None
+        # 合約資料沒有乘數時 ContractCache 記為 1
+        if info and info.get('multiplier', 0) > 1:
+            return float(info['multiplier'])
+        if self._lookup_product(code, ('stock_future', 'stock_option')):
+            return float(STOCK_MULTIPLIER)
         if code.startswith('TXO'):
             return 50.0  # 臺指選擇權
         elif code.startswith('TX') or code.startswith('MTX'):
@@ -225,7 +422,7 @@ class MarginFetcher:
             else:
                 margin = 1000.0
             
-            print(f"[警告] 保證金資料未載入，使用預設值: {code} -> {margin}/{multiplier}")
+            logger.warning(f"保證金資料未載入，使用預設值: {code} -> {margin}/{multiplier}", extra={'rate_key': f'margin.default.{code}'})
             return margin, multiplier
 
         # 1. 取得乘數
@@ -238,11 +435,13 @@ class MarginFetcher:
         return margin, multiplier
     # ==========================================================
     
-    def calculate_margin(self, code, quantity, last_price=None, underlying_price=None):
+    def calculate_margin(self, code, quantity, last_price=None, underlying_price=None,
+                         margin_type='original_margin'):
         """
         計算保證金
         - 期貨：使用固定原始保證金
         - TXO 選擇權：使用期交所公式
+        - margin_type: 'original_margin' (原始) 或 'maintenance_margin' (維持)
         """
         if not self.has_data():
             return 0
@@ -256,14 +455,14 @@ class MarginFetcher:
         if product_name == "臺指選擇權":
 
             if last_price is None or underlying_price is None:
-                print(f"[警告] TXO {code} 缺 last_price 或 underlying_price")
+                logger.warning(f"TXO {code} 缺 last_price 或 underlying_price", extra={'rate_key': f'margin.txo_input.{code}'})
                 return 0
 
             # -------- 解析履約價 --------
             # 找前方連續數字
             m = re.search(r'^TXO(\d{3,5})', code)
             if not m:
-                print(f"[警告] 無法解析履約價: {code}")
+                logger.warning(f"無法解析履約價: {code}", extra={'rate_key': f'margin.strike.{code}'})
                 return 0
             strike = int(m.group(1))
 
@@ -287,30 +486,85 @@ class MarginFetcher:
             premium_value = last_price * MULTIPLIER
 
             # -------- 讀 A / B / C 值 --------
-            A = contracts.get("臺指選擇權風險保證金(A)值", {}).get("original_margin", 86000)
-            B = contracts.get("臺指選擇權風險保證金(B)值", {}).get("original_margin", 43000)
-            C = contracts.get("臺指選擇權風險保證金(C)值", {}).get("original_margin", 8600)
+            A, B, C = self.get_option_risk_values(margin_type)
 
             # -------- TAIFEX 正式公式 --------
             original_margin = premium_value + max(A - otm_value, B)
 
             return original_margin * abs(quantity)
 
+        # =============== 統一保證金表 (以商品代碼查詢) ===================
+        product = self._lookup_product(code)
+        if product is not None:
+            margin = self._product_margin(product, code, last_price, margin_type)
+            if margin is not None:
+                return margin * abs(quantity)
+
         # =============== 期貨（維持原本） ===================
         if product_name in contracts:
-            margin_per_contract = contracts[product_name]['original_margin']
+            margin_per_contract = contracts[product_name][margin_type]
             return margin_per_contract * abs(quantity)
 
         # 模糊匹配
         for contract_name, data in contracts.items():
             if self._fuzzy_match(product_name, contract_name):
-                return data['original_margin'] * abs(quantity)
+                return data[margin_type] * abs(quantity)
 
-        print(f"[警告] 找不到商品: {code} ({product_name})")
+        logger.warning(f"找不到商品: {code} ({product_name})", extra={'rate_key': f'margin.unknown.{code}'})
         return 0
 
     
     
+    def _lookup_product(self, code, kinds=None):
+        """依商品代碼 (前 3 碼) 查統一保證金表"""
+        product = self.margin_data.get('products', {}).get(code[:3])
+        if product is None or (kinds and product.get('kind') not in kinds):
+            return None
+        return product
+
+    def _product_margin(self, product, code, last_price, margin_type):
+        """
+        統一保證金表的單口保證金,資料不足時回傳 None (改走名稱比對)
+        - 指數期貨: 固定金額
+        - 股票期貨: 適用比例 x 期貨價格 x 乘數
+        - 股票選擇權: 權利金 + A 值比例 x 履約價 x 乘數 (沒有標的股價,以履約價估算且不扣價外值)
+        """
+        kind = product.get('kind')
+        if kind == 'index_future':
+            return product.get(margin_type)
+
+        multiplier = self._get_multiplier(code)
+        if kind == 'stock_future':
+            if not last_price:
+                logger.warning(f"股票期貨 {code} 缺 last_price", extra={'rate_key': f'margin.stock_input.{code}'})
+                return 0
+            ratio = product['original_ratio' if margin_type == 'original_margin' else 'maintenance_ratio']
+            return round(ratio * float(last_price) * multiplier)
+
+        if kind == 'stock_option':
+            info = self.contract_lookup(code) if self.contract_lookup else None
+            strike = float(info.get('strike', 0)) if info else 0.0
+            if not strike:
+                logger.warning(f"股票選擇權 {code} 缺履約價", extra={'rate_key': f'margin.stock_strike.{code}'})
+                return 0
+            ratio = 1.0 if margin_type == 'original_margin' else MAINTENANCE_RATIO
+            risk = max(product['a_ratio'], product['b_ratio']) * strike * multiplier * ratio
+            return round(float(last_price or 0) * multiplier + risk)
+
+        return None
+
+    def get_option_risk_values(self, margin_type='original_margin'):
+        """
+        取得臺指選擇權風險保證金 A / B / C 值
+        維持保證金沒有資料時沿用 fetch_and_save 的 75% 估算
+        """
+        contracts = self.margin_data.get("contracts", {})
+        ratio = 1.0 if margin_type == 'original_margin' else 0.75
+        A = contracts.get("臺指選擇權風險保證金(A)值", {}).get(margin_type, int(86000 * ratio))
+        B = contracts.get("臺指選擇權風險保證金(B)值", {}).get(margin_type, int(43000 * ratio))
+        C = contracts.get("臺指選擇權風險保證金(C)值", {}).get(margin_type, int(8600 * ratio))
+        return A, B, C
+    
     def _map_code_to_product(self, code):
         """
         將實際合約代碼對應到期交所的商品名稱
@@ -0,0 +1,347 @@
+# my_utils/portfolio_margin.py
+"""
+組合保證金模組
+負責將部位配對成期交所認可的組合 (價格價差、時間價差、跨式/勒式、期貨跨月價差),
+以最小成本流求出節省金額最大的配對,算出整體最低保證金
+
+組合保證金 (每組一口):
+- 價格價差 (同月同買賣權,一買一賣): 收權利金的一方為履約價差 x 50,付權利金的一方為 0
+- 時間價差 (同履約價同買賣權,賣近月買遠月): C 值
+- 賣出跨式/勒式 (同月,賣買權 + 賣賣權): 兩腳保證金較高者 + 另一腳權利金市值
+- 期貨跨月價差 (同商品,一多一空不同月): spread_margins 設定值,未設定時為單腳的 calendar_ratio
+"""
+import heapq
+from datetime import datetime
+
+from .helpers import parse_code
+
+OPTION_MULTIPLIER = 50
+DEFAULT_CALENDAR_RATIO = 0.1
+CACHE_SIZE = 8  # 保留最近幾組輸入的計算結果 (多帳戶時每個帳戶一組)
+
+# 週選與月選在同一個月份內的到期先後
+_WEEK_ORDER = {'TX1': 1, 'TX2': 2, 'TXO': 3, 'TX4': 4, 'TX5': 5}
+_EPS = 1e-9
+
+
+def _side(leg):
+    """
+    配對圖的兩側: 所有組合都是 買權多-買權空、賣權多-賣權空、買權空-賣權空、期貨多-期貨空,
+    因此 {買權多, 賣權空, 期貨空} 與 {買權空, 賣權多, 期貨多} 構成二分圖
+    """
+    is_long = leg['qty'] > 0
+    if not leg['is_option']:
+        return 1 if is_long else 0
+    if leg['cp'] == 'C':
+        return 0 if is_long else 1
+    return 1 if is_long else 0
+
+
+def max_weight_pairing(capacities, sides, edges):
+    """
+    二分圖上的最大權重 b-matching (每個節點最多配 capacities[i] 組),以最小成本流的連續最短路求解
+
+    Args:
+        capacities: 每腳口數
+        sides: 每腳在二分圖的哪一側 (0/1)
+        edges: (i, j, 每組節省金額) 列表,i 與 j 必須在不同側
+
+    Returns:
+        list: 每條邊配對的組數
+    """
+    n = len(capacities)
+    source, sink = n, n + 1
+    graph = [[] for _ in range(n + 2)]  # 每條殘量邊: [終點, 容量, 成本, 反向邊索引]
+
+    def add(u, v, cap, cost):
+        graph[u].append([v, cap, cost, len(graph[v])])
+        graph[v].append([u, 0, -cost, len(graph[u]) - 1])
+        return u, len(graph[u]) - 1
+
+    for i, cap in enumerate(capacities):
+        if sides[i] == 0:
+            add(source, i, cap, 0.0)
+        else:
+            add(i, sink, cap, 0.0)
+
+    handles = []
+    for i, j, weight in edges:
+        if sides[i] == sides[j]:
+            raise ValueError(f"組合的兩腳必須在二分圖的不同側: {i}, {j}")
+        if sides[i] == 1:
+            i, j = j, i
+        handles.append(add(i, j, min(capacities[i], capacities[j]), -weight))
+
+    # 初始位勢: 圖為 來源 -> 左側 -> 右側 -> 匯點 的 DAG,直接求最短距離
+    potential = [0.0] * (n + 2)
+    for u in range(n):
+        if sides[u] == 0:
+            for v, cap, cost, _ in graph[u]:
+                if cap > 0 and v < n:
+                    potential[v] = min(potential[v], cost)
+    potential[sink] = min([potential[v] for v in range(n) if sides[v] == 1] or [0.0])
+
+    while True:
+        # Dijkstra (以位勢調整後成本皆非負)
+        dist = [float('inf')] * (n + 2)
+        prev = [None] * (n + 2)
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u] + _EPS:
+                continue
+            if u == sink:
+                break
+            for k, (v, cap, cost, _) in enumerate(graph[u]):
+                if cap <= 0:
+                    continue
+                nd = d + cost + potential[u] - potential[v]
+                if nd < dist[v] - _EPS:
+                    dist[v] = nd
+                    prev[v] = (u, k)
+                    heapq.heappush(heap, (nd, v))
+        if dist[sink] == float('inf'):
+            break
+        # 匯點出堆即停止,未確定的節點以匯點距離更新位勢 (調整後成本仍非負)
+        limit = dist[sink]
+        for v in range(n + 2):
+            potential[v] += min(dist[v], limit)
+
+        # 最短路的實際成本 (負的節省金額) 不再為負時,再配對只會增加保證金
+        if potential[sink] - potential[source] > -_EPS:
+            break
+
+        flow = float('inf')
+        v = sink
+        while v != source:
+            u, k = prev[v]
+            flow = min(flow, graph[u][k][1])
+            v = u
+        v = sink
+        while v != source:
+            u, k = prev[v]
+            edge = graph[u][k]
+            edge[1] -= flow
+            graph[v][edge[3]][1] += flow
+            v = u
+
+    result = []
+    for u, k in handles:
+        v, cap, _, rev = graph[u][k]
+        result.append(graph[v][rev][1])
+    return result
+
+
+class PortfolioMargin:
+    def __init__(self, margin_fetcher, spread_margins=None, calendar_ratio=DEFAULT_CALENDAR_RATIO):
+        """
+        Args:
+            margin_fetcher: MarginFetcher (提供期貨保證金與 A/B/C 值)
+            spread_margins: {期貨商品: 每組跨月價差保證金}
+            calendar_ratio: 沒有設定跨月價差保證金時,以單腳保證金的比例估算
+        """
+        self.margin_fetcher = margin_fetcher
+        self.spread_margins = spread_margins or {}
+        self.calendar_ratio = calendar_ratio
+        self._cache = {}  # 輸入簽章 -> compute 結果,倉位與價格都沒變時不重新配對
+
+    # ===== 單腳 =====
+    def _leg(self, p, underlying_price, margin_type, year_digit_now, abc):
+        code = p.get('code', '')
+        info = parse_code(code)
+        qty = float(p.get('quantity', 0))
+        if not info or qty == 0:
+            return None
+
+        sign = 1 if 'Buy' in str(p.get('direction', '')) else -1
+        price = float(p.get('last_price', 0) or 0)
+        leg = dict(info, code=code, qty=int(sign * qty), price=price)
+        leg['expiry_rank'] = (
+            (info['year_digit'] - year_digit_now) % 10,
+            info['month'],
+            _WEEK_ORDER.get(info['product'], 3),
+        )
+
+        if info['is_option']:
+            leg['premium'] = price * OPTION_MULTIPLIER
+            if sign > 0:
+                leg['unit_margin'] = 0.0
+            else:
+                A, B, _ = abc
+                if info['cp'] == 'P':
+                    otm = max(underlying_price - info['strike'], 0) * OPTION_MULTIPLIER
+                else:
+                    otm = max(info['strike'] - underlying_price, 0) * OPTION_MULTIPLIER
+                leg['unit_margin'] = leg['premium'] + max(A - otm, B)
+        else:
+            leg['premium'] = 0.0
+            leg['unit_margin'] = float(self.margin_fetcher.calculate_margin(
+                code, 1, margin_type=margin_type
+            ))
+        return leg
+
+    # ===== 候選組合 =====
+    def _candidates(self, legs, abc):
+        """
+        產生所有可能的兩腳組合
+        依組合條件先分組 (同商品期貨、同月同買賣權、同履約價同買賣權、同月),
+        只在組內配對多空或買賣權兩邊,不逐一比對所有腳位
+
+        Returns:
+            list: (每組節省金額, 組合名稱, leg1 索引, leg2 索引, 每組保證金)
+        """
+        futures = {}
+        verticals = {}
+        calendars = {}
+        shorts_by_expiry = {}
+        for i, leg in enumerate(legs):
+            is_long = leg['qty'] > 0
+            if not leg['is_option']:
+                futures.setdefault(leg['product'], ([], []))[is_long].append(i)
+                continue
+            verticals.setdefault((leg['expiry_rank'], leg['cp']), ([], []))[is_long].append(i)
+            calendars.setdefault((leg['strike'], leg['cp']), ([], []))[is_long].append(i)
+            if not is_long:
+                shorts_by_expiry.setdefault(leg['expiry_rank'], ([], []))[leg['cp'] == 'C'].append(i)
+
+        _, _, C = abc
+        result = []
+
+        def add(name, i, j, unit):
+            a, b = legs[i], legs[j]
+            result.append((a['unit_margin'] + b['unit_margin'] - unit, name, min(i, j), max(i, j), unit))
+
+        # 期貨跨月價差
+        for product, (shorts, longs) in futures.items():
+            for i in shorts:
+                for j in longs:
+                    a, b = legs[i], legs[j]
+                    if a['expiry_rank'] == b['expiry_rank']:
+                        continue
+                    unit = self.spread_margins.get(
+                        product, max(a['unit_margin'], b['unit_margin']) * self.calendar_ratio
+                    )
+                    add('跨月價差', i, j, unit)
+
+        # 價格價差: 賣出的那腳較價內即為收權利金
+        for (_, cp), (shorts, longs) in verticals.items():
+            for i in shorts:
+                for j in longs:
+                    short_leg, long_leg = legs[i], legs[j]
+                    if short_leg['strike'] == long_leg['strike']:
+                        continue
+                    if cp == 'C':
+                        credit = short_leg['strike'] < long_leg['strike']
+                    else:
+                        credit = short_leg['strike'] > long_leg['strike']
+                    unit = abs(short_leg['strike'] - long_leg['strike']) * OPTION_MULTIPLIER if credit else 0.0
+                    add('價格價差', i, j, unit)
+
+        # 時間價差: 賣近月買遠月
+        for (shorts, longs) in calendars.values():
+            for i in shorts:
+                for j in longs:
+                    if legs[i]['expiry_rank'] < legs[j]['expiry_rank']:
+                        add('時間價差', i, j, float(C))
+
+        # 賣出跨式 / 勒式
+        for (puts, calls) in shorts_by_expiry.values():
+            for i in calls:
+                for j in puts:
+                    a, b = legs[min(i, j)], legs[max(i, j)]
+                    if a['unit_margin'] >= b['unit_margin']:
+                        unit = a['unit_margin'] + b['premium']
+                    else:
+                        unit = b['unit_margin'] + a['premium']
+                    add('跨式' if a['strike'] == b['strike'] else '勒式', i, j, unit)
+
+        return result
+
+    # ===== 計算 =====
+    def compute(self, positions, underlying_price, margin_type='original_margin'):
+        """
+        計算組合後的整體保證金
+
+        Args:
+            positions: get_positions() 格式的 dict 列表
+            underlying_price: 標的價格 (選擇權價外值使用)
+            margin_type: 'original_margin' 或 'maintenance_margin'
+
+        Returns:
+            dict: total (組合後), standalone (逐腳加總), savings, combos (配對明細),
+                  unmatched (無法解析的代碼)
+        """
+        abc = self.margin_fetcher.get_option_risk_values(margin_type)
+        year_digit_now = datetime.now().year % 10
+        underlying_price = float(underlying_price or 0)
+
+        signature = (margin_type, underlying_price, tuple(abc), year_digit_now, tuple(
+            (p.get('code', ''), str(p.get('direction', '')), float(p.get('quantity', 0)),
+             float(p.get('last_price', 0) or 0))
+            for p in positions
+        ))
+        cached = self._cache.get(signature)
+        if cached is not None:
+            return cached
+
+        legs = []
+        unmatched = []
+        merged = {}  # (代碼, 多空, 市價) -> 腳位索引,同一代碼多列 (例如分批成交) 合併為一個節點
+        for p in positions:
+            leg = self._leg(p, underlying_price, margin_type, year_digit_now, abc)
+            if leg is None:
+                unmatched.append(p.get('code', ''))
+                continue
+            key = (leg['code'], leg['qty'] > 0, leg['price'])
+            if key in merged:
+                legs[merged[key]]['qty'] += leg['qty']
+            else:
+                merged[key] = len(legs)
+                legs.append(leg)
+
+        standalone = sum(leg['unit_margin'] * abs(leg['qty']) for leg in legs)
+
+        # 最大化總節省金額 (依序貪婪配對可能讓先配的組合占掉更好的配對)
+        candidates = [c for c in self._candidates(legs, abc) if c[0] > 0]
+        quantities = max_weight_pairing(
+            [abs(leg['qty']) for leg in legs],
+            [_side(leg) for leg in legs],
+            [(i, j, saving) for saving, _, i, j, _ in candidates]
+        )
+
+        combos = []
+        savings = 0.0
+        for (saving, name, i, j, unit), qty in zip(candidates, quantities):
+            if qty <= 0:
+                continue
+            savings += saving * qty
+            combos.append({
+                'type': name,
+                'legs': (legs[i]['code'], legs[j]['code']),
+                'qty': qty,
+                'margin': unit * qty,
+            })
+
+        # 無法解析的代碼 (例如非台指商品) 以單一商品保證金計算
+        other = 0
+        for p in positions:
+            if p.get('code', '') in unmatched:
+                other += self.margin_fetcher.calculate_margin(
+                    p.get('code', ''), int(float(p.get('quantity', 0))),
+                    last_price=p.get('last_price'), underlying_price=underlying_price,
+                    margin_type=margin_type
+                )
+
+        result = {
+            'total': standalone - savings + other,
+            'standalone': standalone + other,
+            'savings': savings,
+            'combos': combos,
+            'unmatched': unmatched,
+        }
+        self._cache[signature] = result
+        if len(self._cache) > CACHE_SIZE:
+            self._cache.pop(next(iter(self._cache)))
+        return result
+
@@ -0,0 +1,207 @@
+# my_utils/pretrade_check.py
+"""
+下單前風控模組
+負責快取目前部位的總保證金、各標的淨 Delta 與各商品口數,
+對單筆或一批委託只計算委託本身的腳位 (O(委託腳數)) 就能判斷是否超過限制
+"""
+import logging
+import threading
+
+from .helpers import parse_code, FUTURES_PRODUCTS, OPTION_PRODUCTS
+
+logger = logging.getLogger(__name__)
+
+OK = 'ok'
+WARN = 'warn'
+REJECT = 'reject'
+
+# 小台、微台換算成大台的 Delta
+_FUTURES_DELTA = {'TXF': 1.0, 'MXF': 0.25, 'TMF': 0.05}
+
+
+def underlying_of(code):
+    """取得代碼所屬標的 (台指期貨/選擇權皆歸為 TX)"""
+    info = parse_code(code)
+    if info and info['product'] in FUTURES_PRODUCTS + OPTION_PRODUCTS:
+        return 'TX'
+    return code[:3]
+
+
+def product_of(code):
+    info = parse_code(code)
+    return info['product'] if info else code[:3]
+
+
+class PreTradeChecker:
+    def __init__(self, margin_fetcher, limits=None):
+        """
+        Args:
+            margin_fetcher: MarginFetcher
+            limits: load_risk_limits() 的結果
+        """
+        self.margin_fetcher = margin_fetcher
+        self.limits = limits or {}
+
+        self._lock = threading.Lock()
+        self._legs = {}      # (帳戶, code) -> {'qty': 帶正負號口數, 'delta': 每口 Delta, 'price', 'margin'}
+        self._delta = {}     # 標的 -> 淨 Delta
+        self._lots = {}      # 商品 -> 口數 (絕對值加總)
+        self.total_margin = 0.0
+        self.equity = None
+        self.underlying_price = 0.0
+
+    # ===== 快取 =====
+    def load(self, positions, underlying_price=None, equity=None):
+        """
+        以 get_positions() 格式的倉位重建快取
+        多帳戶時以 (帳戶, 代碼) 分開記錄,保證金各自計算,Delta 與口數加總到所有帳戶
+        """
+        with self._lock:
+            if underlying_price:
+                self.underlying_price = float(underlying_price)
+            if equity is not None:
+                self.equity = float(equity)
+            self._legs = {}
+            self._delta = {}
+            self._lots = {}
+            self.total_margin = 0.0
+
+            for p in positions:
+                code = p.get('code', '')
+                qty = float(p.get('quantity', 0))
+                if not code or qty == 0:
+                    continue
+                sign = 1 if 'Buy' in str(p.get('direction', '')) else -1
+                # est_delta 已含方向,換回每口多方 Delta
+                leg = {
+                    'qty': 0.0,
+                    'delta': float(p.get('est_delta', 0)) * sign,
+                    'price': float(p.get('last_price', 0) or 0),
+                    'margin': 0.0,
+                }
+                self._legs[(p.get('account', ''), code)] = leg
+                self._set_leg(code, leg, sign * qty)
+
+    def set_equity(self, equity):
+        with self._lock:
+            self.equity = float(equity) if equity is not None else None
+
+    def set_position(self, code, qty, account=''):
+        """成交後更新單一帳戶單一代碼的口數 (帶正負號)"""
+        with self._lock:
+            key = (account, code)
+            leg = self._legs.get(key)
+            if leg is None:
+                leg = self._legs[key] = self._new_leg(code, 0.0)
+            self._set_leg(code, leg, float(qty))
+
+    def _new_leg(self, code, price):
+        info = parse_code(code)
+        if info and not info['is_option']:
+            delta = _FUTURES_DELTA.get(info['product'], 1.0)
+        elif info:
+            # 沒有持倉的選擇權以價平估計
+            delta = 0.5 if info['cp'] == 'C' else -0.5
+        else:
+            delta = 1.0
+        return {'qty': 0.0, 'delta': delta, 'price': price, 'margin': 0.0}
+
+    def _leg_margin(self, code, leg, qty):
+        if qty == 0:
+            return 0.0
+        return float(self.margin_fetcher.calculate_margin(
+            code, int(abs(qty)), last_price=leg['price'], underlying_price=self.underlying_price
+        ))
+
+    def _set_leg(self, code, leg, qty):
+        """以差額更新總計"""
+        underlying = underlying_of(code)
+        product = product_of(code)
+        margin = self._leg_margin(code, leg, qty)
+
+        self.total_margin += margin - leg['margin']
+        self._delta[underlying] = self._delta.get(underlying, 0.0) + (qty - leg['qty']) * leg['delta']
+        self._lots[product] = self._lots.get(product, 0.0) + abs(qty) - abs(leg['qty'])
+        leg['qty'] = qty
+        leg['margin'] = margin
+
+    # ===== 檢查 =====
+    def check(self, orders):
+        """
+        檢查一筆或一批委託下單後的狀態
+
+        Args:
+            orders: dict 列表 (code, action 'Buy'/'Sell', quantity, price 與 account 可省略)
+
+        Returns:
+            dict: level (ok/warn/reject), messages, margin, delta (標的 -> 下單後淨 Delta)
+        """
+        with self._lock:
+            after_qty = {}
+            new_legs = {}
+            for order in orders:
+                code = order['code']
+                key = (order.get('account', ''), code)
+                leg = self._legs.get(key)
+                if leg is None:
+                    leg = new_legs.get(key)
+                    if leg is None:
+                        leg = new_legs[key] = self._new_leg(code, float(order.get('price', 0) or 0))
+                sign = 1 if 'Buy' in str(order.get('action', '')) else -1
+                after_qty[key] = after_qty.get(key, leg['qty']) + sign * float(order['quantity'])
+
+            # 只重算受影響的代碼
+            margin = self.total_margin
+            delta = {}
+            lots = {}
+            for key, qty in after_qty.items():
+                code = key[1]
+                leg = self._legs.get(key) or new_legs[key]
+                underlying = underlying_of(code)
+                product = product_of(code)
+                margin += self._leg_margin(code, leg, qty) - leg['margin']
+                delta[underlying] = delta.get(underlying, self._delta.get(underlying, 0.0)) \
+                    + (qty - leg['qty']) * leg['delta']
+                lots[product] = lots.get(product, self._lots.get(product, 0.0)) \
+                    + abs(qty) - abs(leg['qty'])
+
+            before_margin = self.total_margin
+            before_delta = dict(self._delta)
+            before_lots = dict(self._lots)
+            equity = self.equity
+
+        messages = []
+        level = OK
+
+        warn_ratio = self.limits.get('warn_ratio', 0.9)
+        breach = REJECT if self.limits.get('action', 'reject') == 'reject' else WARN
+
+        def judge(name, before, after, limit):
+            # 沒有增加風險的委託 (例如減倉) 永遠允許
+            nonlocal level
+            if not limit or abs(after) <= abs(before):
+                return
+            if abs(after) > limit:
+                messages.append(f"{name} {after:,.2f} 超過上限 {limit:,.2f}")
+                if level != REJECT:
+                    level = breach
+            elif abs(after) >= limit * warn_ratio:
+                messages.append(f"{name} {after:,.2f} 接近上限 {limit:,.2f}")
+                if level == OK:
+                    level = WARN
+
+        judge('總保證金', before_margin, margin, self.limits.get('max_margin'))
+        if equity and self.limits.get('max_margin_usage'):
+            judge('保證金使用率', before_margin / equity, margin / equity,
+                  self.limits['max_margin_usage'])
+        for underlying, value in delta.items():
+            judge(f"{underlying} 淨 Delta", before_delta.get(underlying, 0.0), value,
+                  self.limits.get('max_delta'))
+        product_lots = self.limits.get('product_lots', {})
+        for product, value in lots.items():
+            judge(f"{product} 口數", before_lots.get(product, 0.0), value,
+                  product_lots.get(product, self.limits.get('max_lots')))
+
+        if level != OK:
+            logger.info(f"下單前檢查 {level}: {'; '.join(messages)}")
+        return {'level': level, 'messages': messages, 'margin': margin, 'delta': delta}
@@ -0,0 +1,269 @@
+# my_utils/profiler.py
+"""
+取樣分析模組
+負責在執行中的程式上做固定時間的取樣分析: 背景執行緒定期以 sys._current_frames()
+讀取所有執行緒 (Tk 主執行緒、Shioaji 回調執行緒、背景服務) 的堆疊,
+依最內層符合的規則歸到子系統 (報價處理、保證金、價差監測、後端呼叫、Tk 繪製),
+結束後輸出文字報告
+
+未啟動時不安裝任何 hook,也沒有取樣執行緒,對程式沒有額外負擔
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 0.005  # 秒
+DEFAULT_DURATION = 30     # 秒
+MAX_DEPTH = 64            # 每個堆疊最多往外找幾層
+IDLE = '閒置/等待'
+OTHER = '其他'
+
+# (子系統, 檔案路徑片段, 函式名稱);路徑或函式為 None 表示不限,依序比對
+# 子系統為 None 的規則表示略過該層繼續往外找 (Tk 事件迴圈呼叫回調的那一層)
+SUBSYSTEM_RULES = (
+    (None, 'tkinter', ('__call__', 'callit', 'mainloop')),
+    ('價差監測', None, ('check_spread_monitors', '_check_spread_monitors', 'on_spread_update',
+                    'check_and_roll_if_spread_met', 'start_spread_monitoring')),
+    ('價差監測', 'backend/spread_book.py', None),
+    ('保證金', 'my_utils/margin_fetcher.py', None),
+    ('保證金', 'my_utils/portfolio_margin.py', None),
+    ('保證金', 'my_utils/risk_engine.py', None),
+    ('保證金', 'my_utils/pretrade_check.py', None),
+    ('報價處理', None, ('on_quote_update', 'handle_quote_update', 'on_quote', 'on_tick', 'on_bidask',
+                    'apply_fill', 'on_order_update')),
+    ('報價處理', 'backend/order_book.py', None),
+    ('報價處理', 'backend/feed_watchdog.py', None),
+    ('報價處理', 'backend/position_book.py', None),
+    ('報價處理', 'my_utils/event_bus.py', None),
+    ('後端呼叫', 'backend/core.py', None),
+    ('後端呼叫', 'backend/simulator.py', None),
+    ('後端呼叫', 'backend/engine.py', None),
+    ('後端呼叫', 'backend/snapshot_service.py', None),
+    ('後端呼叫', 'backend/subscription_manager.py', None),
+    ('後端呼叫', 'backend/contract_cache.py', None),
+    ('後端呼叫', 'shioaji', None),
+    ('後端呼叫', 'requests', None),
+    ('Tk 繪製', 'tkinter', None),
+    ('Tk 繪製', 'gui/chart_window.py', None),
+)
+
+# 最內層 Python 函式為這些時視為在等待 (實際停在 C 層的 select / lock / Tk 事件迴圈)
+IDLE_FUNCTIONS = frozenset((
+    'wait', 'get', 'mainloop', 'select', 'poll', 'accept', 'recv', 'recv_into',
+    'readinto', '_recv_bytes', '_wait_for_tstate_lock', 'join', 'serve_forever',
+))
+IDLE_FILES = ('threading.py', 'queue.py', 'selectors.py', 'socket.py', 'socketserver.py',
+              'connection.py', 'tkinter', 'ssl.py')
+
+
+def _norm(path):
+    return path.replace('\\', '/')
+
+
+class SamplingProfiler:
+    def __init__(self, interval=DEFAULT_INTERVAL, rules=SUBSYSTEM_RULES, report_dir='logs'):
+        """
+        Args:
+            interval: 取樣間隔 (秒)
+            rules: 子系統比對規則
+            report_dir: 報告輸出目錄
+        """
+        self.interval = interval
+        self.rules = rules
+        self.report_dir = report_dir
+
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._classify_cache = {}  # code object -> 子系統或 None
+        self._reset()
+
+    def _reset(self):
+        self.samples = 0
+        self.started = None
+        self.elapsed = 0.0
+        self.cpu_seconds = 0.0
+        self.by_subsystem = Counter()         # 子系統 -> 樣本數
+        self.by_thread = Counter()            # (執行緒, 子系統) -> 樣本數
+        self.functions = Counter()            # (子系統, 最內層函式) -> 樣本數
+        self.on_done = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # ===== 控制 =====
+    def start(self, duration=DEFAULT_DURATION, on_done=None):
+        """
+        開始取樣,duration 秒後自動停止
+
+        Args:
+            on_done: 結束時以 on_done(report) 呼叫 (在取樣執行緒,GUI 需自行轉回 Tk 執行緒)
+
+        Returns:
+            bool: 已在執行時為 False
+        """
+        if self.running:
+            return False
+        with self._lock:
+            self._reset()
+            self.on_done = on_done
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(duration,), name='sampling-profiler', daemon=True)
+        self._thread.start()
+        logger.info(f"取樣分析開始: {duration} 秒, 間隔 {self.interval * 1000:.0f} ms")
+        return True
+
+    def stop(self):
+        """提前停止 (報告仍會產生)"""
+        self._stop.set()
+
+    # ===== 取樣 =====
+    def _run(self, duration):
+        own = threading.get_ident()
+        main = threading.main_thread().ident
+        self.started = time.time()
+        deadline = time.monotonic() + duration
+        names = {}
+        cpu_start = time.process_time()
+
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {t.ident: t.name for t in threading.enumerate()}
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    self._sample(names.get(ident, str(ident)), frame, ident == main)
+                self.samples += 1
+            del frames
+            self._stop.wait(self.interval)
+
+        self.elapsed = time.time() - self.started
+        self.cpu_seconds = time.process_time() - cpu_start
+        report = self.report()
+        path = self.save(report)
+        logger.info(f"取樣分析結束: {self.samples} 次取樣, 報告 {path}")
+        if self.on_done:
+            self.on_done(report)
+
+    def _sample(self, thread_name, frame, is_main=False):
+        code = frame.f_code
+        waiting = code.co_name in IDLE_FUNCTIONS and any(f in _norm(code.co_filename) for f in IDLE_FILES)
+
+        subsystem = None
+        depth = 0
+        f = frame
+        while f is not None and depth < MAX_DEPTH:
+            subsystem = self._classify(f.f_code)
+            if subsystem is not None:
+                break
+            f = f.f_back
+            depth += 1
+
+        # 背景執行緒等待是正常的;Tk 主執行緒在子系統內等待 (例如等引擎回覆) 會造成畫面卡頓,仍計入該子系統
+        if waiting and (not is_main or subsystem is None):
+            subsystem = IDLE
+        subsystem = subsystem or OTHER
+
+        self.by_subsystem[subsystem] += 1
+        self.by_thread[(thread_name, subsystem)] += 1
+        self.functions[(subsystem, f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")] += 1
+
+    def _classify(self, code):
+        try:
+            return self._classify_cache[code]
+        except KeyError:
+            pass
+        path = _norm(code.co_filename)
+        result = None
+        for subsystem, fragment, functions in self.rules:
+            if fragment is not None and fragment not in path:
+                continue
+            if functions is not None and code.co_name not in functions:
+                continue
+            result = subsystem
+            break
+        self._classify_cache[code] = result
+        return result
+
+    # ===== 報告 =====
+    def report(self, top=8):
+        """文字報告: 子系統占比、各執行緒分布、各子系統最常出現的函式"""
+        with self._lock:
+            by_subsystem = Counter(self.by_subsystem)
+            by_thread = Counter(self.by_thread)
+            functions = Counter(self.functions)
+            samples = self.samples
+
+        started = datetime.fromtimestamp(self.started).strftime('%Y-%m-%d %H:%M:%S') if self.started else '-'
+        lines = [
+            f"取樣分析報告 {started}",
+            f"時間 {self.elapsed:.1f} 秒, 取樣 {samples} 次 (間隔 {self.interval * 1000:.0f} ms), "
+            f"行程 CPU {self.cpu_seconds:.2f} 秒",
+            "",
+        ]
+        if not samples:
+            return '\n'.join(lines + ["沒有樣本"])
+
+        busy = sum(n for name, n in by_subsystem.items() if name != IDLE) or 1
+        lines.append(f"{'子系統':<10} {'樣本':>7} {'忙碌占比':>8}")
+        for name, n in by_subsystem.most_common():
+            share = '-' if name == IDLE else f"{n / busy:.1%}"
+            lines.append(f"{name:<10} {n:>7} {share:>8}")
+
+        lines += ["", "各執行緒 (占該執行緒樣本比例):"]
+        threads = Counter()
+        for (thread, _), n in by_thread.items():
+            threads[thread] += n
+        for thread, total in threads.most_common():
+            parts = sorted(((n, name) for (t, name), n in by_thread.items() if t == thread), reverse=True)
+            detail = ', '.join(f"{name} {n / total:.0%}" for n, name in parts)
+            lines.append(f"  {thread}: {detail}")
+
+        for name, _ in by_subsystem.most_common():
+            if name == IDLE:
+                continue
+            lines += ["", f"[{name}] 最內層函式:"]
+            items = sorted(((n, func) for (s, func), n in functions.items() if s == name), reverse=True)
+            for n, func in items[:top]:
+                lines.append(f"  {n:>6}  {func}")
+        return '\n'.join(lines)
+
+    def save(self, report):
+        os.makedirs(self.report_dir, exist_ok=True)
+        stamp = datetime.fromtimestamp(self.started or time.time()).strftime('%Y%m%d_%H%M%S')
+        path = os.path.join(self.report_dir, f'profile_{stamp}.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(report)
+        return path
+
+
+if __name__ == "__main__":
+    # 示範: 一個忙碌的執行緒與一個等待中的執行緒
+    import tempfile
+
+    def busy():
+        end = time.monotonic() + 2
+        while time.monotonic() < end:
+            sum(i * i for i in range(1000))
+
+    def idle():
+        threading.Event().wait(2)
+
+    workers = [threading.Thread(target=busy, name='busy'), threading.Thread(target=idle, name='idle')]
+    for w in workers:
+        w.start()
+    profiler = SamplingProfiler(report_dir=tempfile.mkdtemp())
+    done = threading.Event()
+    profiler.start(duration=1.5, on_done=lambda report: (print(report), done.set()))
+    done.wait()
+    for w in workers:
+        w.join()
@@ -0,0 +1,184 @@
+# my_utils/risk_engine.py
+"""
+即時風險模組
+負責以逐筆增量方式追蹤帳戶權益數 (現金 + 未實現損益) 與原始/維持保證金,
+風險指標跨越門檻時發出分級警示,並估算標的再走多少點會被追繳
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# (權益數 / 維持保證金 低於此比例, 等級),由嚴重到輕微
+DEFAULT_TIERS = (
+    (1.00, '追繳'),
+    (1.10, '危險'),
+    (1.25, '警告'),
+)
+NORMAL = '正常'
+# est_delta 以大台 (TXF) 口數計,大台每點 200 元
+DELTA_POINT_VALUE = 200
+
+
+class RiskEngine:
+    def __init__(self, margin_fetcher, multiplier_lookup=None, tiers=DEFAULT_TIERS, on_alert=None):
+        """
+        Args:
+            margin_fetcher: MarginFetcher
+            multiplier_lookup: code -> 乘數 的函式
+            tiers: 分級門檻
+            on_alert: 等級改變時呼叫 on_alert(tier, status)
+        """
+        self.margin_fetcher = margin_fetcher
+        self.multiplier_lookup = multiplier_lookup or margin_fetcher._get_multiplier
+        self.tiers = tuple(sorted(tiers))
+        self.on_alert = on_alert
+
+        self._lock = threading.Lock()
+        self._legs = {}  # (帳戶, code) -> 各部位的貢獻值 (各帳戶分別計算保證金,不跨帳戶相抵)
+        self._by_code = {}  # code -> [(帳戶, code)]
+        self.cash = None  # 尚未取得帳戶資料前不評估等級
+        self.underlying_price = 0.0
+        self.total_pnl = 0.0
+        self.total_original = 0.0
+        self.total_maintenance = 0.0
+        self.dollar_delta = 0.0  # 標的每漲 1 點的損益
+        self.tier = NORMAL
+
+    # ===== 載入 =====
+    def set_cash(self, cash):
+        """設定不含未實現損益的帳戶現金 (權益數 - 未實現損益)"""
+        with self._lock:
+            self.cash = float(cash)
+        return self.evaluate()
+
+    def load(self, positions, underlying_price=None):
+        """
+        以 get_positions() 格式的倉位重建所有部位
+
+        Args:
+            positions: dict 列表 (code, direction, quantity, price, last_price, est_delta,
+                       account 可省略;多帳戶時各帳戶的同一代碼分開計算)
+        """
+        with self._lock:
+            if underlying_price:
+                self.underlying_price = float(underlying_price)
+            self._legs = {}
+            self._by_code = {}
+            self.total_pnl = self.total_original = self.total_maintenance = self.dollar_delta = 0.0
+
+            for p in positions:
+                code = p.get('code', '')
+                qty = float(p.get('quantity', 0))
+                if not code or qty == 0:
+                    continue
+                sign = 1 if 'Buy' in str(p.get('direction', '')) else -1
+                # est_delta 已含方向,換回每口多方 Delta (與 PreTradeChecker 相同)
+                leg = {
+                    'qty': sign * qty,
+                    'cost': float(p.get('price', 0)),
+                    'multiplier': self.multiplier_lookup(code),
+                    'delta': float(p.get('est_delta', 0)) * sign,
+                    'pnl': 0.0, 'original': 0.0, 'maintenance': 0.0, 'dollar_delta': 0.0,
+                }
+                key = (p.get('account', ''), code)
+                if key not in self._legs:
+                    self._by_code.setdefault(code, []).append(key)
+                self._legs[key] = leg
+                self._update_leg(code, leg, float(p.get('last_price', 0) or 0))
+
+        return self.evaluate()
+
+    # ===== 逐筆更新 O(1) =====
+    def on_price(self, code, price, underlying_price=None):
+        """
+        單一代碼報價更新,只重算該代碼的部位 (多帳戶時各一筆) 並以差額調整總計
+
+        Returns:
+            dict: 目前風險狀態 (沒有這個部位時為 None)
+        """
+        with self._lock:
+            if underlying_price:
+                self.underlying_price = float(underlying_price)
+            keys = self._by_code.get(code)
+            if not keys:
+                return None
+            for key in keys:
+                self._update_leg(code, self._legs[key], float(price))
+        return self.evaluate()
+
+    def _update_leg(self, code, leg, price):
+        qty = leg['qty']
+        if price > 0:
+            pnl = (price - leg['cost']) * qty * leg['multiplier']
+        else:
+            pnl = leg['pnl']
+
+        original = self.margin_fetcher.calculate_margin(
+            code, int(abs(qty)), last_price=price, underlying_price=self.underlying_price
+        )
+        maintenance = self.margin_fetcher.calculate_margin(
+            code, int(abs(qty)), last_price=price, underlying_price=self.underlying_price,
+            margin_type='maintenance_margin'
+        )
+        dollar_delta = leg['delta'] * qty * DELTA_POINT_VALUE
+
+        self.total_pnl += pnl - leg['pnl']
+        self.total_original += original - leg['original']
+        self.total_maintenance += maintenance - leg['maintenance']
+        self.dollar_delta += dollar_delta - leg['dollar_delta']
+
+        leg['pnl'] = pnl
+        leg['original'] = original
+        leg['maintenance'] = maintenance
+        leg['dollar_delta'] = dollar_delta
+
+    # ===== 評估 =====
+    def evaluate(self):
+        """計算目前狀態,等級改變時觸發警示"""
+        status = self.get_status()
+        tier = status['tier']
+        if tier != self.tier:
+            previous, self.tier = self.tier, tier
+            level = logging.INFO if tier == NORMAL else logging.WARNING
+            logger.log(level, f"風險等級 {previous} -> {tier}: 權益 {status['equity']:,.0f}, "
+                              f"維持 {status['maintenance']:,.0f}")
+            if self.on_alert:
+                self.on_alert(tier, status)
+        return status
+
+    def get_status(self):
+        """
+        Returns:
+            dict: equity, original, maintenance, ratio, headroom, tier, move_to_call
+                  move_to_call 為標的再變動多少點會跌破維持保證金 (帶正負號,None 表示無方向風險)
+        """
+        with self._lock:
+            has_cash = self.cash is not None
+            equity = (self.cash or 0.0) + self.total_pnl
+            maintenance = self.total_maintenance
+            original = self.total_original
+            dollar_delta = self.dollar_delta
+
+        ratio = equity / maintenance if maintenance > 0 else float('inf')
+        tier = NORMAL
+        for threshold, name in self.tiers:
+            if has_cash and ratio < threshold:
+                tier = name
+                break
+
+        headroom = equity - maintenance
+        move_to_call = None
+        if abs(dollar_delta) > 1e-9:
+            move_to_call = -headroom / dollar_delta
+
+        return {
+            'equity': equity,
+            'original': original,
+            'maintenance': maintenance,
+            'ratio': ratio,
+            'headroom': headroom,
+            'excess': equity - original,
+            'tier': tier,
+            'move_to_call': move_to_call,
+        }
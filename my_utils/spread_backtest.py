@@ -0,0 +1,249 @@
+# my_utils/spread_backtest.py
+"""
+價差轉倉回測模組
+負責載入近月/次月期貨的歷史逐筆資料,以向量化方式一次回測多組價差監測參數
+(target_spread、is_逆價差、多/空倉),比較每筆檢查與每 30 秒輪詢的觸發時間、
+成交價差、相對買賣價的滑價,以及與事後最佳可成交價差的差距;完全離線,不需要券商連線
+
+與 SpreadBook.check 相同,以可成交價差判斷觸發 (點):
+    多單轉倉 (賣近買遠) = 次月賣價 - 近月買價; 空單轉倉 (買近賣遠) = 次月買價 - 近月賣價
+    正價差目標 T: 多單 可成交價差 <= T 觸發 (越小越好); 空單 可成交價差 >= T 觸發
+    逆價差目標 T (近月 - 次月 = T): 門檻改為 -T
+中價差 (次月中價 - 近月中價) 只用來計算滑價
+
+逐筆資料 CSV 欄位: ts, code, price, bid, ask (ts 為 epoch 秒或 YYYY-MM-DD HH:MM:SS[.fff])
+"""
+import csv
+from datetime import datetime
+
+import numpy as np
+
+DEFAULT_POLL_SECONDS = 30.0
+# 每個區塊的 參數組數 x 筆數 上限 (控制布林矩陣的記憶體)
+_MAX_CELLS = 20_000_000
+
+
+def _parse_ts(text):
+    try:
+        return float(text)
+    except ValueError:
+        fmt = '%Y-%m-%d %H:%M:%S.%f' if '.' in text else '%Y-%m-%d %H:%M:%S'
+        return datetime.strptime(text, fmt).timestamp()
+
+
+def load_ticks(path, codes=None):
+    """
+    讀取逐筆資料 CSV
+
+    Returns:
+        dict: code -> {'ts', 'price', 'bid', 'ask'} (依時間排序的 numpy 陣列)
+    """
+    rows = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            code = row['code']
+            if codes is not None and code not in codes:
+                continue
+            price = float(row.get('price') or 0)
+            bid = float(row.get('bid') or price)
+            ask = float(row.get('ask') or price)
+            rows.setdefault(code, []).append((_parse_ts(row['ts']), price, bid, ask))
+
+    ticks = {}
+    for code, data in rows.items():
+        arr = np.array(data, dtype=np.float64)
+        arr = arr[np.argsort(arr[:, 0], kind='stable')]
+        ticks[code] = {'ts': arr[:, 0], 'price': arr[:, 1], 'bid': arr[:, 2], 'ask': arr[:, 3]}
+    return ticks
+
+
+def align(near, far):
+    """
+    將近月、次月資料對齊到合併後的時間軸 (各自沿用最後一筆)
+
+    Returns:
+        dict: ts, near_bid, near_ask, far_bid, far_ask, spread (中價差)
+    """
+    ts = np.union1d(near['ts'], far['ts'])
+    ts = ts[ts >= max(near['ts'][0], far['ts'][0])]
+
+    i = np.searchsorted(near['ts'], ts, side='right') - 1
+    j = np.searchsorted(far['ts'], ts, side='right') - 1
+    book = {
+        'ts': ts,
+        'near_bid': near['bid'][i], 'near_ask': near['ask'][i],
+        'far_bid': far['bid'][j], 'far_ask': far['ask'][j],
+    }
+    book['spread'] = (book['far_bid'] + book['far_ask']) / 2 - (book['near_bid'] + book['near_ask']) / 2
+    return book
+
+
+def _first_true(cond):
+    """每一列第一個 True 的位置,沒有時為 -1"""
+    idx = cond.argmax(axis=1)
+    idx[~cond[np.arange(len(cond)), idx]] = -1
+    return idx
+
+
+def backtest(book, targets, is_逆價差, is_sell, poll_seconds=DEFAULT_POLL_SECONDS):
+    """
+    一次回測多組參數
+
+    Args:
+        book: align() 的結果
+        targets / is_逆價差 / is_sell: 長度相同的陣列 (或可廣播的純量)
+        poll_seconds: 輪詢間隔 (check_spread_monitors 預設 30 秒)
+
+    Returns:
+        dict: 每個鍵都是長度 = 參數組數的陣列
+            tick_index / poll_index    觸發位置 (-1 表示未觸發)
+            tick_time / poll_time      觸發時間
+            tick_fill / poll_fill      成交價差
+            tick_slippage / poll_slippage  成交價差相對中價差的不利點數
+            delay                      輪詢比逐筆晚觸發的秒數
+            missed                     輪詢完全錯過的觸發 (逐筆有、輪詢沒有)
+            regret                     輪詢成交相對整段最佳可成交價差的差距 (點)
+    """
+    targets, is_逆價差, is_sell = np.broadcast_arrays(
+        np.asarray(targets, dtype=np.float64),
+        np.asarray(is_逆價差, dtype=bool),
+        np.asarray(is_sell, dtype=bool),
+    )
+    targets, is_逆價差, is_sell = targets.ravel(), is_逆價差.ravel(), is_sell.ravel()
+
+    ts = book['ts']
+    x = book['spread']
+    # 可成交價差,觸發判斷與成交都以此為準
+    fill_long = book['far_ask'] - book['near_bid']
+    fill_short = book['far_bid'] - book['near_ask']
+
+    # 輪詢時點看到的是當時最後一筆報價
+    poll_times = np.arange(ts[0], ts[-1] + poll_seconds, poll_seconds)
+    poll_idx = np.searchsorted(ts, poll_times, side='right') - 1
+
+    thresholds = np.where(is_逆價差, -targets, targets)
+    n_params = len(targets)
+    tick_index = np.full(n_params, -1, dtype=np.int64)
+    poll_index = np.full(n_params, -1, dtype=np.int64)
+    poll_time = np.full(n_params, np.nan)
+
+    block = max(1, _MAX_CELLS // max(len(x), 1))
+    for start in range(0, n_params, block):
+        k = thresholds[start:start + block, None]
+        sell = is_sell[start:start + block, None]
+        cond = np.where(sell, fill_short[None, :] >= k, fill_long[None, :] <= k)
+        tick_index[start:start + block] = _first_true(cond)
+
+        first_poll = _first_true(cond[:, poll_idx])
+        poll_index[start:start + block] = np.where(first_poll >= 0, poll_idx[first_poll], -1)
+        poll_time[start:start + block] = np.where(first_poll >= 0, poll_times[first_poll], np.nan)
+
+    def _at(index, values):
+        return np.where(index >= 0, values[np.maximum(index, 0)], np.nan)
+
+    def _fill(index):
+        return np.where(is_sell, _at(index, fill_short), _at(index, fill_long))
+
+    tick_fill = _fill(tick_index)
+    poll_fill = _fill(poll_index)
+    tick_mid = _at(tick_index, x)
+    poll_mid = _at(poll_index, x)
+    # 不利方向為正: 多單付出較高價差、空單收到較低價差
+    direction = np.where(is_sell, -1.0, 1.0)
+
+    best = np.where(is_sell, fill_short.max(), fill_long.min())
+    tick_time = _at(tick_index, ts)
+
+    return {
+        'target': targets,
+        'is_逆價差': is_逆價差,
+        'is_sell': is_sell,
+        'tick_index': tick_index,
+        'poll_index': poll_index,
+        'tick_time': tick_time,
+        'poll_time': poll_time,
+        'tick_fill': tick_fill,
+        'poll_fill': poll_fill,
+        'tick_slippage': (tick_fill - tick_mid) * direction,
+        'poll_slippage': (poll_fill - poll_mid) * direction,
+        'delay': poll_time - tick_time,
+        'missed': (tick_index >= 0) & (poll_index < 0),
+        'regret': (poll_fill - best) * direction,
+    }
+
+
+def summarize(result):
+    """每組參數一行的文字報表"""
+    lines = [f"{'目標':>6} {'類型':<4} {'方向':<2} {'逐筆觸發':<19} {'成交':>7} {'滑價':>6} "
+             f"{'輪詢觸發':<19} {'成交':>7} {'滑價':>6} {'延遲s':>7} {'距最佳':>6}"]
+
+    def _time(value):
+        return datetime.fromtimestamp(value).strftime('%Y-%m-%d %H:%M:%S') if np.isfinite(value) else '-'
+
+    for i in range(len(result['target'])):
+        lines.append(
+            f"{result['target'][i]:>6.0f} {'逆價差' if result['is_逆價差'][i] else '正價差':<4} "
+            f"{'空' if result['is_sell'][i] else '多':<2} "
+            f"{_time(result['tick_time'][i]):<19} {result['tick_fill'][i]:>7.1f} {result['tick_slippage'][i]:>6.1f} "
+            f"{_time(result['poll_time'][i]):<19} {result['poll_fill'][i]:>7.1f} {result['poll_slippage'][i]:>6.1f} "
+            f"{result['delay'][i]:>7.0f} {result['regret'][i]:>6.1f}"
+        )
+
+    fired = result['tick_index'] >= 0
+    lines.append(
+        f"\n逐筆觸發 {int(fired.sum())}/{len(fired)} 組, 輪詢錯過 {int(result['missed'].sum())} 組, "
+        f"平均輪詢延遲 {np.nanmean(result['delay']) if fired.any() else float('nan'):.1f} 秒"
+    )
+    return '\n'.join(lines)
+
+
+def synthetic_ticks(seconds=5 * 3600, rate=5.0, start=None, seed=0):
+    """產生示範用的近月/次月逐筆資料 (次月 = 近月 + 均值回歸的價差)"""
+    rng = np.random.default_rng(seed)
+    start = start or datetime.now().replace(hour=8, minute=45, second=0, microsecond=0).timestamp()
+    n = int(seconds * rate)
+    ts = start + np.sort(rng.uniform(0, seconds, n))
+
+    near_mid = 22000 + np.cumsum(rng.normal(0, 1.0, n))
+    spread = np.empty(n)
+    spread[0] = -40.0
+    noise = rng.normal(0, 0.6, n)
+    for i in range(1, n):
+        spread[i] = spread[i - 1] + 0.002 * (-40.0 - spread[i - 1]) + noise[i]
+    far_mid = near_mid + spread
+
+    def _book(mid, half):
+        mid = np.round(mid)
+        return {'ts': ts, 'price': mid, 'bid': mid - half, 'ask': mid + half}
+
+    return _book(near_mid, 1.0), _book(far_mid, rng.choice([1.0, 2.0], n))
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="價差轉倉監測參數回測")
+    parser.add_argument('csv', nargs='?', help="逐筆資料 CSV (省略時使用模擬資料)")
+    parser.add_argument('--near', help="近月代碼")
+    parser.add_argument('--far', help="次月代碼")
+    parser.add_argument('--targets', default='-60,-50,-40,-30,-20', help="目標價差,逗號分隔")
+    parser.add_argument('--backwardation', action='store_true', help="目標為逆價差")
+    parser.add_argument('--sell', action='store_true', help="空單轉倉")
+    parser.add_argument('--poll', type=float, default=DEFAULT_POLL_SECONDS, help="輪詢秒數")
+    args = parser.parse_args()
+
+    if args.csv:
+        ticks = load_ticks(args.csv, {args.near, args.far})
+        near, far = ticks[args.near], ticks[args.far]
+    else:
+        near, far = synthetic_ticks()
+
+    started = time.perf_counter()
+    book = align(near, far)
+    targets = [float(t) for t in args.targets.split(',')]
+    result = backtest(book, targets, args.backwardation, args.sell, poll_seconds=args.poll)
+    elapsed = time.perf_counter() - started
+
+    print(summarize(result))
+    print(f"{len(book['ts']):,} 筆 x {len(targets)} 組參數, {elapsed * 1000:.0f} ms")
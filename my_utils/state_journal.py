@@ -0,0 +1,154 @@
+# my_utils/state_journal.py
+"""
+狀態日誌模組
+負責以附加寫入的方式記錄會改變狀態的事件 (價差監測、勾選、訂閱、目標 Delta),
+定期壓縮成快照,當機或重啟後可立即還原
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMPACT_EVERY = 200
+
+
+def _empty_state():
+    return {
+        'monitors': {},       # monitor id -> monitor dict
+        'selected': {},       # code -> bool
+        'subscriptions': [],  # 已訂閱代碼
+        'target_delta': None,
+    }
+
+
+class StateJournal:
+    def __init__(self, journal_file='state_journal.jsonl', snapshot_file='state_snapshot.json',
+                 compact_every=DEFAULT_COMPACT_EVERY):
+        self.journal_file = journal_file
+        self.snapshot_file = snapshot_file
+        self.compact_every = compact_every
+
+        self.state = _empty_state()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    # ===== 還原 =====
+    def restore(self):
+        """
+        載入快照並重播日誌
+
+        Returns:
+            dict: 還原後的狀態
+        """
+        state = _empty_state()
+
+        if os.path.exists(self.snapshot_file):
+            try:
+                with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                    state.update(json.load(f).get('state', {}))
+            except Exception as e:
+                logger.warning(f"載入狀態快照失敗: {e}")
+
+        replayed = 0
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 當機時最後一行可能只寫了一半
+                        continue
+                    self._apply(state, entry['event'], entry.get('data', {}))
+                    replayed += 1
+
+        with self._lock:
+            self.state = state
+            self._pending = replayed
+
+        active = sum(1 for m in state['monitors'].values() if m.get('active', True))
+        logger.info(f"已還原狀態: 監測 {active} 筆, 重播 {replayed} 個事件")
+        return state
+
+    def drop_expired(self, is_expired):
+        """
+        取消合約已過結算日的價差監測 (還原後呼叫,避免對已下市的近月合約轉倉)
+
+        Args:
+            is_expired: code -> bool 的函式 (通常是 SettlementCalendar.is_expired)
+
+        Returns:
+            list: 被取消的監測 (含 id)
+        """
+        with self._lock:
+            monitors = list(self.state['monitors'].items())
+
+        expired = []
+        for monitor_id, monitor in monitors:
+            if is_expired(monitor.get('code', '')):
+                self.record('monitor_expired', id=monitor_id)
+                expired.append(dict(monitor, id=monitor_id))
+        if expired:
+            codes = ', '.join(sorted({m.get('code', '') for m in expired}))
+            logger.warning(f"取消 {len(expired)} 筆合約已到期的價差監測: {codes}")
+        return expired
+
+    # ===== 記錄 =====
+    def record(self, event, **data):
+        """附加一個事件並更新記憶體中的狀態"""
+        line = json.dumps({
+            'ts': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'event': event,
+            'data': data
+        }, ensure_ascii=False)
+
+        with self._lock:
+            self._apply(self.state, event, data)
+            try:
+                with open(self.journal_file, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+            except Exception as e:
+                logger.error(f"寫入狀態日誌失敗: {e}")
+                return
+
+            self._pending += 1
+            if self._pending >= self.compact_every:
+                self._compact()
+
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        """將目前狀態寫成快照並清空日誌"""
+        tmp = self.snapshot_file + '.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'state': self.state
+                }, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_file)
+            open(self.journal_file, 'w', encoding='utf-8').close()
+            self._pending = 0
+        except Exception as e:
+            logger.error(f"壓縮狀態日誌失敗: {e}")
+
+    @staticmethod
+    def _apply(state, event, data):
+        if event == 'monitor_created':
+            state['monitors'][data['id']] = data['monitor']
+        elif event in ('monitor_triggered', 'monitor_cancelled', 'monitor_expired'):
+            state['monitors'].pop(data['id'], None)
+        elif event == 'selection':
+            state['selected'][data['code']] = data['selected']
+        elif event == 'subscriptions':
+            state['subscriptions'] = list(data['codes'])
+        elif event == 'target_delta':
+            state['target_delta'] = data['value']
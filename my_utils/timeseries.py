@@ -0,0 +1,171 @@
+# my_utils/timeseries.py
+"""
+盤中走勢模組
+負責以固定大小的 NumPy 環狀緩衝區記錄總損益、淨 Delta、保證金 (最高 10 Hz),
+容量涵蓋一個日盤加夜盤,不論程式開多久記憶體都固定;
+繪圖時以 LTTB 降採樣到數百點
+"""
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_FIELDS = ('pnl', 'delta', 'margin')
+DEFAULT_HZ = 10
+# 日盤 08:45-13:45 (5 小時) + 夜盤 15:00-05:00 (14 小時)
+SESSION_HOURS = 19
+
+
+class TimeSeriesSampler:
+    def __init__(self, fields=DEFAULT_FIELDS, hz=DEFAULT_HZ, hours=SESSION_HOURS):
+        """
+        Args:
+            fields: 欄位名稱
+            hz: 最高取樣頻率
+            hours: 緩衝區涵蓋的時數 (以最高頻率計算)
+        """
+        self.fields = tuple(fields)
+        self.interval = 1.0 / hz
+        self.capacity = int(hz * hours * 3600)
+
+        self._times = np.zeros(self.capacity, dtype=np.float64)
+        self._values = np.zeros((self.capacity, len(self.fields)), dtype=np.float32)
+        self._count = 0  # 累計寫入筆數,寫入位置為 _count % capacity
+        self._last = None
+        self._lock = threading.Lock()
+
+    def record(self, values, ts=None):
+        """
+        記錄一筆取樣;距上一筆不到取樣間隔,或數值完全相同時略過
+
+        Args:
+            values: dict (欄位 -> 數值) 或依 fields 順序的序列
+            ts: 時間戳 (秒),預設為現在
+
+        Returns:
+            bool: 是否寫入
+        """
+        ts = time.time() if ts is None else ts
+        if isinstance(values, dict):
+            row = tuple(float(values.get(f, 0.0)) for f in self.fields)
+        else:
+            row = tuple(float(v) for v in values)
+
+        with self._lock:
+            if self._last is not None:
+                last_ts, last_row = self._last
+                if ts - last_ts < self.interval or row == last_row:
+                    return False
+
+            index = self._count % self.capacity
+            self._times[index] = ts
+            self._values[index] = row
+            self._count += 1
+            self._last = (ts, row)
+        return True
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def clear(self):
+        with self._lock:
+            self._count = 0
+            self._last = None
+
+    def _segments(self, since=None):
+        """
+        依時間排序的緩衝區範圍 (呼叫端需持有鎖),以 searchsorted 直接在緩衝區上截掉 since 之前的資料
+
+        Returns:
+            list: [(起, 迄)],環狀緩衝區繞回時為兩段
+        """
+        n = min(self._count, self.capacity)
+        start = self._count % self.capacity if self._count > self.capacity else 0
+        bounds = [(0, n)] if start == 0 else [(start, self.capacity), (0, start)]
+        if since is None:
+            return bounds
+
+        trimmed = []
+        for lo, hi in bounds:
+            lo += int(np.searchsorted(self._times[lo:hi], since))
+            if lo < hi:
+                trimmed.append((lo, hi))
+        return trimmed
+
+    def get(self, since=None):
+        """
+        取出依時間排序的資料 (複本,只複製 since 之後的部分)
+
+        Args:
+            since: 只取此時間戳之後的資料
+
+        Returns:
+            tuple: (times, values),values 形狀為 (筆數, 欄位數)
+        """
+        with self._lock:
+            bounds = self._segments(since)
+            return _gather(self._times, bounds), _gather(self._values, bounds)
+
+    def get_series(self, field, since=None, max_points=None):
+        """
+        取出單一欄位,指定 max_points 時以 LTTB 降採樣
+
+        Returns:
+            tuple: (times, values) 一維陣列
+        """
+        column = self.fields.index(field)
+        with self._lock:
+            bounds = self._segments(since)
+            times = _gather(self._times, bounds)
+            series = _gather(self._values[:, column], bounds).astype(np.float64)
+        if max_points:
+            return lttb(times, series, max_points)
+        return times, series
+
+
+def _gather(array, bounds):
+    """將緩衝區的範圍依序複製成連續陣列"""
+    if not bounds:
+        return array[:0].copy()
+    return np.concatenate([array[lo:hi] for lo, hi in bounds])
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets 降採樣
+
+    保留首尾兩點,其餘每個區間挑出與前一個選點、下一區間平均點
+    所形成三角形面積最大的點,能保留高低點的形狀
+
+    Returns:
+        tuple: (x, y) 最多 threshold 點
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+
+        next_start = end
+        next_end = min(int((i + 2) * every) + 1, n)
+        if next_end <= next_start:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return x[selected], y[selected]
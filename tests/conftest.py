@@ -0,0 +1,23 @@
+# tests/conftest.py
+"""
+測試共用設定
+backend/__init__ 會載入需要 Shioaji 的 TradingBackend;沒有安裝時改以套件路徑載入,
+讓不依賴 Shioaji 的子模組 (snapshot_service、stream_server...) 仍可單獨測試
+"""
+import importlib
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+try:
+    importlib.import_module('backend')
+except ImportError:
+    for name in [m for m in sys.modules if m == 'backend' or m.startswith('backend.')]:
+        del sys.modules[name]
+    package = types.ModuleType('backend')
+    package.__path__ = [os.path.join(ROOT, 'backend')]
+    sys.modules['backend'] = package
@@ -0,0 +1,162 @@
+# tests/test_account_aggregator.py
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from backend.account_aggregator import AccountAggregator
+from backend.position_book import PositionBook
+from my_utils.pretrade_check import PreTradeChecker
+from my_utils.risk_engine import RiskEngine
+
+TXF_MARGIN = 184000
+
+
+class FakeMarginFetcher:
+    def calculate_margin(self, code, quantity, last_price=0, underlying_price=0, margin_type='original_margin'):
+        return TXF_MARGIN * quantity
+
+    def _get_multiplier(self, code):
+        return 200
+
+
+def _row(account, direction, qty, price=22000):
+    sign = 1 if direction == 'Buy' else -1
+    return {'code': 'TXFK6', 'account': account, 'direction': direction, 'quantity': qty,
+            'price': price, 'last_price': price, 'est_delta': 1.0 * sign}
+
+
+class FakeBackend:
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.release = threading.Event()
+        accounts = [SimpleNamespace(account_id='1111111', broker_id='F002000', account_type='F'),
+                    SimpleNamespace(account_id='2222222', broker_id='F002000', account_type='F')]
+        self.api = SimpleNamespace(
+            list_accounts=lambda: accounts,
+            futopt_account=accounts[0],
+            margin=lambda account: SimpleNamespace(equity=1_000_000.0, initial_margin=0,
+                                                   maintenance_margin=0, available_margin=0),
+        )
+
+    def get_positions(self, account=None):
+        if self.delays.get(account.account_id):
+            self.release.wait(self.delays[account.account_id])
+        direction = 'Buy' if account.account_id == '1111111' else 'Sell'
+        return [_row('', direction, 1)]
+
+
+def _aggregator(backend, timeout=2.0):
+    return AccountAggregator(backend, accounts=[('主帳戶', '1111111'), ('避險', 'F002000-2222222')],
+                             timeout=timeout)
+
+
+def test_start_and_poll_do_not_block():
+    backend = FakeBackend(delays={'2222222': 5})
+    aggregator = _aggregator(backend)
+    started = time.perf_counter()
+    assert aggregator.start()
+    assert aggregator.poll() is None
+    assert time.perf_counter() - started < 0.5
+
+    backend.release.set()
+    deadline = time.monotonic() + 5
+    positions = None
+    while positions is None and time.monotonic() < deadline:
+        positions = aggregator.poll()
+        time.sleep(0.01)
+    assert sorted((p['account'], p['direction']) for p in positions) == [('主帳戶', 'Buy'), ('避險', 'Sell')]
+    assert aggregator.poll() is None  # 這一輪已取走
+    aggregator.shutdown()
+
+
+def test_slow_account_times_out_with_previous_data():
+    backend = FakeBackend()
+    aggregator = _aggregator(backend, timeout=0.2)
+    assert len(aggregator.get_positions()) == 2
+
+    backend.delays = {'2222222': 5}
+    positions = aggregator.get_positions()
+    assert [p['account'] for p in positions] == ['主帳戶', '避險']
+    assert aggregator.results['避險']['stale']
+    backend.release.set()
+    aggregator.shutdown()
+
+
+def test_single_account_uses_backend_directly():
+    backend = SimpleNamespace(get_positions=lambda: [{'code': 'TXFK6'}])
+    aggregator = AccountAggregator(backend)
+    assert not aggregator.start()
+    assert aggregator.get_positions() == [{'code': 'TXFK6', 'account': ''}]
+    assert aggregator.account_name({'account_id': '1111111'}) == ''
+    assert aggregator.default_name() == ''
+
+
+def test_account_names_for_fills_and_orders():
+    aggregator = _aggregator(FakeBackend())
+    aggregator.get_positions()
+    assert aggregator.account_name({'account_id': '2222222', 'code': 'TXFK6'}) == '避險'
+    assert aggregator.account_name({'account': {'account_id': '1111111'}}) == '主帳戶'
+    assert aggregator.account_name({'account_id': '9999999'}) == ''
+    assert aggregator.default_name() == '主帳戶'
+    aggregator.shutdown()
+
+
+# ===== 不跨帳戶合併 =====
+HEDGED = [_row('主帳戶', 'Buy', 2, price=21900), _row('避險', 'Sell', 2, price=22100)]
+
+
+def test_risk_engine_keeps_each_account_margin():
+    engine = RiskEngine(FakeMarginFetcher(), multiplier_lookup=lambda code: 200)
+    engine.load(HEDGED, underlying_price=22000)
+    # 兩個帳戶各自收保證金,不因多空相抵而為 0
+    assert engine.total_original == pytest.approx(4 * TXF_MARGIN)
+    assert engine.dollar_delta == pytest.approx(0)
+
+    engine.on_price('TXFK6', 22050)
+    # 多方 (22050 - 21900) x 2 x 200,空方 (22100 - 22050) x 2 x 200
+    assert engine.total_pnl == pytest.approx(150 * 400 + 50 * 400)
+
+
+def test_pretrade_checks_order_against_its_account():
+    checker = PreTradeChecker(FakeMarginFetcher(), limits={'max_lots': 5})
+    checker.load(HEDGED, underlying_price=22000)
+    assert checker.total_margin == pytest.approx(4 * TXF_MARGIN)
+
+    # 主帳戶賣出是減倉,口數與保證金下降
+    closing = checker.check([{'code': 'TXFK6', 'action': 'Sell', 'quantity': 2, 'account': '主帳戶'}])
+    assert closing['level'] == 'ok'
+    assert closing['margin'] == pytest.approx(2 * TXF_MARGIN)
+
+    # 避險帳戶再賣出是加倉: 兩帳戶合計 6 口超過上限 (跨帳戶合併會誤算成 2 口)
+    adding = checker.check([{'code': 'TXFK6', 'action': 'Sell', 'quantity': 2, 'account': '避險'}])
+    assert adding['margin'] == pytest.approx(6 * TXF_MARGIN)
+    assert adding['level'] == 'reject'
+    assert any('口數' in m for m in adding['messages'])
+
+
+def test_position_book_tracks_cost_per_account():
+    book = PositionBook(multiplier_lookup=lambda code: 200)
+    book.load(HEDGED)
+    assert book.get('TXFK6', '主帳戶') == {'qty': 2.0, 'avg_cost': 21900.0, 'realized_pnl': 0.0}
+    assert book.get('TXFK6', '避險') == {'qty': -2.0, 'avg_cost': 22100.0, 'realized_pnl': 0.0}
+
+    book.apply_deal({'code': 'TXFK6', 'account': '避險', 'action': 'Buy', 'quantity': 1,
+                     'price': 22000, 'trade_id': 't1'})
+    assert book.get('TXFK6', '避險')['qty'] == -1.0
+    assert book.get('TXFK6', '避險')['realized_pnl'] == pytest.approx(100 * 200)
+    assert book.get('TXFK6', '主帳戶')['qty'] == 2.0
+    assert book.get_codes() == ['TXFK6']
+
+
+def test_unresolved_accounts_fall_back_to_default_account(caplog):
+    backend = FakeBackend()
+    backend.api.list_accounts = lambda: []
+    backend.get_positions = lambda account=None: [{'code': 'TXFK6'}] if account is None else []
+    aggregator = _aggregator(backend)
+    with caplog.at_level('ERROR', logger='backend.account_aggregator'):
+        assert not aggregator.start()
+        assert aggregator.get_positions() == [{'code': 'TXFK6', 'account': ''}]
+    assert any('找不到' in r.getMessage() for r in caplog.records)
+    aggregator.shutdown()
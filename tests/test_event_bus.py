@@ -0,0 +1,164 @@
+# tests/test_event_bus.py
+import threading
+from types import SimpleNamespace
+
+from my_utils.event_bus import FILL, TICK, EventBus
+
+
+class FakeWidget:
+    """模擬 Tk 元件: after 只排入佇列,由測試在主執行緒 run() 時執行"""
+
+    def __init__(self):
+        self.queue = []
+        self.delays = []
+        self.bindings = []
+        self.destroyed = False
+        self._lock = threading.Lock()
+
+    def after(self, delay_ms, func, *args):
+        if self.destroyed:
+            raise RuntimeError('invalid command name')
+        with self._lock:
+            self.delays.append(delay_ms)
+            self.queue.append((func, args))
+
+    def bind(self, sequence, func, add=None):
+        self.bindings.append((sequence, func))
+
+    def run(self):
+        while True:
+            with self._lock:
+                if not self.queue:
+                    return
+                func, args = self.queue.pop(0)
+            func(*args)
+
+    def destroy(self):
+        self.destroyed = True
+        for sequence, func in self.bindings:
+            if sequence == '<Destroy>':
+                func(SimpleNamespace(widget=self))
+
+
+def _recorder():
+    events = []
+
+    def callback(topic, code, payload):
+        events.append((topic, code, payload, threading.current_thread()))
+    return events, callback
+
+
+def test_filter_by_topic_and_code():
+    bus = EventBus()
+    events, callback = _recorder()
+    sub = bus.subscribe(TICK, callback, codes=['TXFK6'])
+    everything, all_callback = _recorder()
+    bus.subscribe(TICK, all_callback)
+
+    bus.publish(TICK, 'TXFK6', 1)
+    bus.publish(TICK, 'MXFK6', 2)
+    bus.publish(FILL, 'TXFK6', 3)
+    assert [(t, c, p) for t, c, p, _ in events] == [(TICK, 'TXFK6', 1)]
+    assert [p for _, _, p, _ in everything] == [1, 2]
+
+    sub.set_codes(['MXFK6'])
+    bus.publish(TICK, 'TXFK6', 4)
+    bus.publish(TICK, 'MXFK6', 5)
+    assert [p for _, _, p, _ in events] == [1, 5]
+
+    sub.unsubscribe()
+    bus.publish(TICK, 'MXFK6', 6)
+    assert len(events) == 2
+    assert bus._by_code == {}
+
+
+def test_coalesce_keeps_latest_payload_per_code():
+    bus = EventBus()
+    widget = FakeWidget()
+    events, callback = _recorder()
+    bus.subscribe(TICK, callback, widget=widget, coalesce=True, interval_ms=100)
+
+    for price in (100, 101, 102):
+        bus.publish(TICK, 'TXFK6', price)
+    bus.publish(TICK, 'MXFK6', 200)
+    # 同一間隔只排一次 after
+    assert widget.delays == [100]
+    assert events == []
+
+    widget.run()
+    assert sorted((c, p) for _, c, p, _ in events) == [('MXFK6', 200), ('TXFK6', 102)]
+
+    bus.publish(TICK, 'TXFK6', 103)
+    assert widget.delays == [100, 100]
+    widget.run()
+    assert events[-1][1:3] == ('TXFK6', 103)
+
+
+def test_without_coalesce_every_event_is_delivered_in_order():
+    bus = EventBus()
+    widget = FakeWidget()
+    events, callback = _recorder()
+    bus.subscribe(FILL, callback, widget=widget)
+    for i in range(3):
+        bus.publish(FILL, 'TXFK6', i)
+    assert widget.delays == [0, 0, 0]
+    widget.run()
+    assert [p for _, _, p, _ in events] == [0, 1, 2]
+
+
+def test_events_from_worker_threads_run_on_widget_thread():
+    bus = EventBus()
+    widget = FakeWidget()
+    events, callback = _recorder()
+    bus.subscribe(TICK, callback, widget=widget, coalesce=True)
+    codes = ['TXFK6', 'MXFK6', 'TXO22000K6', 'TXO22000W6']
+
+    def worker(code):
+        for price in range(500):
+            bus.publish(TICK, code, price)
+
+    threads = [threading.Thread(target=worker, args=(code,)) for code in codes]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert events == []  # 背景執行緒不直接呼叫 callback
+
+    widget.run()
+    main = threading.current_thread()
+    assert all(thread is main for *_, thread in events)
+    latest = {c: p for _, c, p, _ in events}
+    assert latest == {code: 499 for code in codes}
+    assert len(events) <= len(widget.delays) * len(codes)
+
+
+def test_destroyed_widget_unsubscribes():
+    bus = EventBus()
+    widget = FakeWidget()
+    events, callback = _recorder()
+    sub = bus.subscribe(TICK, callback, widget=widget)
+    bus.publish(TICK, 'TXFK6', 1)
+    widget.destroy()
+    assert not sub.active
+    widget.run()  # 關閉前已排入的事件不再呼叫
+    assert events == []
+
+    # 沒有收到 <Destroy> 但 after 失敗時也會取消
+    other = FakeWidget()
+    sub = bus.subscribe(TICK, callback, widget=other)
+    other.destroyed = True
+    bus.publish(TICK, 'TXFK6', 2)
+    assert not sub.active
+
+
+def test_callback_errors_do_not_stop_other_subscribers():
+    bus = EventBus()
+    events, callback = _recorder()
+
+    def broken(topic, code, payload):
+        raise ValueError('boom')
+
+    bus.subscribe(TICK, broken)
+    bus.subscribe(TICK, callback)
+    bus.publish(TICK, 'TXFK6', 1)
+    assert len(events) == 1
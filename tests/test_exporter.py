@@ -0,0 +1,93 @@
+# tests/test_exporter.py
+import os
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+
+from my_utils.exporter import ColumnarExporter
+
+TAIPEI = timezone(timedelta(hours=8))
+# 08:45 台北時間 = 前一天 UTC 00:45;夜盤跨午夜分成兩個分區
+OPEN = datetime(2026, 10, 19, 8, 45, tzinfo=TAIPEI)
+NIGHT = datetime(2026, 10, 19, 23, 59, 59, tzinfo=TAIPEI)
+
+
+def _files(root):
+    return sorted(os.path.relpath(os.path.join(d, f), root) for d, _, files in os.walk(root) for f in files)
+
+
+@pytest.fixture
+def exporter(tmp_path):
+    exporter = ColumnarExporter(str(tmp_path), flush_seconds=0.05, batch_size=10)
+    exporter.start()
+    yield exporter
+    exporter.stop()
+
+
+def test_round_trip_keeps_taipei_time_and_date_partitions(exporter, tmp_path):
+    for i, ts in enumerate((OPEN, NIGHT, NIGHT + timedelta(seconds=2))):
+        exporter.record_tick('TXFK6', SimpleNamespace(datetime=ts, close=22000 + i, volume=1, total_volume=i))
+    exporter.record_positions([{'code': 'TXFK6', 'account': '主帳戶', 'direction': 'Action.Buy',
+                                'quantity': 2, 'price': 22000, 'last_price': 22001}], ts=OPEN)
+    exporter.record_risk(1000, 2.0, 368000, {'equity': 1e6, 'maintenance': 282000, 'ratio': 3.5,
+                                              'tier': 'normal'}, ts=OPEN)
+    exporter.stop()
+
+    ticks = pq.read_table(str(tmp_path / 'ticks')).sort_by('total_volume')
+    assert ticks.schema.field('ts').type.tz == 'Asia/Taipei'
+    assert ticks['ts'].to_pylist() == [OPEN, NIGHT, NIGHT + timedelta(seconds=2)]
+    assert ticks['ts'][0].as_py().astimezone(TAIPEI).hour == 8
+    assert [str(d) for d in ticks['date'].to_pylist()] == ['2026-10-19', '2026-10-19', '2026-10-20']
+    assert ticks['close'].to_pylist() == [22000, 22001, 22002]
+
+    positions = pq.read_table(str(tmp_path / 'positions')).to_pylist()
+    assert positions[0]['account'] == '主帳戶'
+    assert positions[0]['direction'] == 'Buy'
+    risk = pq.read_table(str(tmp_path / 'risk')).to_pylist()
+    assert risk[0]['tier'] == 'normal'
+    assert exporter.written == {'ticks': 3, 'positions': 1, 'risk': 1}
+
+
+def test_files_being_written_are_hidden_from_readers(exporter, tmp_path):
+    exporter.record_tick('TXFK6', SimpleNamespace(datetime=OPEN, close=22000, volume=1, total_volume=1))
+    deadline = datetime.now() + timedelta(seconds=5)
+    while not exporter.written['ticks'] and datetime.now() < deadline:
+        exporter._stop.wait(0.02)
+
+    # 檔案仍在寫入中: 只有隱藏的 .tmp 檔,讀取整個目錄不會失敗
+    files = _files(tmp_path / 'ticks')
+    assert len(files) == 1 and os.path.basename(files[0]).startswith('.part-')
+    assert ds.dataset(str(tmp_path / 'ticks'), format='parquet', partitioning='hive').count_rows() == 0
+
+    exporter.stop()
+    files = _files(tmp_path / 'ticks')
+    assert len(files) == 1 and os.path.basename(files[0]).startswith('part-')
+    assert pq.read_table(str(tmp_path / 'ticks')).num_rows == 1
+
+
+def test_leftover_tmp_from_crash_does_not_break_reads(tmp_path):
+    partition = tmp_path / 'ticks' / 'date=2026-10-19'
+    partition.mkdir(parents=True)
+    (partition / '.part-084500-123.parquet.tmp').write_bytes(b'PAR1 truncated')
+
+    exporter = ColumnarExporter(str(tmp_path))
+    exporter.start()
+    exporter.record_tick('TXFK6', SimpleNamespace(datetime=OPEN, close=22000, volume=1, total_volume=1))
+    exporter.stop()
+    assert pq.read_table(str(tmp_path / 'ticks')).num_rows == 1
+
+
+def test_arrow_format_round_trip(tmp_path):
+    import pyarrow as pa
+
+    exporter = ColumnarExporter(str(tmp_path), fmt='arrow')
+    exporter.start()
+    exporter.record_risk(-500, -1.0, 184000, ts=OPEN)
+    exporter.stop()
+    (path,) = _files(tmp_path / 'risk')
+    table = pa.ipc.open_file(str(tmp_path / 'risk' / path)).read_all()
+    assert table['ts'].to_pylist() == [OPEN]
+    assert table['pnl'].to_pylist() == [-500]
@@ -0,0 +1,179 @@
+# tests/test_feed_watchdog.py
+from backend.feed_watchdog import FeedWatchdog
+from backend.subscription_manager import QUOTE_BIDASK, QUOTE_TICK
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeSubscriptions:
+    def __init__(self, ticks=(), bidasks=()):
+        self.codes = {QUOTE_TICK: list(ticks), QUOTE_BIDASK: list(bidasks)}
+        self.resubscribed = []
+
+    def get_codes(self, quote_type=None):
+        return self.codes[quote_type]
+
+    def resubscribe(self, codes, quote_type=QUOTE_TICK):
+        self.resubscribed.append((quote_type, sorted(codes)))
+        return len(codes)
+
+
+class FakeSessionClock:
+    def __init__(self):
+        self.open = True
+
+    def is_open(self, now=None):
+        return self.open
+
+
+class FakeSnapshots:
+    def get_snapshots(self, codes, max_age=None):
+        return {code: {'code': code, 'close': 100} for code in codes}
+
+
+def _watchdog(subscriptions, clock, **kwargs):
+    options = dict(grace=0, min_stall=10, idle_stall=60, feed_stall=20, stall_factor=8, cooldown=30)
+    options.update(kwargs)
+    return FeedWatchdog(subscriptions, clock=clock, **options)
+
+
+def _feed(watchdog, clock, codes, interval, count, quote_type=QUOTE_TICK):
+    for _ in range(count):
+        clock.advance(interval)
+        for code in codes:
+            watchdog.on_tick(code, quote_type)
+
+
+def test_stall_limit_follows_each_code_tick_rate():
+    clock = FakeClock()
+    subscriptions = FakeSubscriptions(ticks=['FAST', 'SLOW'])
+    watchdog = _watchdog(subscriptions, clock, feed_stall=1000)
+    for i in range(40):
+        clock.advance(1)
+        watchdog.on_tick('FAST')
+        if i % 8 == 7:
+            watchdog.on_tick('SLOW')
+    # FAST 每秒、SLOW 每 8 秒一筆: 停滯門檻分別為 min_stall (10 秒) 與 8 x 8 秒
+    assert watchdog._interval[('FAST', QUOTE_TICK)] == 1
+    assert watchdog._interval[('SLOW', QUOTE_TICK)] == 8
+    assert watchdog.check() == set()
+
+    clock.advance(11)
+    assert watchdog.check() == {'FAST'}
+    clock.advance(54)
+    assert watchdog.check() == {'FAST', 'SLOW'}
+
+    watchdog.on_tick('FAST')
+    assert watchdog.check() == {'SLOW'}
+
+
+def test_grace_period_after_open():
+    clock = FakeClock()
+    session = FakeSessionClock()
+    subscriptions = FakeSubscriptions(ticks=['TXFK6'])
+    watchdog = _watchdog(subscriptions, clock, session_clock=session, grace=60)
+    _feed(watchdog, clock, ['TXFK6'], 1, 10)
+
+    session.open = False
+    clock.advance(3600)
+    assert watchdog.check() == set()
+
+    # 開盤後的寬限期內不判斷停滯 (收盤前的最後報價不算停滯)
+    session.open = True
+    assert watchdog.check() == set()
+    clock.advance(59)
+    assert watchdog.check() == set()
+    clock.advance(2)
+    assert watchdog.check() == {'TXFK6'}
+    assert len(subscriptions.resubscribed) == 1
+
+    # 寬限期內收到報價的代碼從報價時間起算
+    session.open = False
+    watchdog.check()
+    session.open = True
+    watchdog.check()
+    clock.advance(55)
+    watchdog.on_tick('TXFK6')
+    clock.advance(6)
+    assert watchdog.check() == set()
+
+
+def test_idle_code_never_quoted():
+    clock = FakeClock()
+    subscriptions = FakeSubscriptions(ticks=['TXO30000K6'])
+    watchdog = _watchdog(subscriptions, clock)
+    assert watchdog.check() == set()
+    clock.advance(59)
+    assert watchdog.check() == set()
+    clock.advance(2)
+    assert watchdog.check() == {'TXO30000K6'}
+
+
+def test_resubscribe_cooldown_doubles_until_a_tick_arrives():
+    clock = FakeClock()
+    subscriptions = FakeSubscriptions(ticks=['TXFK6'])
+    watchdog = _watchdog(subscriptions, clock, feed_stall=10_000)
+    _feed(watchdog, clock, ['TXFK6'], 1, 10)
+
+    times = []
+    for _ in range(300):
+        clock.advance(1)
+        before = len(subscriptions.resubscribed)
+        watchdog.check()
+        if len(subscriptions.resubscribed) > before:
+            times.append(clock.now)
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    # 冷卻時間 30 秒起每次加倍 (判斷為嚴格大於,所以多 1 秒)
+    assert gaps == [31, 61, 121]
+    assert subscriptions.resubscribed[0] == (QUOTE_TICK, ['TXFK6'])
+
+    # 收到報價後冷卻時間重置: 再次停滯時立即重新訂閱
+    watchdog.on_tick('TXFK6')
+    watchdog.check()
+    limit = max(watchdog.min_stall, watchdog.stall_factor * watchdog._interval[('TXFK6', QUOTE_TICK)])
+    clock.advance(limit + 1)
+    assert watchdog.check() == {'TXFK6'}
+    assert len(subscriptions.resubscribed) == len(times) + 1
+
+
+def test_whole_feed_stall_resubscribes_every_code():
+    clock = FakeClock()
+    subscriptions = FakeSubscriptions(bidasks=['A', 'B', 'C'])
+    watchdog = _watchdog(subscriptions, clock, feed_stall=5)
+    watchdog.min_stall = 1000
+    _feed(watchdog, clock, ['A', 'B', 'C'], 0.5, 20, QUOTE_BIDASK)
+    assert watchdog.check() == set()
+    clock.advance(6)
+    assert watchdog.check() == {'A', 'B', 'C'}
+    assert subscriptions.resubscribed == [(QUOTE_BIDASK, ['A', 'B', 'C'])]
+
+
+def test_on_stale_called_only_when_set_changes_and_backfills():
+    clock = FakeClock()
+    subscriptions = FakeSubscriptions(ticks=['TXFK6', 'MXFK6'])
+    changes, backfills = [], []
+    watchdog = _watchdog(subscriptions, clock, feed_stall=10_000, snapshots=FakeSnapshots(),
+                         on_stale=changes.append, on_backfill=backfills.append)
+    _feed(watchdog, clock, ['TXFK6', 'MXFK6'], 1, 5)
+
+    watchdog.check()
+    assert changes == []
+    clock.advance(11)
+    watchdog.on_tick('MXFK6')
+    watchdog.check()
+    watchdog.check()
+    assert changes == [{'TXFK6'}]
+    assert backfills == [{'code': 'TXFK6', 'close': 100}]
+
+    watchdog.on_tick('TXFK6')
+    watchdog.check()
+    assert changes == [{'TXFK6'}, set()]
@@ -0,0 +1,45 @@
+# tests/test_logger.py
+import logging
+import multiprocessing as mp
+
+import pytest
+
+from my_utils.logger import setup_logging, shutdown_logging
+
+
+@pytest.fixture
+def logging_setup():
+    yield
+    shutdown_logging()
+
+
+def _child(log_file):
+    setup_logging(log_file=log_file, console=False)
+    logging.getLogger('backend.engine').warning("引擎子行程")
+    shutdown_logging()
+
+
+def test_forked_child_writes_its_own_log(tmp_path, logging_setup):
+    setup_logging(log_file=str(tmp_path / 'trading.log'), console=False)
+    engine_log = tmp_path / 'logs' / 'engine.log'
+
+    process = mp.get_context('fork').Process(target=_child, args=(str(engine_log),))
+    process.start()
+    process.join(timeout=10)
+    assert process.exitcode == 0
+    assert "引擎子行程" in engine_log.read_text(encoding='utf-8')
+
+
+def test_rate_limited_records_are_dropped(tmp_path, logging_setup):
+    log_file = tmp_path / 'trading.log'
+    setup_logging(log_file=str(log_file), console=False)
+    log = logging.getLogger('backend.test')
+    for i in range(3):
+        log.warning(f"報價延遲 {i}", extra={'rate_key': 'test.lag'})
+    log.warning("其他訊息")
+    shutdown_logging()
+
+    text = log_file.read_text(encoding='utf-8')
+    assert "報價延遲 0" in text
+    assert "報價延遲 1" not in text
+    assert "其他訊息" in text
@@ -0,0 +1,93 @@
+# tests/test_margin_fetcher.py
+import json
+import os
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from my_utils.margin_fetcher import MarginFetcher
+
+# 依期交所頁面結構手工建立的精簡表格 (合成資料,不是實際頁面的存檔)
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'taifex')
+
+
+class _FixtureHandler(SimpleHTTPRequestHandler):
+    """期交所頁面路徑沒有副檔名,對應到 fixtures 中的 .html"""
+
+    def translate_path(self, path):
+        return super().translate_path(path) + '.html'
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def taifex_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(_FixtureHandler, directory=FIXTURES))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fetcher(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # 找不到表格時的除錯 HTML 寫在暫存目錄
+    monkeypatch.setenv('NO_PROXY', '127.0.0.1')
+    return MarginFetcher(cache_file=str(tmp_path / 'margin_data.json'))
+
+
+def test_fetch_parses_all_pages(fetcher, taifex_url, tmp_path):
+    ok, message = fetcher.fetch_and_save(base_url=taifex_url)
+    assert ok, message
+
+    contracts = fetcher.margin_data['contracts']
+    assert contracts['臺股期貨'] == {'name': '臺股期貨', 'original_margin': 184000, 'maintenance_margin': 141000}
+    assert '備註' not in contracts
+    assert fetcher.get_option_risk_values() == (86000, 43000, 8600)
+    assert fetcher.get_option_risk_values('maintenance_margin') == (66000, 33000, 6600)
+
+    products = fetcher.margin_data['products']
+    assert products['MXF']['kind'] == 'index_future'
+    assert products['CDF'] == pytest.approx({
+        'name': '台積電', 'kind': 'stock_future', 'underlying': '2330',
+        'original_ratio': 0.135, 'maintenance_ratio': 0.108,
+    })
+    assert 'DVF' not in products  # 沒有比例的列略過
+    assert products['DHO']['a_ratio'] == pytest.approx(0.162)
+    assert products['DHO']['b_ratio'] == pytest.approx(0.081)
+
+    with open(tmp_path / 'margin_data.json', encoding='utf-8') as f:
+        assert json.load(f)['contracts'] == contracts
+
+
+def test_margins_from_fetched_tables(fetcher, taifex_url):
+    fetcher.fetch_and_save(base_url=taifex_url)
+    assert fetcher.calculate_margin('TXFK6', 2) == 2 * 184000
+    assert fetcher.calculate_margin('MXFK6', 1, margin_type='maintenance_margin') == 35250
+    assert fetcher.calculate_margin('CDFK6', 2, last_price=1000) == round(0.135 * 1000 * 2000) * 2
+    # 賣出價外 200 點的買權: 權利金 + max(A - 價外值, B)
+    assert fetcher.calculate_margin('TXO22200K6', 1, last_price=100, underlying_price=22000) == \
+        100 * 50 + (86000 - 200 * 50)
+
+
+def test_failed_page_keeps_cached_data(fetcher, taifex_url):
+    fetcher.fetch_and_save(base_url=taifex_url)
+    before = fetcher.margin_data['products']['CDF']
+
+    pages = {'index': '/cht/5/indexMarging', 'stock_futures': '/cht/5/missing'}
+    ok, message = fetcher.fetch_and_save(base_url=taifex_url, pages=pages)
+    assert ok
+    assert 'stock_futures' in message
+    assert fetcher.margin_data['products']['CDF'] == before
+    assert fetcher.margin_data['products']['DHO']['kind'] == 'stock_option'
+
+
+def test_all_pages_failing_reports_error(fetcher, taifex_url):
+    ok, message = fetcher.fetch_and_save(base_url=taifex_url, pages={'index': '/cht/5/missing'})
+    assert not ok
+    assert 'HTTP 404' in message
+    assert not fetcher.has_data()
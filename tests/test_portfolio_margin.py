@@ -0,0 +1,232 @@
+# tests/test_portfolio_margin.py
+import itertools
+import random
+import time
+
+import pytest
+
+from my_utils.portfolio_margin import PortfolioMargin, max_weight_pairing
+
+A, B, C = 86000, 43000, 8600
+TXF_MARGIN = 184000
+SPOT = 22000
+
+# 計算時間上限 (秒,取三次最佳): 刷新倉位時在背景執行緒計算,需在下一次刷新前完成
+BUDGET_BLOCKS_240 = 0.1
+BUDGET_RANDOM_200 = 0.3
+BUDGET_RANDOM_600 = 2.0
+
+CALL_MONTHS = 'ABCDEFGHIJKL'
+PUT_MONTHS = 'MNOPQRSTUVWX'
+
+
+class FakeMarginFetcher:
+    def get_option_risk_values(self, margin_type='original_margin'):
+        return A, B, C
+
+    def calculate_margin(self, code, quantity, last_price=None, underlying_price=None,
+                         margin_type='original_margin'):
+        return TXF_MARGIN * quantity
+
+
+def _option(product, strike, cp, month, year, direction, price, qty=1):
+    letter = (CALL_MONTHS if cp == 'C' else PUT_MONTHS)[month - 1]
+    return {'code': f'{product}{strike}{letter}{year}', 'direction': direction,
+            'quantity': qty, 'last_price': price}
+
+
+def _short_margin(strike, cp, price):
+    otm = max(strike - SPOT, 0) if cp == 'C' else max(SPOT - strike, 0)
+    return price * 50 + max(A - otm * 50, B)
+
+
+def _compute(positions, **kwargs):
+    return PortfolioMargin(FakeMarginFetcher(), **kwargs).compute(positions, SPOT)
+
+
+def test_time_spread_beats_greedy_vertical():
+    # 貪婪配對會先配 22000/22100 價格價差,讓 22200 與次月 22000 都落單
+    positions = [
+        _option('TXO', 22000, 'C', 1, 6, 'Sell', 300),
+        _option('TXO', 22100, 'C', 1, 6, 'Buy', 250),
+        _option('TXO', 22200, 'C', 1, 6, 'Sell', 200),
+        _option('TXO', 22000, 'C', 2, 6, 'Buy', 400),
+    ]
+    result = _compute(positions)
+    assert result['total'] == pytest.approx(C)
+    assert sorted(c['type'] for c in result['combos']) == sorted(['時間價差', '價格價差'])
+
+
+def test_credit_vertical_is_strike_difference():
+    positions = [
+        _option('TXO', 22000, 'C', 1, 6, 'Sell', 300, qty=3),
+        _option('TXO', 22100, 'C', 1, 6, 'Buy', 250, qty=3),
+    ]
+    result = _compute(positions)
+    assert result['total'] == pytest.approx(3 * 100 * 50)
+    assert result['combos'] == [{'type': '價格價差', 'legs': ('TXO22000A6', 'TXO22100A6'),
+                                 'qty': 3, 'margin': pytest.approx(3 * 100 * 50)}]
+
+
+def test_debit_put_vertical_has_no_margin():
+    positions = [
+        _option('TXO', 21900, 'P', 1, 6, 'Sell', 120),
+        _option('TXO', 22000, 'P', 1, 6, 'Buy', 160),
+    ]
+    assert _compute(positions)['total'] == pytest.approx(0)
+
+
+def test_short_strangle_is_larger_leg_plus_other_premium():
+    positions = [
+        _option('TXO', 22300, 'C', 1, 6, 'Sell', 90),
+        _option('TXO', 21700, 'P', 1, 6, 'Sell', 110),
+    ]
+    call = _short_margin(22300, 'C', 90)
+    put = _short_margin(21700, 'P', 110)
+    assert put > call
+    result = _compute(positions)
+    assert result['total'] == pytest.approx(put + 90 * 50)
+    assert result['combos'][0]['type'] == '勒式'
+
+
+def test_partial_quantities_leave_remainder_standalone():
+    positions = [
+        _option('TXO', 22000, 'C', 1, 6, 'Sell', 300, qty=5),
+        _option('TXO', 22000, 'C', 2, 6, 'Buy', 400, qty=2),
+    ]
+    result = _compute(positions)
+    assert result['total'] == pytest.approx(2 * C + 3 * _short_margin(22000, 'C', 300))
+
+
+def test_futures_calendar_spread_uses_configured_margin():
+    positions = [
+        {'code': 'TXFA6', 'direction': 'Buy', 'quantity': 2, 'last_price': 22000},
+        {'code': 'TXFB6', 'direction': 'Sell', 'quantity': 1, 'last_price': 22010},
+    ]
+    result = _compute(positions, spread_margins={'TXF': 46000})
+    assert result['total'] == pytest.approx(46000 + TXF_MARGIN)
+    assert result['standalone'] == pytest.approx(3 * TXF_MARGIN)
+
+
+def _four_leg_blocks():
+    """60 組互不相干的四腳部位 (到期月份各不相同),每組最低為一個 C 值"""
+    positions = []
+    expiries = itertools.product(('TX1', 'TX2', 'TXO', 'TX4', 'TX5'), range(1, 12, 2), (6, 7))
+    for k, (product, month, year) in enumerate(expiries):
+        base = 20000 + 300 * k
+        positions += [
+            _option(product, base, 'C', month, year, 'Sell', 300),
+            _option(product, base + 100, 'C', month, year, 'Buy', 250),
+            _option(product, base + 200, 'C', month, year, 'Sell', 200),
+            _option(product, base, 'C', month + 1, year, 'Buy', 400),
+        ]
+    return positions
+
+
+def _best_time(positions):
+    best = float('inf')
+    for _ in range(3):
+        started = time.perf_counter()
+        result = _compute(positions)
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def test_hundreds_of_legs_reach_the_per_block_minimum():
+    positions = _four_leg_blocks()
+    assert len(positions) == 240
+    result, elapsed = _best_time(positions)
+    assert result['total'] == pytest.approx(60 * C)
+    assert len(result['combos']) == 120
+    assert elapsed < BUDGET_BLOCKS_240
+
+
+def _random_book(rng, legs):
+    positions = []
+    for _ in range(legs):
+        cp = rng.choice('CP')
+        positions.append(_option(
+            rng.choice(('TXO', 'TX1', 'TX4')), 21000 + 100 * rng.randrange(20), cp,
+            rng.randrange(1, 4), 6, rng.choice(('Buy', 'Sell')), rng.randrange(10, 500),
+            qty=rng.randrange(1, 6)
+        ))
+    return positions
+
+
+@pytest.mark.parametrize('legs, budget', [(200, BUDGET_RANDOM_200), (600, BUDGET_RANDOM_600)])
+def test_large_random_book_is_consistent_and_fast(legs, budget):
+    positions = _random_book(random.Random(7), legs)
+    result, elapsed = _best_time(positions)
+    assert elapsed < budget
+
+    used = {}
+    for combo in result['combos']:
+        for code in combo['legs']:
+            used[code] = used.get(code, 0) + combo['qty']
+    lots = {}
+    for p in positions:
+        lots[p['code']] = lots.get(p['code'], 0) + p['quantity']
+    assert all(used[code] <= lots[code] for code in used)
+    assert 0 <= result['total'] <= result['standalone']
+    assert result['total'] == pytest.approx(result['standalone'] - result['savings'])
+
+
+def test_unchanged_inputs_reuse_the_previous_result():
+    margin = PortfolioMargin(FakeMarginFetcher())
+    positions = _four_leg_blocks()
+    first = margin.compute(positions, SPOT)
+    assert margin.compute([dict(p) for p in positions], SPOT) is first
+
+    moved = [dict(p) for p in positions]
+    moved[0]['last_price'] = 310
+    assert margin.compute(moved, SPOT) is not first
+    assert margin.compute(positions, SPOT + 50) is not first
+
+
+def test_split_rows_of_one_code_are_merged():
+    positions = [
+        _option('TXO', 22000, 'C', 1, 6, 'Sell', 300, qty=2),
+        _option('TXO', 22000, 'C', 1, 6, 'Sell', 300, qty=1),
+        _option('TXO', 22000, 'C', 2, 6, 'Buy', 400, qty=3),
+    ]
+    result = _compute(positions)
+    assert result['total'] == pytest.approx(3 * C)
+    assert result['combos'] == [{'type': '時間價差', 'legs': ('TXO22000A6', 'TXO22000B6'),
+                                 'qty': 3, 'margin': pytest.approx(3 * C)}]
+
+
+def _brute_force(capacities, edges):
+    best = 0.0
+    ranges = [range(min(capacities[i], capacities[j]) + 1) for i, j, _ in edges]
+    for flows in itertools.product(*ranges):
+        used = [0] * len(capacities)
+        for (i, j, _), f in zip(edges, flows):
+            used[i] += f
+            used[j] += f
+        if all(u <= c for u, c in zip(used, capacities)):
+            best = max(best, sum(w * f for (_, _, w), f in zip(edges, flows)))
+    return best
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_pairing_matches_brute_force(seed):
+    rng = random.Random(seed)
+    left, right = rng.randrange(1, 4), rng.randrange(1, 4)
+    capacities = [rng.randrange(1, 3) for _ in range(left + right)]
+    sides = [0] * left + [1] * right
+    pairs = [(i, j) for i in range(left) for j in range(left, left + right)]
+    edges = [(i, j, float(rng.randrange(1, 20))) for i, j in rng.sample(pairs, min(len(pairs), 5))]
+
+    quantities = max_weight_pairing(capacities, sides, edges)
+    used = [0] * len(capacities)
+    for (i, j, _), q in zip(edges, quantities):
+        used[i] += q
+        used[j] += q
+    assert all(u <= c for u, c in zip(used, capacities))
+    total = sum(w * q for (_, _, w), q in zip(edges, quantities))
+    assert total == pytest.approx(_brute_force(capacities, edges))
+
+
+def test_pairing_rejects_same_side_edges():
+    with pytest.raises(ValueError):
+        max_weight_pairing([1, 1], [0, 0], [(0, 1, 5.0)])
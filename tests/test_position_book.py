@@ -0,0 +1,82 @@
+# tests/test_position_book.py
+import pytest
+
+from backend.position_book import PositionBook, deal_code
+
+MULTIPLIERS = {'TXFJ6': 200, 'TXO22000V6': 50}
+
+
+def _book():
+    return PositionBook(multiplier_lookup=lambda code: MULTIPLIERS.get(code, 1))
+
+
+def _deal(action, qty, price, trade_id, code='TXF', delivery_month='202610', **fields):
+    # 與 Shioaji FuturesDeal 相同的欄位
+    return dict({'trade_id': trade_id, 'seqno': trade_id, 'exchange_seq': f'E{trade_id}',
+                 'code': code, 'delivery_month': delivery_month, 'strike_price': 0.0,
+                 'option_right': 'Future', 'action': action, 'quantity': qty, 'price': price}, **fields)
+
+
+def test_deal_code_from_shioaji_fields():
+    assert deal_code(_deal('Buy', 1, 22000, 't1')) == 'TXFJ6'
+    assert deal_code(_deal('Sell', 1, 120, 't2', code='TXO', strike_price=22000.0,
+                           option_right='OptionPut')) == 'TXO22000V6'
+    assert deal_code(_deal('Sell', 1, 80, 't3', code='TX1', strike_price=21950.0,
+                           option_right='OptionCall', delivery_month='202701')) == 'TX121950A7'
+    assert deal_code({'code': 'TXFJ6'}) == 'TXFJ6'
+
+
+def test_live_fill_matches_positions_and_multiplier():
+    book = _book()
+    book.load([{'code': 'TXO22000V6', 'direction': 'Sell', 'quantity': 2, 'price': 150}])
+    code = book.on_order_update('OrderState.FuturesDeal', _deal(
+        'Buy', 1, 100, 't1', code='TXO', strike_price=22000.0, option_right='OptionPut'))
+    assert code == 'TXO22000V6'
+    assert book.get(code) == {'qty': -1.0, 'avg_cost': 150.0, 'realized_pnl': pytest.approx(50 * 50)}
+
+
+def test_adding_updates_average_cost():
+    book = _book()
+    book.apply_deal(_deal('Buy', 1, 22000, 't1'))
+    book.apply_deal(_deal('Buy', 3, 22100, 't2'))
+    assert book.get('TXFJ6') == {'qty': 4.0, 'avg_cost': pytest.approx(22075), 'realized_pnl': 0.0}
+
+
+def test_partial_close_realizes_pnl_and_keeps_cost():
+    book = _book()
+    book.apply_deal(_deal('Buy', 4, 22000, 't1'))
+    book.dirty = False
+    book.apply_deal(_deal('Sell', 1, 22050, 't2'))
+    assert book.get('TXFJ6') == {'qty': 3.0, 'avg_cost': 22000.0, 'realized_pnl': pytest.approx(50 * 200)}
+    assert not book.dirty
+
+    book.apply_deal(_deal('Sell', 3, 21990, 't3'))
+    assert book.get('TXFJ6')['qty'] == 0
+    assert book.get('TXFJ6')['realized_pnl'] == pytest.approx(50 * 200 - 3 * 10 * 200)
+    assert book.dirty  # 平光需要對帳
+    assert book.get_codes() == []
+
+
+def test_reversal_opens_remainder_at_fill_price():
+    book = _book()
+    book.apply_deal(_deal('Sell', 2, 22100, 't1'))
+    book.apply_deal(_deal('Buy', 5, 22000, 't2'))
+    assert book.get('TXFJ6') == {'qty': 3.0, 'avg_cost': 22000.0, 'realized_pnl': pytest.approx(2 * 100 * 200)}
+    assert book.get_realized_pnl() == pytest.approx(2 * 100 * 200)
+
+
+def test_duplicate_deals_are_ignored():
+    book = _book()
+    assert book.apply_deal(_deal('Buy', 1, 22000, 't1')) == 'TXFJ6'
+    assert book.apply_deal(_deal('Buy', 1, 22000, 't1')) is None
+    assert book.on_order_update('OrderState.FuturesOrder', _deal('Buy', 1, 22000, 't2')) is None
+    assert book.get('TXFJ6')['qty'] == 1.0
+
+
+def test_reconcile_reports_mismatch_and_keeps_realized_pnl():
+    book = _book()
+    book.load([{'code': 'TXFJ6', 'direction': 'Buy', 'quantity': 2, 'price': 22000}])
+    book.apply_deal(_deal('Sell', 2, 22010, 't1'))
+    assert book.load([{'code': 'TXFJ6', 'direction': 'Buy', 'quantity': 1, 'price': 22000}]) == ['TXFJ6']
+    assert book.get('TXFJ6')['realized_pnl'] == pytest.approx(2 * 10 * 200)
+    assert not book.needs_reconcile()
@@ -0,0 +1,109 @@
+# tests/test_pretrade_check.py
+import time
+
+import pytest
+
+from my_utils.pretrade_check import OK, REJECT, WARN, PreTradeChecker
+
+TXF_MARGIN = 184000
+MXF_MARGIN = 46000
+
+
+class FakeMarginFetcher:
+    def __init__(self):
+        self.calls = 0
+
+    def calculate_margin(self, code, quantity, last_price=0, underlying_price=0, margin_type='original_margin'):
+        self.calls += 1
+        if code.startswith('TXO'):
+            return (last_price * 50 + 43000) * quantity
+        return (MXF_MARGIN if code.startswith('MXF') else TXF_MARGIN) * quantity
+
+
+def _position(code, direction, qty, delta=1.0, price=22000):
+    sign = 1 if direction == 'Buy' else -1
+    return {'code': code, 'direction': direction, 'quantity': qty, 'last_price': price,
+            'est_delta': delta * sign}
+
+
+def _checker(limits=None, positions=(), equity=None):
+    checker = PreTradeChecker(FakeMarginFetcher(), limits)
+    checker.load(list(positions), underlying_price=22000, equity=equity)
+    return checker
+
+
+def test_order_over_limit_is_rejected():
+    checker = _checker({'max_lots': 5}, [_position('TXFK6', 'Buy', 4)])
+    result = checker.check([{'code': 'TXFK6', 'action': 'Buy', 'quantity': 2}])
+    assert result['level'] == REJECT
+    assert result['margin'] == pytest.approx(6 * TXF_MARGIN)
+    assert result['messages'] == ['TXF 口數 6.00 超過上限 5.00']
+
+
+def test_warn_action_and_warn_ratio():
+    positions = [_position('TXFK6', 'Buy', 4)]
+    result = _checker({'max_lots': 5, 'action': 'warn'}, positions).check(
+        [{'code': 'TXFK6', 'action': 'Buy', 'quantity': 2}])
+    assert result['level'] == WARN
+
+    # 5 口達到上限的 90%,只警告
+    result = _checker({'max_lots': 5}, positions).check([{'code': 'TXFK6', 'action': 'Buy', 'quantity': 1}])
+    assert result['level'] == WARN
+    assert '接近上限' in result['messages'][0]
+
+
+def test_reducing_orders_are_always_allowed():
+    checker = _checker({'max_lots': 1, 'max_delta': 1}, [_position('TXFK6', 'Buy', 4)])
+    result = checker.check([{'code': 'TXFK6', 'action': 'Sell', 'quantity': 2}])
+    assert result['level'] == OK
+    assert result['delta'] == {'TX': pytest.approx(2.0)}
+
+
+def test_roll_checks_delta_and_margin_usage():
+    checker = _checker({'max_delta': 5, 'max_margin_usage': 0.5},
+                       [_position('TXFK6', 'Buy', 2)], equity=1_000_000)
+    roll = [{'code': 'TXFK6', 'action': 'Sell', 'quantity': 2},
+            {'code': 'TXFL6', 'action': 'Buy', 'quantity': 2}]
+    assert checker.check(roll)['level'] == OK
+
+    # 轉倉加碼到 3 口: 保證金使用率 55.2% 超過 50%
+    result = checker.check(roll[:1] + [dict(roll[1], quantity=3)])
+    assert result['level'] == REJECT
+    assert any('保證金使用率' in m for m in result['messages'])
+
+
+def test_cached_aggregates_follow_fills():
+    positions = [_position('TXFK6', 'Buy', 2), _position('MXFK6', 'Sell', 4),
+                 _position('TXO22000K6', 'Sell', 3, delta=0.5, price=100)]
+    checker = _checker(positions=positions)
+    assert checker.total_margin == pytest.approx(2 * TXF_MARGIN + 4 * MXF_MARGIN + 3 * (100 * 50 + 43000))
+    assert checker._delta == {'TX': pytest.approx(2 - 4 * 1.0 - 1.5)}
+
+    checker.set_position('MXFK6', -1)
+    checker.set_position('TXO22000K6', 0)
+    checker.set_position('TXFL6', 1)
+    assert checker.total_margin == pytest.approx(3 * TXF_MARGIN + MXF_MARGIN)
+    assert checker._delta['TX'] == pytest.approx(2 - 1 + 1)
+    assert checker._lots == {'TXF': 3, 'MXF': 1, 'TXO': 0}
+
+    # 增量更新與重新載入的結果一致
+    reloaded = _checker(positions=[_position('TXFK6', 'Buy', 2), _position('MXFK6', 'Sell', 1),
+                                   _position('TXFL6', 'Buy', 1)])
+    assert reloaded.total_margin == pytest.approx(checker.total_margin)
+
+
+def test_check_is_fast_on_a_large_book():
+    positions = [_position(f'TXO{18000 + 50 * i}K6', 'Sell' if i % 2 else 'Buy', 1 + i % 3,
+                           delta=0.3, price=50) for i in range(2000)]
+    checker = _checker({'max_lots': 100000, 'max_delta': 10000, 'max_margin': 10 ** 12}, positions)
+    roll = [{'code': 'TXFK6', 'action': 'Sell', 'quantity': 2},
+            {'code': 'TXFL6', 'action': 'Buy', 'quantity': 2}]
+
+    checker.margin_fetcher.calls = 0
+    started = time.perf_counter()
+    for _ in range(1000):
+        checker.check(roll)
+    per_check = (time.perf_counter() - started) / 1000
+    # 只計算委託的腳位,與部位數量無關
+    assert checker.margin_fetcher.calls == 2 * 1000
+    assert per_check < 0.0005
@@ -0,0 +1,70 @@
+# tests/test_risk_engine.py
+import pytest
+
+from my_utils.risk_engine import RiskEngine, DELTA_POINT_VALUE
+
+TXF_MAINTENANCE = 100_000  # 每口維持保證金
+TXF_ORIGINAL = 130_000
+
+
+class FakeMarginFetcher:
+    def calculate_margin(self, code, quantity, last_price=0, underlying_price=0, margin_type='original_margin'):
+        per_lot = TXF_MAINTENANCE if margin_type == 'maintenance_margin' else TXF_ORIGINAL
+        return per_lot * quantity
+
+    def _get_multiplier(self, code):
+        return 200
+
+
+def _engine(position, cash=400_000):
+    engine = RiskEngine(FakeMarginFetcher(), multiplier_lookup=lambda code: 200)
+    engine.load([position], underlying_price=22000)
+    engine.set_cash(cash)
+    return engine
+
+
+def _txf(direction, qty=2, price=22000):
+    sign = 1 if direction == 'Buy' else -1
+    return {'code': 'TXFK6', 'direction': direction, 'quantity': qty, 'price': price,
+            'last_price': price, 'est_delta': 1.0 * sign}
+
+
+def test_short_leg_is_called_on_a_rise():
+    engine = _engine(_txf('Sell'))
+    status = engine.get_status()
+    # 權益 400,000 - 維持 200,000 = 200,000;每點 -2 口 x 200 = -400
+    assert engine.dollar_delta == pytest.approx(-2 * DELTA_POINT_VALUE)
+    assert status['move_to_call'] == pytest.approx(500)
+
+    status = engine.on_price('TXFK6', 22100)
+    assert status['move_to_call'] == pytest.approx(400)
+
+    status = engine.on_price('TXFK6', 22500)
+    assert status['equity'] == pytest.approx(status['maintenance'])
+    status = engine.on_price('TXFK6', 22510)
+    assert status['tier'] == '追繳'
+
+
+def test_long_leg_is_called_on_a_drop():
+    engine = _engine(_txf('Buy'))
+    assert engine.dollar_delta == pytest.approx(2 * DELTA_POINT_VALUE)
+    assert engine.get_status()['move_to_call'] == pytest.approx(-500)
+
+    status = engine.on_price('TXFK6', 21600)
+    assert status['move_to_call'] == pytest.approx(-100)
+
+
+def test_mini_contract_delta_uses_txf_units():
+    # 小台 1 口 = 0.25 大台口;est_delta 已換算並含方向
+    position = {'code': 'MXFK6', 'direction': 'Sell', 'quantity': 4, 'price': 22000,
+                'last_price': 22000, 'est_delta': -0.25}
+    engine = RiskEngine(FakeMarginFetcher(), multiplier_lookup=lambda code: 50)
+    engine.load([position], underlying_price=22000)
+    assert engine.dollar_delta == pytest.approx(-4 * 0.25 * DELTA_POINT_VALUE)
+
+
+def test_long_and_short_legs_offset():
+    engine = RiskEngine(FakeMarginFetcher(), multiplier_lookup=lambda code: 200)
+    engine.load([dict(_txf('Buy', qty=3), code='TXFK6'), dict(_txf('Sell', qty=1), code='TXFL6')],
+                underlying_price=22000)
+    assert engine.dollar_delta == pytest.approx(2 * DELTA_POINT_VALUE)
@@ -0,0 +1,85 @@
+# tests/test_session_clock.py
+from datetime import date, datetime, timedelta
+
+from backend.session_clock import DAY, NIGHT, SessionClock, _MAX_NIGHT_GAP_DAYS
+
+
+class FakeCalendar:
+    def __init__(self, holidays=()):
+        self.holidays = set(holidays)
+
+    def is_trading_day(self, day):
+        return day.weekday() < 5 and day not in self.holidays
+
+
+# 2026/10/14 (三)
+WED = date(2026, 10, 14)
+FRI = date(2026, 10, 16)
+
+
+def _at(day, hour, minute=0):
+    return datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute)
+
+
+def test_day_session_boundaries():
+    clock = SessionClock()
+    assert clock.current_session(_at(WED, 8, 44)) == (None, None)
+    assert clock.current_session(_at(WED, 8, 45)) == (DAY, _at(WED, 13, 45))
+    assert clock.current_session(_at(WED, 13, 44)) == (DAY, _at(WED, 13, 45))
+    assert not clock.is_open(_at(WED, 13, 45))
+    assert not clock.is_open(_at(WED, 14, 59))
+
+
+def test_night_session_crosses_midnight():
+    clock = SessionClock()
+    close = _at(WED + timedelta(days=1), 5)
+    assert clock.current_session(_at(WED, 15)) == (NIGHT, close)
+    assert clock.current_session(_at(WED, 23, 59)) == (NIGHT, close)
+    # 凌晨屬於前一天開始的夜盤
+    assert clock.current_session(_at(WED + timedelta(days=1), 4, 59)) == (NIGHT, close)
+    assert not clock.is_open(close)
+
+
+def test_night_session_after_friday_runs_into_saturday():
+    clock = SessionClock()
+    saturday = FRI + timedelta(days=1)
+    assert clock.current_session(_at(FRI, 20)) == (NIGHT, _at(saturday, 5))
+    assert clock.current_session(_at(saturday, 4, 30)) == (NIGHT, _at(saturday, 5))
+    assert not clock.is_open(_at(saturday, 5))
+    assert not clock.is_open(_at(saturday + timedelta(days=1), 3))
+
+
+def test_no_night_session_before_long_holiday():
+    # 2026 農曆春節: 2/12 (四) 起休市,2/23 (一) 開盤
+    holidays = {date(2026, 2, 12) + timedelta(days=i) for i in range(9)}
+    clock = SessionClock(FakeCalendar(holidays))
+    last = date(2026, 2, 11)
+    assert clock.is_open(_at(last, 10))
+    assert not clock.is_open(_at(last, 15))
+    assert not clock.is_open(_at(last + timedelta(days=1), 2))
+    assert clock.next_open(_at(last, 13, 45)) == (DAY, _at(date(2026, 2, 23), 8, 45))
+
+
+def test_night_gap_limit():
+    # 週五到下週一剛好 3 天,仍開夜盤;再多一天休市 (例如週一放假) 就不開
+    assert (date(2026, 10, 19) - FRI).days == _MAX_NIGHT_GAP_DAYS
+    monday_holiday = SessionClock(FakeCalendar({date(2026, 10, 19)}))
+    assert not monday_holiday.is_open(_at(FRI, 20))
+    assert SessionClock(FakeCalendar()).is_open(_at(FRI, 20))
+
+
+def test_next_open_across_weekend():
+    clock = SessionClock()
+    saturday = FRI + timedelta(days=1)
+    monday = FRI + timedelta(days=3)
+    assert clock.next_open(_at(saturday, 5)) == (DAY, _at(monday, 8, 45))
+    assert clock.next_open(_at(saturday + timedelta(days=1), 12)) == (DAY, _at(monday, 8, 45))
+    # 時段內回傳下一個時段
+    assert clock.next_open(_at(FRI, 9)) == (NIGHT, _at(FRI, 15))
+    assert clock.next_open(_at(FRI, 16)) == (DAY, _at(monday, 8, 45))
+
+
+def test_describe():
+    clock = SessionClock()
+    assert clock.describe(_at(WED, 9)) == '日盤交易時段 (至 13:45)'
+    assert clock.describe(_at(FRI + timedelta(days=1), 12)) == '休市時段 (下次開盤: 10/19 08:45 日盤)'
@@ -0,0 +1,38 @@
+# tests/test_settlement_calendar.py
+from datetime import date, datetime
+
+from backend.contract_cache import get_trading_date
+from backend.settlement_calendar import SettlementCalendar, next_trading_day
+
+HOLIDAYS = {date(2026, 10, 9), date(2026, 10, 12)}  # 週五、週一
+
+
+def test_day_session_keeps_its_date():
+    assert get_trading_date(datetime(2026, 10, 14, 9, 0), holidays=set()) == '20261014'
+
+
+def test_night_session_belongs_to_next_day():
+    assert get_trading_date(datetime(2026, 10, 14, 15, 0), holidays=set()) == '20261015'
+
+
+def test_friday_night_session_rolls_to_monday():
+    assert get_trading_date(datetime(2026, 10, 16, 15, 0), holidays=set()) == '20261019'
+    # 週六凌晨仍屬週五夜盤
+    assert get_trading_date(datetime(2026, 10, 17, 3, 0), holidays=set()) == '20261019'
+
+
+def test_holidays_are_skipped():
+    assert get_trading_date(datetime(2026, 10, 8, 16, 0), holidays=HOLIDAYS) == '20261013'
+    assert next_trading_day(date(2026, 10, 9), HOLIDAYS) == date(2026, 10, 13)
+    assert next_trading_day(date(2026, 10, 13), HOLIDAYS) == date(2026, 10, 13)
+
+
+def test_calendar_rolls_settlement_past_holiday(tmp_path):
+    holiday_file = tmp_path / 'holidays.txt'
+    holiday_file.write_text('2026-10-21  # 假日\n', encoding='utf-8')
+    calendar = SettlementCalendar(str(holiday_file), today=date(2026, 10, 19))
+    assert calendar.expiry('TXFJ6') == date(2026, 10, 22)
+    # 結算日當天仍可交易,隔一個交易日才算到期
+    assert not calendar.is_expired('TXFJ6', today=date(2026, 10, 22))
+    assert calendar.is_expired('TXFJ6', today=date(2026, 10, 23))
+    assert not calendar.is_expired('UNKNOWN', today=date(2026, 10, 23))
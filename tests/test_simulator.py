@@ -0,0 +1,109 @@
+# tests/test_simulator.py
+import os
+import threading
+import time
+
+import pytest
+
+from backend.position_book import PositionBook
+from backend.simulator import SimulatedBackend
+
+TIMEOUT = 5
+
+
+def _wait(predicate, timeout=TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def backend():
+    backend = SimulatedBackend(speed=20, seed=7, positions=[])
+    ok, _ = backend.login()
+    assert ok
+    yield backend
+    backend.logout()
+
+
+def test_seeded_prices_are_reproducible():
+    prices = []
+    for _ in range(2):
+        backend = SimulatedBackend(seed=3)
+        backend.login()
+        backend.exchange.stop()  # 停止推送,只比較起始狀態
+        prices.append(sorted((p['code'], p['direction'], p['quantity'], p['price']) for p in backend.get_positions()))
+        backend.logout()
+    assert prices[0] == prices[1]
+    assert len(prices[0]) == 4  # 示範部位
+
+
+def test_subscribe_trade_roll_and_close(backend):
+    near = backend.contracts.near_month('TXF')
+    far = backend.contracts.next_month(near)
+    ticks, deals = [], []
+    lock = threading.Lock()
+
+    def on_quote(exchange, quote):
+        with lock:
+            ticks.append(quote.code)
+
+    def on_order(stat, msg):
+        if stat == 'FuturesDeal':
+            with lock:
+                deals.append(msg)
+
+    assert backend.start_subscribing([near], quote_callback=on_quote, order_callback=on_order)
+    assert _wait(lambda: len(ticks) >= 5)
+    assert set(ticks) == {near}
+
+    # 市價單立即以賣價成交
+    book = backend.get_five_quote(near)
+    ok, msg = backend.open_position(near, 'Buy', 2)
+    assert ok and '成交' in msg
+    assert backend.exchange.account.get(near)['qty'] == 2
+
+    # 限價單不穿價時掛單,穿價的限價單立即成交
+    book = backend.get_five_quote(near)
+    ok, msg = backend.open_position(near, 'Buy', 1, price=book['bid_price'][0] - 200)
+    assert ok and '掛單' in msg
+    assert len(backend.exchange._resting) == 1
+    ok, msg = backend.open_position(near, 'Sell', 1, price=book['bid_price'][0] - 50)
+    assert ok and '成交' in msg
+    assert backend.exchange.account.get(near)['qty'] == 1
+    assert backend.exchange.cancel_all() == 1
+
+    # 成交回報與 Shioaji 相同只帶商品代碼,由倉位簿組回完整代碼
+    assert _wait(lambda: len(deals) >= 2)
+    assert deals[0]['code'] == 'TXF' and deals[0]['delivery_month']
+    mirror = PositionBook(multiplier_lookup=backend.contracts.get_multiplier)
+    for deal in list(deals):
+        assert mirror.on_order_update('FuturesDeal', deal) == near
+    assert mirror.get(near)['qty'] == 1
+
+    ok, msg = backend.roll_futures(near, 1, 'Buy', is_sell_position=False)
+    assert ok, msg
+    positions = {p['code']: p for p in backend.get_positions()}
+    assert near not in positions
+    assert positions[far]['direction'] == 'Buy' and positions[far]['quantity'] == 1
+
+    backend.open_position(near, 'Sell', 3)
+    ok, msg = backend.close_all_positions()
+    assert ok, msg
+    assert backend.get_positions() == []
+    assert backend.exchange.account.get_realized_pnl() != 0
+
+
+def test_logout_removes_cache_dir_and_login_recreates_it():
+    backend = SimulatedBackend(seed=1, positions=[])
+    backend.login()
+    assert os.path.isdir(backend.cache_dir)
+    backend.logout()
+    assert not os.path.exists(backend.cache_dir)
+
+    assert backend.login()[0]
+    assert os.path.isdir(backend.cache_dir)
+    backend.logout()
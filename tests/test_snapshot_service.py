@@ -0,0 +1,132 @@
+# tests/test_snapshot_service.py
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from backend.snapshot_service import RateLimiter, SnapshotService, snapshot_price
+
+
+class StubAPI:
+    """記錄每次 snapshots 呼叫的合約,回傳以代碼編號的成交價"""
+
+    def __init__(self, fail=False, delay=0.0):
+        self.calls = []
+        self.fail = fail
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def snapshots(self, contracts):
+        with self._lock:
+            self.calls.append([c.code for c in contracts])
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if self.delay:
+                time.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError("連線中斷")
+            return [SimpleNamespace(code=c.code, close=float(c.code[3:]), buy_price=0, sell_price=0)
+                    for c in contracts]
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def _lookup(code):
+    return None if code.startswith('BAD') else SimpleNamespace(code=code)
+
+
+def _codes(n):
+    return [f'TXO{20000 + i}' for i in range(n)]
+
+
+def _service(api, **kwargs):
+    kwargs.setdefault('rate_limiter', RateLimiter(calls=1000, period=1.0))
+    return SnapshotService(api, contract_lookup=_lookup, **kwargs)
+
+
+def test_large_request_is_split_into_chunks():
+    api = StubAPI(delay=0.05)
+    service = _service(api, chunk_size=200, max_workers=4)
+    codes = _codes(950)
+
+    result = service.get_snapshots(codes)
+
+    assert len(result) == 950
+    assert sorted(len(call) for call in api.calls) == [150, 200, 200, 200, 200]
+    assert sorted(code for call in api.calls for code in call) == sorted(codes)
+    assert 1 < api.max_active <= 4
+
+
+def test_cached_codes_are_not_fetched_again():
+    api = StubAPI()
+    service = _service(api, ttl=60)
+    service.get_snapshots(_codes(3))
+
+    result = service.get_snapshots(_codes(5))
+
+    assert len(result) == 5
+    assert api.calls == [_codes(3), _codes(5)[3:]]
+
+
+def test_duplicates_and_missing_contracts():
+    api = StubAPI()
+    service = _service(api)
+    result = service.get_snapshots(['TXO20000', 'TXO20000', 'BAD1', 'TXO20001'])
+
+    assert set(result) == {'TXO20000', 'TXO20001'}
+    assert api.calls == [['TXO20000', 'TXO20001']]
+
+
+def test_max_age_and_invalidate_force_refresh():
+    api = StubAPI()
+    service = _service(api, ttl=60)
+    service.get_snapshots(['TXO20000'])
+
+    service.get_snapshots(['TXO20000'], max_age=0)
+    assert len(api.calls) == 2
+
+    service.invalidate(['TXO20000'])
+    service.get_snapshots(['TXO20000'])
+    assert len(api.calls) == 3
+
+
+def test_expired_entries_are_refetched():
+    api = StubAPI()
+    service = _service(api, ttl=0.05)
+    service.get_snapshots(['TXO20000'])
+    time.sleep(0.1)
+    service.get_snapshots(['TXO20000'])
+    assert len(api.calls) == 2
+
+
+def test_failed_chunk_returns_nothing_and_is_not_cached():
+    api = StubAPI(fail=True)
+    service = _service(api)
+    assert service.get_snapshots(_codes(2)) == {}
+
+    api.fail = False
+    assert len(service.get_snapshots(_codes(2))) == 2
+    assert len(api.calls) == 2
+
+
+def test_prices_fall_back_to_mid():
+    assert snapshot_price(SimpleNamespace(close=0, buy_price=100, sell_price=102)) == pytest.approx(101)
+    assert snapshot_price(SimpleNamespace(close=0, buy_price=0, sell_price=102)) == pytest.approx(102)
+
+    service = _service(StubAPI())
+    assert service.get_price('TXO20500') == pytest.approx(20500)
+    assert service.get_price('BAD1') == 0.0
+
+
+def test_rate_limiter_spaces_calls():
+    limiter = RateLimiter(calls=2, period=0.2)
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.acquire()
+    # 前 2 次立即取得,其後每 0.1 秒一次
+    assert time.monotonic() - started >= 0.18
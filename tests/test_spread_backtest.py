@@ -0,0 +1,62 @@
+# tests/test_spread_backtest.py
+import numpy as np
+import pytest
+
+from my_utils.spread_backtest import align, backtest, summarize, synthetic_ticks
+
+
+def _leg(ts, bid, ask):
+    bid = np.asarray(bid, dtype=np.float64)
+    ask = np.asarray(ask, dtype=np.float64)
+    return {'ts': np.asarray(ts, dtype=np.float64), 'price': (bid + ask) / 2, 'bid': bid, 'ask': ask}
+
+
+def _book():
+    # 中價差一直是 -40;第 3 筆起次月買賣價差變寬,之後才收窄到可成交
+    ts = [0, 10, 20, 30, 40]
+    near = _leg(ts, [21999] * 5, [22001] * 5)
+    far = _leg(ts, [21958, 21955, 21950, 21958, 21959], [21962, 21965, 21970, 21962, 21961])
+    return align(near, far)
+
+
+def test_long_roll_triggers_on_executable_ask_spread():
+    book = _book()
+    assert np.allclose(book['spread'], -40)
+    # 多單可成交價差 = 次月賣價 - 近月買價: -37, -34, -29, -37, -38
+    result = backtest(book, [-38, -37], False, False, poll_seconds=10)
+    assert result['tick_index'].tolist() == [4, 0]
+    assert result['tick_fill'].tolist() == [-38, -37]
+    # 中價差 -40 早已 <= 目標,但以中價判斷會在無法成交時觸發
+    assert result['tick_slippage'].tolist() == [2, 3]
+
+
+def test_short_roll_triggers_on_executable_bid_spread():
+    book = _book()
+    # 空單可成交價差 = 次月買價 - 近月賣價: -43, -46, -51, -43, -42
+    result = backtest(book, [-42, -43, -40], False, True, poll_seconds=10)
+    assert result['tick_index'].tolist() == [4, 0, -1]
+    assert result['tick_fill'][:2].tolist() == [-42, -43]
+    assert np.isnan(result['tick_fill'][2])
+
+
+def test_backwardation_target_flips_threshold():
+    result = backtest(_book(), 37, True, False, poll_seconds=10)
+    assert result['tick_index'].tolist() == [0]
+
+
+def test_polling_delay_and_regret():
+    book = _book()
+    result = backtest(book, -37, False, False, poll_seconds=25)
+    # 輪詢時點 0, 25 (看到第 20 秒的報價), 50
+    assert result['poll_index'].tolist() == [0]
+    assert result['delay'].tolist() == [0]
+    # 整段最佳可成交價差為 -38
+    assert result['regret'].tolist() == [pytest.approx(1.0)]
+
+
+def test_summary_header_matches_columns():
+    near, far = synthetic_ticks(seconds=600, seed=1)
+    result = backtest(align(near, far), [-60, -40], False, False)
+    header = summarize(result).splitlines()[0]
+    assert header.split()[-1] == '距最佳'
+    assert '錯失' not in header
@@ -0,0 +1,93 @@
+# tests/test_state_journal.py
+import json
+
+from my_utils.state_journal import StateJournal
+
+
+def _journal(tmp_path, compact_every=200):
+    return StateJournal(journal_file=str(tmp_path / 'journal.jsonl'),
+                        snapshot_file=str(tmp_path / 'snapshot.json'), compact_every=compact_every)
+
+
+def _monitor(code):
+    return {'code': code, 'qty': 1, 'direction': 'Action.Buy', 'target_spread': 50,
+            'is_逆價差': False, 'auto_execute': True, 'active': True}
+
+
+def _lines(path):
+    return path.read_text(encoding='utf-8').splitlines() if path.exists() else []
+
+
+def test_restore_replays_journal(tmp_path):
+    journal = _journal(tmp_path)
+    journal.record('monitor_created', id='a1', monitor=_monitor('TXFK6'))
+    journal.record('monitor_created', id='b2', monitor=_monitor('MXFK6'))
+    journal.record('monitor_triggered', id='a1')
+    journal.record('selection', code='TXO22000K6', selected=True)
+    journal.record('subscriptions', codes=['TXFK6', 'TXO22000K6'])
+    journal.record('target_delta', value='0.5')
+
+    state = _journal(tmp_path).restore()
+    assert list(state['monitors']) == ['b2']
+    assert state['monitors']['b2']['code'] == 'MXFK6'
+    assert state['selected'] == {'TXO22000K6': True}
+    assert state['subscriptions'] == ['TXFK6', 'TXO22000K6']
+    assert state['target_delta'] == '0.5'
+
+
+def test_restore_skips_half_written_last_line(tmp_path):
+    journal = _journal(tmp_path)
+    journal.record('target_delta', value='1')
+    with open(journal.journal_file, 'a', encoding='utf-8') as f:
+        f.write('{"ts": "2026-10-19 10:00:00", "event": "target_del')
+
+    restored = _journal(tmp_path)
+    assert restored.restore()['target_delta'] == '1'
+    assert restored._pending == 1
+
+
+def test_compaction_writes_snapshot_and_truncates_journal(tmp_path):
+    journal = _journal(tmp_path, compact_every=5)
+    for i in range(4):
+        journal.record('target_delta', value=str(i))
+    assert len(_lines(tmp_path / 'journal.jsonl')) == 4
+    assert not (tmp_path / 'snapshot.json').exists()
+
+    journal.record('monitor_created', id='a1', monitor=_monitor('TXFK6'))
+    assert _lines(tmp_path / 'journal.jsonl') == []
+    snapshot = json.loads((tmp_path / 'snapshot.json').read_text(encoding='utf-8'))
+    assert snapshot['state']['target_delta'] == '3'
+    assert not (tmp_path / 'snapshot.json.tmp').exists()
+
+    # 快照之後的事件記在日誌,還原時疊加在快照上
+    journal.record('target_delta', value='9')
+    state = _journal(tmp_path).restore()
+    assert state['target_delta'] == '9'
+    assert list(state['monitors']) == ['a1']
+
+
+def test_restore_counts_replayed_events_toward_compaction(tmp_path):
+    journal = _journal(tmp_path, compact_every=3)
+    journal.record('target_delta', value='1')
+    journal.record('target_delta', value='2')
+
+    restored = _journal(tmp_path, compact_every=3)
+    restored.restore()
+    restored.record('target_delta', value='3')
+    assert _lines(tmp_path / 'journal.jsonl') == []
+    assert _journal(tmp_path).restore()['target_delta'] == '3'
+
+
+def test_drop_expired_monitors(tmp_path):
+    journal = _journal(tmp_path)
+    journal.record('monitor_created', id='old', monitor=_monitor('TXFJ6'))
+    journal.record('monitor_created', id='new', monitor=_monitor('TXFK6'))
+
+    restored = _journal(tmp_path)
+    state = restored.restore()
+    expired = restored.drop_expired(lambda code: code == 'TXFJ6')
+    assert [(m['id'], m['code']) for m in expired] == [('old', 'TXFJ6')]
+    assert list(state['monitors']) == ['new']
+
+    # 取消的監測寫入日誌,下次還原不再出現
+    assert list(_journal(tmp_path).restore()['monitors']) == ['new']
@@ -0,0 +1,157 @@
+# tests/test_stream_server.py
+import base64
+import hashlib
+import json
+import os
+import socket
+
+import pytest
+
+from backend.stream_server import StreamServer, diff_state
+
+TIMEOUT = 5
+
+
+@pytest.fixture
+def server():
+    server = StreamServer(port=0, min_interval=0.05)
+    server.publish({'total_pnl': 100}, [
+        {'code': 'TXFK6', 'quantity': 1, 'last_price': 22000.0},
+        {'code': 'MXFK6', 'quantity': 2, 'last_price': 22001.0},
+    ])
+    server.start()
+    assert server.port != 0
+    yield server
+    server.stop()
+
+
+def _connect(server, path, headers=''):
+    sock = socket.create_connection(('127.0.0.1', server.port), timeout=TIMEOUT)
+    sock.sendall(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n{headers}\r\n".encode())
+    stream = sock.makefile('rb')
+    status = stream.readline().decode()
+    response_headers = {}
+    while True:
+        line = stream.readline().decode().strip()
+        if not line:
+            break
+        key, value = line.split(':', 1)
+        response_headers[key.strip().lower()] = value.strip()
+    return sock, stream, status, response_headers
+
+
+def _read_sse(stream):
+    event, data = None, None
+    while True:
+        line = stream.readline().decode('utf-8').rstrip('\n')
+        if not line:
+            if event is not None:
+                return event, json.loads(data)
+            continue
+        key, value = line.split(': ', 1)
+        if key == 'event':
+            event = value
+        elif key == 'data':
+            data = value
+
+
+def _read_ws(stream):
+    header = stream.read(2)
+    length = header[1] & 0x7F
+    if length == 126:
+        length = int.from_bytes(stream.read(2), 'big')
+    elif length == 127:
+        length = int.from_bytes(stream.read(8), 'big')
+    return header[0] & 0x0F, stream.read(length)
+
+
+def _ws_send(sock, payload, opcode):
+    mask = os.urandom(4)
+    masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    sock.sendall(bytes([0x80 | opcode, 0x80 | len(payload)]) + mask + masked)
+
+
+def test_snapshot_endpoint(server):
+    sock, stream, status, headers = _connect(server, '/snapshot')
+    body = json.loads(stream.read(int(headers['content-length'])))
+    sock.close()
+    assert status.startswith('HTTP/1.1 200')
+    assert body['type'] == 'snapshot'
+    assert body['summary'] == {'total_pnl': 100}
+    assert set(body['positions']) == {'TXFK6', 'MXFK6'}
+
+
+def test_unknown_path_is_404(server):
+    sock, _, status, _ = _connect(server, '/nothing')
+    sock.close()
+    assert status.startswith('HTTP/1.1 404')
+
+
+def test_sse_client_gets_snapshot_then_deltas(server):
+    sock, stream, status, headers = _connect(server, '/stream?interval=0.05')
+    try:
+        assert status.startswith('HTTP/1.1 200')
+        assert headers['content-type'].startswith('text/event-stream')
+
+        event, payload = _read_sse(stream)
+        assert event == 'snapshot'
+        assert payload['positions']['TXFK6'] == {'code': 'TXFK6', 'quantity': 1, 'last_price': 22000.0}
+
+        server.publish({'total_pnl': 300}, [
+            {'code': 'TXFK6', 'quantity': 1, 'last_price': 22010.0},
+            {'code': 'TMFK6', 'quantity': 5, 'last_price': 22010.0},
+        ])
+        event, payload = _read_sse(stream)
+        assert event == 'delta'
+        assert payload['seq'] == 2
+        assert payload['summary'] == {'total_pnl': 300}
+        # 只送出有變動的欄位
+        assert payload['upsert'] == {
+            'TXFK6': {'last_price': 22010.0},
+            'TMFK6': {'code': 'TMFK6', 'quantity': 5, 'last_price': 22010.0},
+        }
+        assert payload['remove'] == ['MXFK6']
+    finally:
+        sock.close()
+
+
+def test_websocket_client_gets_snapshot_deltas_and_pong(server):
+    key = base64.b64encode(os.urandom(16)).decode()
+    sock, stream, status, headers = _connect(
+        server, '/ws?interval=0.05',
+        f"Upgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+        "Sec-WebSocket-Version: 13\r\n"
+    )
+    try:
+        assert status.startswith('HTTP/1.1 101')
+        expected = base64.b64encode(
+            hashlib.sha1((key + '258EAFA5-E914-47DA-95CA-C5AB0DC85B11').encode()).digest()
+        ).decode()
+        assert headers['sec-websocket-accept'] == expected
+
+        opcode, data = _read_ws(stream)
+        assert opcode == 0x1
+        assert json.loads(data)['type'] == 'snapshot'
+
+        server.publish({'total_pnl': 100}, [
+            {'code': 'TXFK6', 'quantity': 3, 'last_price': 22000.0},
+            {'code': 'MXFK6', 'quantity': 2, 'last_price': 22001.0},
+        ])
+        opcode, data = _read_ws(stream)
+        delta = json.loads(data)
+        assert delta['type'] == 'delta'
+        assert delta['summary'] == {}
+        assert delta['upsert'] == {'TXFK6': {'quantity': 3}}
+
+        _ws_send(sock, b'hi', opcode=0x9)
+        assert _read_ws(stream) == (0xA, b'hi')
+
+        _ws_send(sock, b'', opcode=0x8)
+        assert stream.read(1) == b''  # 伺服器關閉連線
+    finally:
+        sock.close()
+
+
+def test_diff_state_without_changes_is_none():
+    state = {'summary': {'a': 1}, 'positions': {'TXFK6': {'quantity': 1}}}
+    assert diff_state(state, state) is None
@@ -0,0 +1,114 @@
+# tests/test_subscription_manager.py
+from types import SimpleNamespace
+
+from backend.subscription_manager import DEFAULT_MAX_SUBSCRIPTIONS, QUOTE_BIDASK, SubscriptionManager
+
+
+class FakeQuote:
+    def __init__(self):
+        self.calls = []
+        self.fail = set()
+
+    def subscribe(self, contract, quote_type, **kwargs):
+        if contract in self.fail:
+            self.fail.discard(contract)
+            raise RuntimeError('連線中斷')
+        self.calls.append(('sub', contract, quote_type))
+
+    def unsubscribe(self, contract, quote_type, **kwargs):
+        self.calls.append(('unsub', contract, quote_type))
+
+    def take(self, action):
+        taken = sorted(c for a, c, _ in self.calls if a == action)
+        self.calls = [c for c in self.calls if c[0] != action]
+        return taken
+
+
+def _manager(max_subscriptions=DEFAULT_MAX_SUBSCRIPTIONS):
+    quote = FakeQuote()
+    manager = SubscriptionManager(api=SimpleNamespace(quote=quote), contract_lookup=lambda code: code,
+                                  max_subscriptions=max_subscriptions)
+    return manager, quote
+
+
+def test_shared_codes_are_reference_counted():
+    manager, quote = _manager()
+    manager.set_consumer('positions', ['TXFK6', 'TXO22000K6'])
+    manager.set_consumer('chart', ['TXFK6'])
+    manager.set_consumer('chart', ['TXFK6'], quote_type=QUOTE_BIDASK)
+    assert quote.take('sub') == ['TXFK6', 'TXFK6', 'TXO22000K6']
+
+    manager.release_consumer('positions')
+    assert manager.get_codes() == ['TXFK6']
+    assert manager.get_consumer_codes('chart') == ['TXFK6']
+    assert quote.take('unsub') == []
+    # 沒有人使用的訂閱先保留,purge 時才取消
+    assert manager.is_subscribed('TXO22000K6')
+    assert manager.purge() == (0, 1)
+    assert quote.take('unsub') == ['TXO22000K6']
+
+    manager.release_consumer('chart')
+    manager.purge()
+    assert quote.take('unsub') == ['TXFK6', 'TXFK6']
+    assert manager.get_codes() == []
+
+
+def test_set_consumer_sends_only_the_difference():
+    manager, quote = _manager()
+    assert manager.set_consumer('positions', ['A', 'B']) == (2, 0)
+    quote.take('sub')
+    assert manager.set_consumer('positions', ['B', 'C']) == (1, 1)
+    assert quote.take('sub') == ['C']
+    assert quote.take('unsub') == []
+
+    # 重新加回剛釋放 (仍在訂閱中) 的代碼不需再送出
+    assert manager.set_consumer('positions', ['A', 'B', 'C']) == (1, 0)
+    assert quote.calls == []
+
+
+def test_lru_eviction_at_subscription_limit():
+    manager, quote = _manager()
+    codes = [f'C{i:03d}' for i in range(DEFAULT_MAX_SUBSCRIPTIONS)]
+    manager.set_consumer('positions', codes)
+    manager.set_consumer('chart', codes[:10])  # 最近使用,且仍有參考
+    manager.set_consumer('positions', [])
+    quote.take('sub')
+
+    manager.set_consumer('spread', ['N1', 'N2', 'N3', 'N4', 'N5'])
+    assert quote.take('sub') == ['N1', 'N2', 'N3', 'N4', 'N5']
+    # 淘汰最久未使用且沒有參考的訂閱,chart 使用中的不受影響
+    assert quote.take('unsub') == codes[10:15]
+    assert len(manager._active) == DEFAULT_MAX_SUBSCRIPTIONS
+    assert all(manager.is_subscribed(code) for code in codes[:10])
+
+
+def test_subscriptions_over_limit_wait_for_room():
+    manager, quote = _manager(max_subscriptions=3)
+    manager.set_consumer('positions', ['A', 'B', 'C', 'D'])
+    assert quote.take('sub') == ['A', 'B', 'C']
+    assert not manager.is_subscribed('D')
+
+    manager.set_consumer('positions', ['B', 'C', 'D'])
+    assert quote.take('unsub') == ['A']
+    assert quote.take('sub') == ['D']
+
+
+def test_failed_subscribe_is_retried_on_next_flush():
+    manager, quote = _manager()
+    quote.fail.add('TXFK6')
+    manager.set_consumer('positions', ['TXFK6', 'TXO22000K6'])
+    assert quote.take('sub') == ['TXO22000K6']
+    assert not manager.is_subscribed('TXFK6')
+
+    assert manager.flush() == (1, 0)
+    assert quote.take('sub') == ['TXFK6']
+    assert manager.is_subscribed('TXFK6')
+
+
+def test_failed_subscribe_released_before_retry_is_dropped():
+    manager, quote = _manager()
+    quote.fail.add('TXFK6')
+    manager.set_consumer('positions', ['TXFK6'])
+    manager.release_consumer('positions')
+    assert manager.flush() == (0, 0)
+    assert quote.calls == []
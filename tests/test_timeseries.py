@@ -0,0 +1,79 @@
+# tests/test_timeseries.py
+import numpy as np
+import pytest
+
+from my_utils.timeseries import TimeSeriesSampler, lttb
+
+
+def _sampler(n):
+    # 10 Hz x 0.001 小時 = 36 筆
+    sampler = TimeSeriesSampler(hz=10, hours=0.001)
+    for i in range(n):
+        assert sampler.record({'pnl': i, 'delta': -i, 'margin': 2 * i}, ts=1000.0 + i)
+    return sampler
+
+
+def test_get_returns_time_order_after_wrap():
+    sampler = _sampler(50)
+    assert sampler.capacity == 36
+    times, values = sampler.get()
+    assert times.tolist() == [1000.0 + i for i in range(14, 50)]
+    assert values[:, 0].tolist() == list(range(14, 50))
+
+
+@pytest.mark.parametrize('n, since, first', [
+    (20, 1005.0, 5),      # 未繞回
+    (50, 1020.0, 20),     # 繞回,since 落在較舊的一段
+    (50, 1040.5, 41),     # 繞回,since 落在較新的一段
+    (50, 900.0, 14),      # since 早於所有資料
+])
+def test_since_slices_before_copying(n, since, first):
+    sampler = _sampler(n)
+    times, values = sampler.get(since=since)
+    assert times.tolist() == [1000.0 + i for i in range(first, n)]
+    assert values.shape == (n - first, 3)
+
+    series_times, series = sampler.get_series('delta', since=since)
+    assert series.dtype == np.float64
+    assert series.tolist() == [-float(i) for i in range(first, n)]
+    assert np.array_equal(series_times, times)
+
+
+def test_since_after_last_sample_is_empty():
+    times, values = _sampler(50).get(since=2000.0)
+    assert len(times) == 0
+    assert values.shape == (0, 3)
+    times, series = _sampler(0).get_series('pnl', since=0.0, max_points=10)
+    assert len(times) == len(series) == 0
+
+
+def test_returned_arrays_are_copies():
+    sampler = _sampler(10)
+    times, values = sampler.get()
+    times[:] = 0
+    values[:] = 0
+    assert sampler.get()[0][0] == 1000.0
+
+
+def test_record_skips_fast_and_unchanged_samples():
+    sampler = TimeSeriesSampler(hz=10, hours=0.001)
+    assert sampler.record((1, 2, 3), ts=1.0)
+    assert not sampler.record((4, 5, 6), ts=1.05)
+    assert not sampler.record((1, 2, 3), ts=2.0)
+    assert len(sampler) == 1
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.zeros(1000)
+    y[500] = 10.0
+    y[700] = -10.0
+    sx, sy = lttb(x, y, 50)
+    assert len(sx) == 50
+    assert sx[0] == 0 and sx[-1] == 999
+    assert 10.0 in sy and -10.0 in sy
+
+    sampler = _sampler(30)
+    times, series = sampler.get_series('pnl', since=1005.0, max_points=10)
+    assert len(times) == 10
+    assert times[0] == 1005.0 and times[-1] == 1029.0